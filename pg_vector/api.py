@@ -0,0 +1,145 @@
+"""
+Headless JSON search API (ASGI, FastAPI) over the same search core as the Gradio UI.
+
+    GET  /api/search?q=...&provider=OpenAI&top_k=5&page=1&mode=vector&profile=balanced
+    GET  /api/search?q=...&provider=OpenAI&top_k=5&cursor=<next_cursor of the previous page>
+    POST /api/search/batch   {"queries": [...], "provider": "OpenAI", "top_k": 5}
+    GET  /api/health
+
+Searches run on the async engine (async_search.py) when psycopg 3 is installed and on
+the synchronous core in a worker thread otherwise, or when DB_REPLICA_HOSTS or
+DB_SHARD_HOSTS is set (only the synchronous core routes to replicas and shards). main.py serves this app with the
+Gradio UI mounted at /; it can also run on its own:
+
+    uvicorn api:app --host 0.0.0.0 --port 8080
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from batch_search import batch_semantic_search
+from db import get_replica_router
+from search import (BQ_OVERSAMPLE, DEFAULT_SEARCH_PROFILE, HYBRID_KEYWORD_WEIGHT, HYBRID_SEMANTIC_WEIGHT,
+                    MULTI_CONTENT_WEIGHT, MULTI_TITLE_WEIGHT)
+from search_service import SEARCH_MAX_TOP_K, SearchError, check_search_options, routes_searches, search
+
+try:
+    import async_search
+except ImportError as e:
+    async_search = None
+    print(f"Async search unavailable ({e}); the API uses the synchronous search core.")
+if async_search is not None and routes_searches():
+    async_search = None
+    print("Read replicas or shards are configured; the API uses the synchronous search core, which routes to them.")
+
+PROVIDERS = ("Ollama", "OpenAI", "HuggingFace")
+
+# HTTP status returned for each SearchError outcome
+ERROR_STATUS = {
+    "invalid_model": 400,
+    "invalid_request": 400,
+    "embedding_error": 502,
+    "dimension_mismatch": 500,
+    "db_unavailable": 503,
+    "error": 500,
+}
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    provider: str = "OpenAI"
+    top_k: int = Field(5, ge=1, le=SEARCH_MAX_TOP_K)
+    mode: str = "vector"
+    profile: str = DEFAULT_SEARCH_PROFILE
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if async_search is not None:
+        await async_search.close_async_engine()
+
+
+app = FastAPI(title="Wikipedia Semantic Search API", lifespan=lifespan)
+
+
+def error_response(error):
+    return JSONResponse(status_code=ERROR_STATUS.get(error.outcome, 500),
+                        content={"error": error.outcome, "detail": str(error)})
+
+
+def check_options(provider, mode, profile):
+    """Raises SearchError('invalid_request') for an unknown provider, mode or profile."""
+    if provider not in PROVIDERS:
+        raise SearchError("invalid_request", f"provider must be one of {', '.join(PROVIDERS)}.")
+    check_search_options(mode, profile)
+
+
+@app.get("/api/search")
+async def search_endpoint(
+    q: str = Query(..., min_length=1, description="search query"),
+    provider: str = "OpenAI",
+    top_k: int = Query(5, ge=1, le=SEARCH_MAX_TOP_K),
+    page: int = Query(1, ge=1),
+    mode: str = "vector",
+    profile: str = DEFAULT_SEARCH_PROFILE,
+    oversample: int = Query(BQ_OVERSAMPLE, ge=1),
+    semantic_weight: float = Query(HYBRID_SEMANTIC_WEIGHT, ge=0),
+    keyword_weight: float = Query(HYBRID_KEYWORD_WEIGHT, ge=0),
+    title_weight: float = Query(MULTI_TITLE_WEIGHT, ge=0),
+    content_weight: float = Query(MULTI_CONTENT_WEIGHT, ge=0),
+    category: Optional[str] = None,
+    language: Optional[str] = None,
+    published_after: Optional[datetime] = None,
+    published_before: Optional[datetime] = None,
+    id_min: Optional[int] = None,
+    id_max: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Returns one page of results as JSON: id, url, title, snippet and score per article.
+    semantic_weight and keyword_weight set the fusion weights of mode=hybrid,
+    title_weight and content_weight the field weights of mode=multi. category, language,
+    published_after/published_before and id_min/id_max restrict the articles searched.
+    cursor, the next_cursor of a response, returns the page after it (same query and options).
+    """
+    try:
+        check_options(provider, mode, profile)
+        weights = {"hybrid": (semantic_weight, keyword_weight), "multi": (title_weight, content_weight)}.get(mode)
+        filters = {"category": category, "language": language, "published_after": published_after,
+                   "published_before": published_before, "id_min": id_min, "id_max": id_max}
+        if async_search is None:
+            return await run_in_threadpool(search, q, provider, mode, profile, top_k, page, oversample, weights,
+                                           filters, cursor)
+        try:
+            engine = await async_search.get_async_engine()
+        except Exception as e:
+            print(f"Error connecting to database: {e}")
+            raise SearchError("db_unavailable",
+                              "Failed to connect to the database. Please check your DB environment variables.")
+        return await engine.search(q, provider, mode, profile, top_k, page, oversample, weights, filters, cursor)
+    except SearchError as e:
+        return error_response(e)
+
+
+@app.post("/api/search/batch")
+async def batch_search_endpoint(request: BatchSearchRequest):
+    """Searches many queries with one embedding call and one SQL statement."""
+    try:
+        check_options(request.provider, request.mode, request.profile)
+        results = await run_in_threadpool(batch_semantic_search, request.queries, request.provider,
+                                          request.mode, request.profile, request.top_k)
+        return {"provider": request.provider, "top_k": request.top_k, "results": results}
+    except SearchError as e:
+        return error_response(e)
+
+
+@app.get("/api/health")
+async def health():
+    router = get_replica_router()
+    return {"status": "ok", "replicas": router.stats() if router is not None else []}
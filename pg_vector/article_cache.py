@@ -0,0 +1,143 @@
+"""
+The narrow second step of a search: url, title and snippet of the result ids.
+
+The vector scans (search.SEARCH_QUERIES, the vector tier, the shards) return only
+(id, similarity_score) rows. fetch_articles() turns them into result rows with one
+primary-key lookup of the ids that are not in the in-process LRU of article fields, so a
+popular article's content is read (and truncated) once rather than on every search.
+
+Entries are bounded by ARTICLE_CACHE_SIZE (least recently used go first) and
+ARTICLE_CACHE_TTL. Like the result cache, the article cache is cleared on every
+articles_changed notification (see result_cache.ensure_invalidation_trigger).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- Environment Variables ---
+# Maximum number of articles whose url, title and snippet are kept in memory (0 disables the cache)
+ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", "10000"))
+# Seconds cached article fields stay valid (0 disables expiry)
+ARTICLE_CACHE_TTL = float(os.getenv("ARTICLE_CACHE_TTL", "600"))
+
+ARTICLE_FIELDS_QUERY = """
+    SELECT id, url, title, SUBSTRING(content FROM 1 FOR 300) || '...' AS truncated_content
+    FROM public.articles
+    WHERE id = ANY(%s)
+"""
+
+
+class ArticleCache:
+    """A thread-safe LRU of (id, url, title, truncated_content) rows by article id."""
+
+    def __init__(self, max_size=10000, ttl=600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._articles = OrderedDict()  # id -> (row, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_many(self, ids):
+        """Returns {id: row} for the ids that are cached and not expired."""
+        found = {}
+        if self.max_size <= 0:
+            return found
+        now = time.monotonic()
+        with self._lock:
+            for article_id in ids:
+                entry = self._articles.get(article_id)
+                if entry is not None and self.ttl > 0 and now - entry[1] > self.ttl:
+                    del self._articles[article_id]
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._articles.move_to_end(article_id)
+                found[article_id] = entry[0]
+                self.hits += 1
+        return found
+
+    def put_many(self, rows):
+        if self.max_size <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                self._articles[row[0]] = (tuple(row), now)
+                self._articles.move_to_end(row[0])
+            while len(self._articles) > self.max_size:
+                self._articles.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached article (e.g. after public.articles changed)."""
+        with self._lock:
+            self._articles.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self._articles), "invalidations": self.invalidations}
+
+    def __len__(self):
+        return len(self._articles)
+
+
+def merge_articles(results, articles):
+    """Joins (id, score) results with {id: (id, url, title, truncated_content)} into search rows, in result order."""
+    return [articles[article_id] + (score,) for article_id, score in results if article_id in articles]
+
+
+def cached_rows(results, cache=None):
+    """The search rows of the (id, score) results when every article is cached, else None."""
+    if cache is None:
+        cache = get_article_cache()
+    articles = cache.get_many([article_id for article_id, _ in results])
+    if len(articles) < len({article_id for article_id, _ in results}):
+        return None
+    return merge_articles(results, articles)
+
+
+def fetch_articles(cur, results, cache=None):
+    """
+    Fetches url, title and snippet of the (id, score) results into
+    (id, url, title, truncated_content, similarity_score) rows, in result order; only the
+    articles missing from the cache are read, with one query.
+    """
+    if not results:
+        return []
+    if cache is None:
+        cache = get_article_cache()
+    ids = [article_id for article_id, _ in results]
+    articles = cache.get_many(ids)
+    missing = [article_id for article_id in ids if article_id not in articles]
+    if missing:
+        cur.execute(ARTICLE_FIELDS_QUERY, (missing,))
+        rows = [tuple(row) for row in cur.fetchall()]
+        cache.put_many(rows)
+        articles.update((row[0], row) for row in rows)
+    return merge_articles(results, articles)
+
+
+# --- Shared Cache ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_article_cache():
+    """Returns the process-wide article cache, creating it (and its invalidation listener) on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from result_cache import RESULT_CACHE_LISTEN, start_invalidation_listener
+
+                cache = ArticleCache(max_size=ARTICLE_CACHE_SIZE, ttl=ARTICLE_CACHE_TTL)
+                if ARTICLE_CACHE_SIZE > 0 and RESULT_CACHE_LISTEN:
+                    start_invalidation_listener(cache, name="article-cache-invalidation")
+                _cache = cache
+    return _cache
@@ -0,0 +1,404 @@
+"""
+Asyncio version of the semantic search handler.
+
+Built on psycopg 3 (AsyncConnectionPool from psycopg_pool) and the async OpenAI and
+Ollama clients, so a single event loop keeps many searches in flight: while one request
+waits on its embedding HTTP call, others run their Postgres queries. Hugging Face
+embeddings are computed in a worker thread through the shared micro-batcher.
+
+The SQL, search modes and profiles are the ones in search.py; queries are sent with
+server-side parameter binding and prepared automatically by psycopg on each connection.
+"""
+import asyncio
+import os
+import time
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+import db
+from article_cache import ARTICLE_FIELDS_QUERY, cached_rows, get_article_cache, merge_articles
+from embedding_cache import get_embedding_cache
+from embeddings import (EMBEDDING_HTTP_TIMEOUT, OLLAMA_EMBEDDING_MODEL, OLLAMA_HOST, OPENAI_API_KEY,
+                        OPENAI_EMBEDDING_MODEL, REMOTE_BATCH_MAX_SIZE, REMOTE_BATCH_MAX_WAIT_MS,
+                        get_huggingface_embedding)
+from metrics import instrument_embedding, is_slow, log_slow_query, record_result_cache, record_search, stage
+from micro_batcher import AsyncMicroBatcher
+from provider_limits import EMBEDDING_MAX_CONCURRENCY, AsyncAdaptiveConcurrency, async_call_with_retries
+from result_cache import get_result_cache, result_cache_key
+from vector_tier import get_vector_tier
+from search import (
+    BQ_OVERSAMPLE,
+    DEFAULT_SEARCH_PROFILE,
+    KEYSET_MODES,
+    PGVECTOR_VERSION_QUERY,
+    SEARCH_MODES,
+    active_filters,
+    filter_attempts,
+    format_results_markdown,
+    has_iterative_scan,
+    search_parameters,
+    search_query,
+    search_settings,
+    search_settings_query,
+    to_vector_literal,
+)
+from search_service import (SearchError, build_response, check_embedding, check_filters, check_search_options,
+                            decode_cursor, fetch_limit, get_search_spec, page_has_more, page_start,
+                            result_window)
+
+# --- Environment Variables ---
+# Seconds to wait for an embedding provider before giving up on the request
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+
+
+# --- Database ---
+def async_conninfo():
+    """Returns the libpq connection string for the DB_* settings in db.py."""
+    return make_conninfo(host=db.DB_HOST, dbname=db.DB_NAME, user=db.DB_USER,
+                         password=db.DB_PASSWORD, port=db.DB_PORT)
+
+
+async def configure_connection(conn):
+    """Runs the DB_SESSION_SETUP statements on every new pooled connection."""
+    for statement in db.DB_SESSION_SETUP.split(";"):
+        if statement.strip():
+            await conn.execute(statement)
+    # The pool expects configured connections to be idle
+    await conn.commit()
+
+
+def create_async_pool(conninfo=None, min_size=db.DB_POOL_MIN_SIZE, max_size=db.DB_POOL_MAX_SIZE):
+    """
+    Creates (unopened) the asyncio connection pool with the DB_POOL_* settings.
+    Idle connections are checked before being handed out and recycled after max_lifetime.
+    """
+    return AsyncConnectionPool(
+        conninfo or async_conninfo(),
+        min_size=min_size,
+        max_size=max_size,
+        timeout=db.DB_POOL_TIMEOUT,
+        max_lifetime=db.DB_POOL_MAX_LIFETIME,
+        configure=configure_connection,
+        check=AsyncConnectionPool.check_connection,
+        open=False,
+    )
+
+
+# --- Async Embedding Functions ---
+class AsyncEmbeddingClients:
+    """
+    Long-lived async provider clients, so HTTP connections are reused across requests.
+    Each client library is imported when its provider is first used. Concurrent requests
+    are sent together as multi-input requests (like embeddings.get_remote_batcher), which
+    provider_limits.async_call_with_retries retries under a per-provider adaptive limit.
+    """
+
+    def __init__(self):
+        self._openai = None
+        self._ollama = None
+        self.limits = {
+            "OpenAI": AsyncAdaptiveConcurrency(EMBEDDING_MAX_CONCURRENCY),
+            "Ollama": AsyncAdaptiveConcurrency(EMBEDDING_MAX_CONCURRENCY),
+        }
+        self.batchers = {
+            provider: AsyncMicroBatcher(
+                batch_fn,
+                max_batch_size=REMOTE_BATCH_MAX_SIZE,
+                max_wait_ms=REMOTE_BATCH_MAX_WAIT_MS,
+                name=f"async-{provider.lower()}-embedding-batcher",
+                max_in_flight=EMBEDDING_MAX_CONCURRENCY,
+                limit=lambda provider=provider: self.limits[provider].limit,
+            )
+            for provider, batch_fn in (("OpenAI", self._openai_embed), ("Ollama", self._ollama_embed))
+        }
+
+    @property
+    def openai(self):
+        if self._openai is None and OPENAI_API_KEY:
+            from openai import AsyncOpenAI
+
+            self._openai = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=EMBEDDING_HTTP_TIMEOUT, max_retries=0)
+        return self._openai
+
+    @property
+    def ollama(self):
+        if self._ollama is None:
+            import ollama
+
+            self._ollama = ollama.AsyncClient(host=OLLAMA_HOST, timeout=EMBEDDING_HTTP_TIMEOUT)
+        return self._ollama
+
+    async def _ollama_embed(self, texts):
+        response = await async_call_with_retries(
+            lambda: self.ollama.embed(model=OLLAMA_EMBEDDING_MODEL, input=list(texts)), self.limits["Ollama"])
+        return response["embeddings"]
+
+    async def _openai_embed(self, texts):
+        response = await async_call_with_retries(
+            lambda: self.openai.embeddings.create(input=list(texts), model=OPENAI_EMBEDDING_MODEL),
+            self.limits["OpenAI"])
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    @instrument_embedding("Ollama")
+    async def ollama_embedding(self, text):
+        try:
+            return await self.batchers["Ollama"].process(text)
+        except Exception as e:
+            print(f"Error getting Ollama embedding: {e}")
+            return None
+
+    @instrument_embedding("OpenAI")
+    async def openai_embedding(self, text):
+        if self.openai is None:
+            print("OpenAI API key not set. Cannot use OpenAI embedding.")
+            return None
+        try:
+            return await self.batchers["OpenAI"].process(text)
+        except Exception as e:
+            print(f"Error getting OpenAI embedding: {e}")
+            return None
+
+    async def huggingface_embedding(self, text):
+        # Encoding is CPU-bound; the batcher thread groups it with concurrent requests
+        return await asyncio.to_thread(get_huggingface_embedding, text)
+
+    def functions(self):
+        """Returns the async embedding function for each provider choice."""
+        return {
+            "Ollama": self.ollama_embedding,
+            "OpenAI": self.openai_embedding,
+            "HuggingFace": self.huggingface_embedding,
+        }
+
+
+# --- Async Search Engine ---
+class AsyncSearchEngine:
+    """
+    Runs semantic searches on one event loop with a pooled psycopg 3 connection per query.
+    embedding_functions maps a provider choice to an async function returning an embedding
+    (the AsyncEmbeddingClients functions by default).
+    """
+
+    def __init__(self, pool=None, embedding_functions=None):
+        self.pool = pool or create_async_pool()
+        self.embedding_functions = embedding_functions or AsyncEmbeddingClients().functions()
+        self.cache = get_embedding_cache()
+        self._iterative_scan = None
+
+    async def open(self):
+        await self.pool.open(wait=True)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def embed(self, provider, model, text):
+        """Returns the query embedding, served from the embedding cache when possible."""
+        # The persistent cache tier does blocking I/O; keep it off the event loop
+        blocking = self.cache.store is not None
+        if blocking:
+            embedding = await asyncio.to_thread(self.cache.get, provider, model, text)
+        else:
+            embedding = self.cache.get(provider, model, text)
+        if embedding is not None:
+            return embedding
+        embedding = await asyncio.wait_for(self.embedding_functions[provider](text), EMBEDDING_TIMEOUT)
+        if embedding is not None:
+            if blocking:
+                await asyncio.to_thread(self.cache.put, provider, model, text, embedding)
+            else:
+                self.cache.put(provider, model, text, embedding)
+        return embedding
+
+    async def iterative_scan_available(self, cur):
+        """Checks (once) whether the database's pgvector supports iterative index scans."""
+        if self._iterative_scan is None:
+            await cur.execute(PGVECTOR_VERSION_QUERY)
+            row = await cur.fetchone()
+            self._iterative_scan = has_iterative_scan(row[0] if row else None)
+        return self._iterative_scan
+
+    async def search_article_ids(self, conn, embedding, top_k=5, column="content_vector", storage="vector",
+                                 mode="vector", oversample=None, profile=None, query_text=None, weights=None,
+                                 filters=None, after=None):
+        """Async counterpart of search.search_article_ids on a pooled connection; returns the same rows."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; choose one of {', '.join(SEARCH_MODES)}")
+        filters = active_filters(filters)
+        restricted = bool(filters) or after is not None
+        query = search_query(mode, column, storage, len(embedding), filters, after is not None)
+        params = search_parameters(mode, to_vector_literal(embedding), top_k, oversample, query_text, weights,
+                                   filters, after)
+        # The settings last until search() ends the connection's transaction
+        async with conn.cursor() as cur:
+            iterative_scan = restricted and await self.iterative_scan_available(cur)
+            for attempt in range(filter_attempts(profile, restricted)):
+                settings_query = search_settings_query(
+                    search_settings(profile, restricted, attempt, iterative_scan))
+                if settings_query is not None:
+                    await cur.execute(*settings_query)
+                started = time.perf_counter()
+                await cur.execute(query, params, prepare=True)
+                results = await cur.fetchall()
+                elapsed = time.perf_counter() - started
+                if is_slow(elapsed):
+                    try:
+                        await cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                        log_slow_query(mode, elapsed,
+                                       f"{mode} on {column} top_k={top_k} profile={profile} attempt={attempt}",
+                                       await cur.fetchall())
+                    except Exception as e:
+                        print(f"Could not explain slow {mode} query: {e}")
+                if len(results) >= top_k:
+                    break
+            return results
+
+    async def fetch_articles(self, conn, results):
+        """Async counterpart of article_cache.fetch_articles: cached fields, and one query for the rest."""
+        if not results:
+            return []
+        cache = get_article_cache()
+        ids = [article_id for article_id, _ in results]
+        articles = cache.get_many(ids)
+        missing = [article_id for article_id in ids if article_id not in articles]
+        if missing:
+            async with conn.cursor() as cur:
+                await cur.execute(ARTICLE_FIELDS_QUERY, (missing,))
+                rows = [tuple(row) for row in await cur.fetchall()]
+            cache.put_many(rows)
+            articles.update((row[0], row) for row in rows)
+        return merge_articles(results, articles)
+
+    async def search(self, query_text, model_choice, search_mode="vector", profile=DEFAULT_SEARCH_PROFILE,
+                     top_k=5, page=1, oversample=BQ_OVERSAMPLE, weights=None, filters=None, cursor=None):
+        """
+        Async counterpart of search_service.search: returns the same structured response
+        and raises SearchError when the search can't be answered.
+        """
+        try:
+            with stage("total", model_choice):
+                response = await self._search(query_text, model_choice, search_mode, profile, top_k, page,
+                                              oversample, weights, filters, cursor)
+        except SearchError as e:
+            record_search(model_choice, e.outcome)
+            raise
+        except Exception as e:
+            print(f"An unexpected error occurred during search: {e}")
+            record_search(model_choice, "error")
+            raise SearchError("error", f"An error occurred: {e}") from e
+        record_search(model_choice, "ok" if response["results"] else "no_results")
+        return response
+
+    async def _search(self, query_text, model_choice, search_mode, profile, top_k, page, oversample, weights,
+                      filters, cursor):
+        spec = get_search_spec(model_choice)
+        after = decode_cursor(cursor) if cursor else None
+        offset, needed = result_window(top_k, page, after)
+        check_search_options(search_mode, profile)
+        filters = check_filters(filters)
+
+        with stage("embedding", model_choice):
+            embedding = await self.embed(model_choice, spec.model, query_text)
+        check_embedding(model_choice, spec, embedding)
+
+        cache = get_result_cache()
+        cache_key = result_cache_key(model_choice, spec.column, search_mode, profile, oversample, weights, filters,
+                                     query_text)
+        with stage("result_cache", model_choice):
+            ranked = cache.lookup(cache_key, embedding, needed)
+        record_result_cache(model_choice, ranked is not None)
+        tier = get_vector_tier()
+        answered_by_tier = tier is not None and tier.answers(spec.column, search_mode, filters)
+        # The page after a cursor whose ranking left the cache is read from the cursor on
+        # (see search_service.reads_keyset); it starts mid-ranking, so it isn't cached
+        keyset = ranked is None and after is not None and search_mode in KEYSET_MODES and not answered_by_tier
+        if ranked is None and answered_by_tier:
+            generation = cache.generation
+            limit = fetch_limit(top_k, offset)
+            with stage("query", model_choice):
+                # The NumPy scan runs in a worker thread
+                ranked = await asyncio.to_thread(tier.search, embedding, limit)
+            cache.store(cache_key, embedding, limit, ranked, generation)
+
+        rows = None
+        if ranked is not None:
+            start = position = page_start(ranked, offset, after)
+            with stage("fetch", model_choice):
+                rows = cached_rows(ranked[start:start + top_k])
+        if rows is None:
+            # The connection is only checked out once the embedding is ready
+            with stage("connection", model_choice):
+                conn = await self.pool.getconn()
+            try:
+                if ranked is None:
+                    generation = cache.generation
+                    limit = top_k if keyset else fetch_limit(top_k, offset)
+                    with stage("query", model_choice):
+                        ranked = await self.search_article_ids(conn, embedding, limit, column=spec.column,
+                                                               storage=spec.storage, mode=search_mode,
+                                                               oversample=oversample, profile=profile,
+                                                               query_text=query_text, weights=weights,
+                                                               filters=filters, after=after[1:] if keyset else None)
+                    if keyset:
+                        start, position = 0, offset
+                    else:
+                        cache.store(cache_key, embedding, limit, ranked, generation)
+                        start = position = page_start(ranked, offset, after)
+                with stage("fetch", model_choice):
+                    rows = await self.fetch_articles(conn, ranked[start:start + top_k])
+            finally:
+                # Ends the search's transaction (and its settings) here, so the pool
+                # doesn't get the connection back mid-transaction
+                try:
+                    await conn.rollback()
+                finally:
+                    await self.pool.putconn(conn)
+        return build_response(query_text, model_choice, spec, search_mode, profile, top_k, position, rows,
+                              page_has_more(ranked, start, top_k, position), filters)
+
+    async def semantic_search(self, query_text, model_choice, search_mode="vector",
+                              profile=DEFAULT_SEARCH_PROFILE, top_k=5, oversample=BQ_OVERSAMPLE):
+        """Async counterpart of main.semantic_search; returns the results as Markdown."""
+        try:
+            response = await self.search(query_text, model_choice, search_mode, profile, int(top_k),
+                                         oversample=oversample)
+        except SearchError as e:
+            return str(e)
+        with stage("format", model_choice):
+            return format_results_markdown(response["results"])
+
+
+# --- Shared Engine ---
+_engine = None
+_engine_lock = asyncio.Lock()
+
+
+async def get_async_engine():
+    """Returns the process-wide engine, opening its pool on first use (inside the running loop)."""
+    global _engine
+    if _engine is None:
+        async with _engine_lock:
+            if _engine is None:
+                engine = AsyncSearchEngine()
+                await engine.open()
+                _engine = engine
+    return _engine
+
+
+async def close_async_engine():
+    """Closes the shared engine's pool, if it was opened."""
+    global _engine
+    if _engine is not None:
+        await _engine.close()
+        _engine = None
+
+
+async def async_semantic_search(query_text, model_choice, search_mode="vector",
+                                profile=DEFAULT_SEARCH_PROFILE, top_k=5, oversample=BQ_OVERSAMPLE):
+    """Gradio handler: runs the search on the shared async engine."""
+    try:
+        engine = await get_async_engine()
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return "Failed to connect to the database. Please check your DB environment variables."
+    return await engine.semantic_search(query_text, model_choice, search_mode, profile, top_k, oversample)
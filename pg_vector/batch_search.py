@@ -0,0 +1,86 @@
+"""
+Batch semantic search: scores many queries with one embedding call and one SQL statement.
+
+The queries are embedded with a single batched provider call (cached embeddings are
+reused), and all k-NN lookups run in one statement that joins LATERAL over the array
+of query vectors (see search.batch_search_articles).
+
+    python batch_search.py --provider OpenAI --queries eval_queries.txt --top-k 10 --output results.jsonl
+"""
+import argparse
+import json
+import time
+
+from db import get_read_connection, release_db_connection
+from embedding_cache import get_embedding_cache
+from embeddings import BATCH_EMBEDDING_FUNCTIONS
+from search import BATCH_SEARCH_QUERIES, BQ_OVERSAMPLE, DEFAULT_SEARCH_PROFILE, batch_search_articles
+from search_service import (SearchError, check_embedding, check_search_options, get_search_spec, result_window,
+                            to_results)
+
+
+def batch_semantic_search(queries, model_choice, search_mode="vector", profile=DEFAULT_SEARCH_PROFILE,
+                          top_k=5, oversample=BQ_OVERSAMPLE):
+    """
+    Searches every query in queries with the chosen model. Returns one dict per query, in order:
+    {"query": text, "results": [{"rank", "id", "url", "title", "snippet", "score"}, ...]}.
+    Raises SearchError when the searches can't be answered.
+    """
+    spec = get_search_spec(model_choice)
+    check_search_options(search_mode, profile, BATCH_SEARCH_QUERIES)
+    # Same page size bounds as a single search
+    result_window(top_k, 1)
+    queries = list(queries)
+    if not queries:
+        return []
+
+    embeddings = get_embedding_cache().get_or_compute_many(
+        model_choice, spec.model, queries, BATCH_EMBEDDING_FUNCTIONS[model_choice])
+    if embeddings is None:
+        raise SearchError("embedding_error",
+                          f"Failed to get embeddings for the queries using {model_choice}. Check model setup or API key.")
+    for embedding in embeddings:
+        check_embedding(model_choice, spec, embedding)
+
+    conn = get_read_connection()
+    if not conn:
+        raise SearchError("db_unavailable",
+                          "Failed to connect to the database. Please check your DB environment variables.")
+    try:
+        rows_per_query = batch_search_articles(conn, embeddings, top_k, column=spec.column, storage=spec.storage,
+                                               mode=search_mode, oversample=oversample, profile=profile)
+    finally:
+        release_db_connection(conn)
+
+    return [{"query": query, "results": to_results(rows)} for query, rows in zip(queries, rows_per_query)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=["Ollama", "OpenAI", "HuggingFace"], default="OpenAI")
+    parser.add_argument("--queries", required=True, help="text file with one query per line")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--mode", choices=["vector", "binary"], default="vector")
+    parser.add_argument("--profile", default=DEFAULT_SEARCH_PROFILE)
+    parser.add_argument("--oversample", type=int, default=BQ_OVERSAMPLE)
+    parser.add_argument("--output", help="JSON lines file (printed when omitted)")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    started = time.perf_counter()
+    results = batch_semantic_search(queries, args.provider, args.mode, args.profile, args.top_k, args.oversample)
+    elapsed = time.perf_counter() - started
+
+    lines = [json.dumps(result) for result in results]
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"Searched {len(queries)} queries in {elapsed:.2f}s")
+    else:
+        print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Load test: concurrent users per process, synchronous vs asyncio search handler.
+
+  sync:  main.semantic_search run on a bounded thread pool, the way Gradio runs
+         synchronous handlers (40 worker threads by default)
+  async: async_search.AsyncSearchEngine.semantic_search awaited directly on one event loop
+
+Each simulated user sends searches back to back (plus optional think time) for
+--duration seconds. For each user count the report gives throughput and latency; a
+level is "sustained" when p95 latency stays under --slo-ms without errors.
+
+Queries hit the database configured through the DB_* environment variables. With
+--fake-embedding-ms the embedding provider is replaced by a fixed delay returning a
+random vector of the model's dimension, so runs don't depend on provider rate limits.
+
+    python bench_async_load.py --provider OpenAI --users 10 50 100 200 --fake-embedding-ms 80
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from async_search import AsyncSearchEngine, create_async_pool
+from model_registry import get_model_spec
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(handler, users, latencies, errors, wall, slo_ms):
+    latencies.sort()
+    p95_ms = 1000 * percentile(latencies, 0.95) if latencies else None
+    return {
+        "handler": handler,
+        "users": users,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 0.50) if latencies else None,
+        "p95_ms": p95_ms,
+        "sustained": bool(latencies) and errors == 0 and p95_ms <= slo_ms,
+    }
+
+
+async def drive(label, users, duration, think, search):
+    """Runs users closed-loop clients calling await search(query) until the duration ends."""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(number):
+        nonlocal errors
+        request = 0
+        while time.perf_counter() < deadline:
+            request += 1
+            started = time.perf_counter()
+            # Unique text per request (and run), so the embedding cache never answers
+            result = await search(f"load test query {label} {users} {number} {request}")
+            if result.startswith(("### Search Results", "No similar articles")):
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            if think:
+                await asyncio.sleep(think)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(number) for number in range(users)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_sync(args, spec, users):
+    import embeddings
+    import main
+
+    if args.fake_embedding_ms is not None:
+        def fake_embedding(text):
+            time.sleep(args.fake_embedding_ms / 1000)
+            return np.random.standard_normal(spec.dimension).tolist()
+
+        embeddings.EMBEDDING_FUNCTIONS[args.provider] = fake_embedding
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        async def search(text):
+            return await loop.run_in_executor(
+                executor, main.semantic_search, text, args.provider, args.mode, args.profile, args.top_k)
+
+        latencies, errors, wall = await drive("sync", users, args.duration, args.think_ms / 1000, search)
+    return summarize("sync", users, latencies, errors, wall, args.slo_ms)
+
+
+async def run_async(args, spec, users):
+    embedding_functions = None
+    if args.fake_embedding_ms is not None:
+        async def fake_embedding(text):
+            await asyncio.sleep(args.fake_embedding_ms / 1000)
+            return np.random.standard_normal(spec.dimension).tolist()
+
+        embedding_functions = {args.provider: fake_embedding}
+
+    engine = AsyncSearchEngine(pool=create_async_pool(min_size=args.pool_size, max_size=args.pool_size),
+                               embedding_functions=embedding_functions)
+    await engine.open()
+    try:
+        async def search(text):
+            return await engine.semantic_search(text, args.provider, args.mode, args.profile, args.top_k)
+
+        latencies, errors, wall = await drive("async", users, args.duration, args.think_ms / 1000, search)
+    finally:
+        await engine.close()
+    return summarize("async", users, latencies, errors, wall, args.slo_ms)
+
+
+async def run(args):
+    spec = get_model_spec(args.provider)
+    results = []
+    for handler in args.handler:
+        for users in args.users:
+            runner = run_sync if handler == "sync" else run_async
+            results.append(await runner(args, spec, users))
+            print(json.dumps(results[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=["Ollama", "OpenAI", "HuggingFace"], default="OpenAI")
+    parser.add_argument("--handler", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per user level")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's requests")
+    parser.add_argument("--threads", type=int, default=40, help="worker threads for the sync handler")
+    parser.add_argument("--pool-size", type=int, default=10, help="async pool size (sync uses DB_POOL_MAX_SIZE)")
+    parser.add_argument("--mode", choices=["vector", "binary"], default="vector")
+    parser.add_argument("--profile", default="balanced")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fake-embedding-ms", type=float, default=None,
+                        help="replace the embedding provider with a fixed delay")
+    parser.add_argument("--slo-ms", type=float, default=1000.0, help="p95 latency bound for a sustained level")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "provider": args.provider,
+        "fake_embedding_ms": args.fake_embedding_ms,
+        "slo_p95_ms": args.slo_ms,
+        "max_sustained_users": {
+            handler: max((r["users"] for r in results if r["handler"] == handler and r["sustained"]), default=0)
+            for handler in args.handler
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures recall@k and latency of the two-stage binary-quantized search mode.
+
+Sample queries are vectors of random rows of the column. For each oversample factor the
+'binary' mode results are compared with the exact top-k (sequential scan), next to the
+plain 'vector' mode (ANN index on the full vectors).
+
+    python bench_bq_recall.py --column content_vector --queries 100 --top-k 10 --oversample 2 4 8
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from db import create_db_connection
+from search import exact_search_ids, recall_at_k, search_articles
+
+
+def sample_vectors(conn, column, count):
+    with conn.cursor() as cur:
+        cur.execute(
+            f'SELECT "{column}"::text FROM public.articles WHERE "{column}" IS NOT NULL ORDER BY random() LIMIT %s',
+            (count,),
+        )
+        rows = cur.fetchall()
+    conn.rollback()
+    return [np.array(row[0].strip("[]").split(","), dtype=np.float32) for row in rows]
+
+
+def evaluate(conn, queries, truths, top_k, column, storage, mode, oversample=None):
+    recalls, latencies = [], []
+    for query, truth in zip(queries, truths):
+        started = time.perf_counter()
+        rows = search_articles(conn, query, top_k, column=column, storage=storage, mode=mode, oversample=oversample)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(recall_at_k(truth, [row[0] for row in rows]))
+    conn.rollback()
+    latencies.sort()
+    return {
+        f"recall_at_{top_k}": float(np.mean(recalls)),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--column", default="content_vector")
+    parser.add_argument("--storage", default="vector", choices=["vector", "halfvec"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[2, 4, 8])
+    args = parser.parse_args()
+
+    conn = create_db_connection()
+    try:
+        queries = sample_vectors(conn, args.column, args.queries)
+        truths = [exact_search_ids(conn, q, args.top_k, column=args.column, storage=args.storage) for q in queries]
+        conn.rollback()
+        report = {
+            "column": args.column,
+            "queries": len(queries),
+            "vector": evaluate(conn, queries, truths, args.top_k, args.column, args.storage, "vector"),
+        }
+        for oversample in args.oversample:
+            report[f"binary(oversample={oversample})"] = evaluate(
+                conn, queries, truths, args.top_k, args.column, args.storage, "binary", oversample)
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares search quality and size of halfvec (float16) storage against full-precision vector.
+
+For sample queries taken from the column itself, the exact top-k under float32 is the
+ground truth; recall@k is the overlap of the exact top-k computed on halfvec-rounded
+vectors with it. Also reports bytes per stored vector and the size of the existing
+ANN indexes on the table.
+
+    python bench_halfvec_recall.py --column content_vector --queries 100 --top-k 10
+    python bench_halfvec_recall.py --synthetic --rows 20000 --dimension 768
+"""
+import argparse
+import json
+
+import numpy as np
+
+from search import recall_at_k, to_vector_literal
+
+
+def synthetic_recall(rows, dimension, queries, top_k, seed=42):
+    """Recall of float16-rounded exact cosine search on clustered random vectors."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 100, 1), dimension)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), rows)] + 0.3 * rng.standard_normal((rows, dimension)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    half = data.astype(np.float16).astype(np.float32)
+    recalls = []
+    for q in rng.choice(rows, size=queries, replace=False):
+        query = data[q]
+        truth = np.argsort(-(data @ query))[:top_k]
+        found = np.argsort(-(half @ query.astype(np.float16).astype(np.float32)))[:top_k]
+        recalls.append(recall_at_k(truth.tolist(), found.tolist()))
+    return float(np.mean(recalls))
+
+
+def database_recall(conn, column, queries, top_k):
+    """Recall of exact halfvec search against exact vector search on a table column."""
+    with conn.cursor() as cur:
+        cur.execute("SET enable_indexscan = off")
+        cur.execute(f'SELECT vector_dims("{column}") FROM public.articles WHERE "{column}" IS NOT NULL LIMIT 1')
+        dimension = cur.fetchone()[0]
+        cur.execute(
+            f'SELECT "{column}"::text FROM public.articles WHERE "{column}" IS NOT NULL ORDER BY random() LIMIT %s',
+            (queries,),
+        )
+        samples = [np.array(row[0].strip("[]").split(","), dtype=np.float32) for row in cur.fetchall()]
+        recalls = []
+        for sample in samples:
+            literal = to_vector_literal(sample)
+            cur.execute(
+                f'SELECT id FROM public.articles ORDER BY "{column}" <=> %s::vector LIMIT %s',
+                (literal, top_k),
+            )
+            truth = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                f'SELECT id FROM public.articles '
+                f'ORDER BY "{column}"::halfvec({dimension}) <=> %s::halfvec({dimension}) LIMIT %s',
+                (literal, top_k),
+            )
+            found = [row[0] for row in cur.fetchall()]
+            recalls.append(recall_at_k(truth, found))
+        cur.execute(
+            """
+            SELECT i.relname, am.amname, pg_size_pretty(pg_relation_size(i.oid))
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_am am ON am.oid = i.relam
+            WHERE x.indrelid = 'public.articles'::regclass AND am.amname IN ('ivfflat', 'hnsw')
+            """
+        )
+        indexes = [{"index": name, "method": method, "size": size} for name, method, size in cur.fetchall()]
+    conn.rollback()
+    return dimension, float(np.mean(recalls)) if recalls else None, indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--column", default="content_vector")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--synthetic", action="store_true", help="use random clustered vectors instead of the database")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        dimension = args.dimension
+        recall = synthetic_recall(args.rows, dimension, args.queries, args.top_k)
+        report = {"source": "synthetic", "rows": args.rows}
+    else:
+        from db import create_db_connection
+
+        conn = create_db_connection()
+        try:
+            dimension, recall, indexes = database_recall(conn, args.column, args.queries, args.top_k)
+        finally:
+            conn.close()
+        report = {"source": f"public.articles.{args.column}", "ann_indexes": indexes}
+
+    report.update({
+        "dimension": dimension,
+        "queries": args.queries,
+        f"halfvec_recall_at_{args.top_k}": recall,
+        # pgvector stores 8 header bytes plus 4 (vector) or 2 (halfvec) bytes per dimension
+        "vector_bytes_per_row": 8 + 4 * dimension,
+        "halfvec_bytes_per_row": 8 + 2 * dimension,
+    })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmarks hybrid search latency: one fused statement vs two separate queries.
+
+  fused:    search_articles(mode='hybrid'), vector and full-text candidates fused with
+            reciprocal rank fusion inside Postgres (one round trip)
+  separate: a k-NN query and a full-text query sent one after the other, fused in Python
+
+Sample articles provide the queries: the stored vector of --column as the query vector
+and the article title as the query text. Reports per-query latency for both paths and
+how often their top-k ids agree. Requires the content_tsv column
+(python index_admin.py fulltext).
+
+    python bench_hybrid.py --column content_vector --queries 200 --top-k 10
+"""
+import argparse
+import json
+import time
+
+from db import create_db_connection
+from model_registry import get_column_type
+from search import (FULLTEXT_CONFIG, HYBRID_CANDIDATES, HYBRID_KEYWORD_WEIGHT, HYBRID_SEMANTIC_WEIGHT, RRF_K,
+                    apply_search_profile, reciprocal_rank_fusion, search_articles, to_vector_literal)
+
+SEMANTIC_SQL = """
+    SELECT id, url, title, SUBSTRING(content FROM 1 FOR 300) || '...'
+    FROM public.articles
+    ORDER BY "{column}" <=> %s::{storage}
+    LIMIT %s
+"""
+
+KEYWORD_SQL = """
+    SELECT id, url, title, SUBSTRING(content FROM 1 FOR 300) || '...'
+    FROM public.articles, websearch_to_tsquery('{text_config}', %s) query
+    WHERE content_tsv @@ query
+    ORDER BY ts_rank_cd(content_tsv, query) DESC
+    LIMIT %s
+"""
+
+
+def sample_queries(conn, column, count):
+    with conn.cursor() as cur:
+        cur.execute(
+            f'SELECT title, "{column}"::text FROM public.articles WHERE "{column}" IS NOT NULL '
+            f"ORDER BY random() LIMIT %s",
+            (count,),
+        )
+        rows = cur.fetchall()
+    conn.rollback()
+    return [(title, [float(x) for x in vector.strip("[]").split(",")]) for title, vector in rows]
+
+
+def separate_search(conn, embedding, query_text, top_k, column, storage, profile):
+    semantic_sql = SEMANTIC_SQL.format(column=column, storage=storage)
+    keyword_sql = KEYWORD_SQL.format(text_config=FULLTEXT_CONFIG)
+    candidates = max(HYBRID_CANDIDATES, top_k)
+    with conn.cursor() as cur:
+        apply_search_profile(cur, profile)
+        cur.execute(semantic_sql, (to_vector_literal(embedding), candidates))
+        semantic = cur.fetchall()
+        cur.execute(keyword_sql, (query_text, candidates))
+        keyword = cur.fetchall()
+    rows = {row[0]: row for row in semantic + keyword}
+    fused = reciprocal_rank_fusion([[row[0] for row in semantic], [row[0] for row in keyword]],
+                                   [HYBRID_SEMANTIC_WEIGHT, HYBRID_KEYWORD_WEIGHT], RRF_K)
+    return [rows[article_id] + (score,) for article_id, score in fused[:top_k]]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": 1000 * sum(latencies) / len(latencies),
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--column", default="content_vector")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--profile", default="balanced")
+    args = parser.parse_args()
+
+    conn = create_db_connection()
+    try:
+        with conn.cursor() as cur:
+            column_sql_type = get_column_type(cur, args.column)
+        conn.rollback()
+        storage = column_sql_type.split("(")[0]
+        queries = sample_queries(conn, args.column, args.queries)
+
+        # Warm-up: prepare the fused statement and load the index pages
+        for query_text, embedding in queries[:10]:
+            search_articles(conn, embedding, args.top_k, args.column, storage, mode="hybrid",
+                            profile=args.profile, query_text=query_text)
+            separate_search(conn, embedding, query_text, args.top_k, args.column, storage, args.profile)
+            conn.rollback()
+
+        fused_latencies, separate_latencies, agreement = [], [], []
+        for query_text, embedding in queries:
+            started = time.perf_counter()
+            fused = search_articles(conn, embedding, args.top_k, args.column, storage, mode="hybrid",
+                                    profile=args.profile, query_text=query_text)
+            fused_latencies.append(time.perf_counter() - started)
+            conn.rollback()
+
+            started = time.perf_counter()
+            separate = separate_search(conn, embedding, query_text, args.top_k, args.column, storage, args.profile)
+            separate_latencies.append(time.perf_counter() - started)
+            conn.rollback()
+
+            fused_ids = [row[0] for row in fused]
+            separate_ids = [row[0] for row in separate]
+            agreement.append(len(set(fused_ids) & set(separate_ids)) / max(1, len(separate_ids)))
+    finally:
+        conn.close()
+
+    print(json.dumps({
+        "column": args.column,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "candidates": max(HYBRID_CANDIDATES, args.top_k),
+        "weights": {"semantic": HYBRID_SEMANTIC_WEIGHT, "keyword": HYBRID_KEYWORD_WEIGHT, "rrf_k": RRF_K},
+        "fused_single_statement": summarize(fused_latencies),
+        "separate_two_queries": summarize(separate_latencies),
+        "top_k_agreement": sum(agreement) / len(agreement) if agreement else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
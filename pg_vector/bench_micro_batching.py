@@ -0,0 +1,74 @@
+"""
+Benchmarks Hugging Face embedding throughput with and without micro-batching.
+
+Each configuration runs `--requests` single-text requests from `--concurrency` threads.
+"unbatched" calls model.encode(text) per request (the original behaviour); the batched
+runs go through MicroBatcher with each max batch size / max wait combination.
+
+    python bench_micro_batching.py --concurrency 1 4 16 32 --batch-sizes 8 32 --max-wait-ms 2 5
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sentence_transformers import SentenceTransformer
+
+from micro_batcher import MicroBatcher
+
+
+def run(embed, texts, concurrency):
+    latencies = []
+
+    def timed(text):
+        started = time.perf_counter()
+        embed(text)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, texts))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "texts_per_second": len(texts) / elapsed,
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"))
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[2.0, 5.0])
+    args = parser.parse_args()
+
+    model = SentenceTransformer(args.model)
+    texts = [f"Query number {i} about the history of Postgres and vector search" for i in range(args.requests)]
+    model.encode(texts[:8])  # warm up
+
+    curve = []
+    for concurrency in args.concurrency:
+        row = {"concurrency": concurrency, "unbatched": run(lambda t: model.encode(t), texts, concurrency)}
+        for batch_size in args.batch_sizes:
+            for max_wait_ms in args.max_wait_ms:
+                batcher = MicroBatcher(
+                    lambda batch: model.encode(batch, batch_size=batch_size),
+                    max_batch_size=batch_size,
+                    max_wait_ms=max_wait_ms,
+                )
+                result = run(batcher.process, texts, concurrency)
+                result["avg_batch_size"] = batcher.stats()["avg_batch_size"]
+                row[f"batched(size={batch_size},wait={max_wait_ms}ms)"] = result
+        curve.append(row)
+        print(json.dumps(row))
+
+    print(json.dumps({"model": args.model, "requests": args.requests, "curve": curve}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmarks Hugging Face query embedding on CPU: PyTorch vs ONNX Runtime float32 vs int8.
+
+For each thread count, every backend embeds `--queries` texts one at a time (the latency
+of a single query) and in batches of `--batch-size` (the throughput of the micro-batcher).
+Reports queries/sec, queries/sec per core, and the cosine drift of each ONNX backend
+against PyTorch. Exports are created on first use (see onnx_backend.py).
+
+    python bench_onnx_backend.py --threads 1 2 4 --queries 256 --batch-size 32
+"""
+import argparse
+import json
+import time
+
+from embeddings import HF_EMBEDDING_MODEL
+from onnx_backend import available_cores, drift, load_encoder, sample_texts
+
+
+def run(encode, texts, batch_size):
+    started = time.perf_counter()
+    for text in texts:
+        encode([text], 1)
+    single = len(texts) / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        encode(texts[start:start + batch_size], batch_size)
+    batched = len(texts) / (time.perf_counter() - started)
+    return single, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=HF_EMBEDDING_MODEL)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, len(available_cores())])
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    texts = sample_texts(args.queries)
+    st_model = SentenceTransformer(args.model, device="cpu")
+    reference = st_model.encode(texts, batch_size=args.batch_size)
+
+    rows = []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        backends = {"torch": lambda batch, size: st_model.encode(batch, batch_size=size)}
+        for name, quantize in (("onnx", False), ("onnx-int8", True)):
+            encoder = load_encoder(args.model, quantize=quantize, threads=threads)
+            encoder.encode(texts[:8])  # warm up
+            backends[name] = encoder.encode
+        for name, encode in backends.items():
+            single, batched = run(encode, texts, args.batch_size)
+            row = {
+                "backend": name,
+                "threads": threads,
+                "single_qps": single,
+                "single_qps_per_core": single / threads,
+                "batched_qps": batched,
+                "batched_qps_per_core": batched / threads,
+            }
+            if name != "torch":
+                row["drift"] = drift(reference, encode(texts, args.batch_size))
+            rows.append(row)
+            print(json.dumps(row))
+
+    print(json.dumps({"model": args.model, "queries": len(texts), "batch_size": args.batch_size, "results": rows},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
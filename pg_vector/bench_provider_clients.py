@@ -0,0 +1,102 @@
+"""
+Benchmarks remote embedding requests against the local fake embedding server.
+
+Each configuration runs `--requests` single-text requests from `--concurrency` threads:
+"per_call_client" creates a new OpenAI client (connection pool, handshake) per request,
+the old behaviour; "shared_client" reuses one client with retries and the adaptive
+concurrency limit; "shared_batched" also coalesces concurrent requests into multi-input
+requests (embeddings.get_openai_embedding). Pass failure options to inject errors.
+
+    python bench_provider_clients.py --concurrency 1 8 32 --latency-ms 30
+    python bench_provider_clients.py --concurrency 32 --rate-limit 8 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_embedding_server import FakeEmbeddingServer
+
+
+def run(embed, texts, concurrency):
+    latencies, errors = [], 0
+
+    def timed(text):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = embed(text) is not None
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        if not ok:
+            errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, texts))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "texts_per_second": len(texts) / elapsed,
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[max(0, int(len(latencies) * 0.95) - 1)],
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer(port=0, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                                 timeout_rate=args.timeout_rate, timeout_s=5.0, rate_limit=args.rate_limit)
+    url = server.start()
+    # embeddings reads the provider settings at import time
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ.setdefault("EMBEDDING_HTTP_TIMEOUT", "2")
+    os.environ.setdefault("EMBEDDING_BACKOFF_BASE_MS", "50")
+    import embeddings
+    from openai import OpenAI
+
+    def per_call_client(text):
+        client = OpenAI(api_key="fake", max_retries=0)
+        return client.embeddings.create(input=text, model=embeddings.OPENAI_EMBEDDING_MODEL).data[0].embedding
+
+    def shared_client(text):
+        return embeddings._openai_embed([text])[0]
+
+    texts = [f"Query number {i} about the history of Postgres and vector search" for i in range(args.requests)]
+    curve = []
+    try:
+        for concurrency in args.concurrency:
+            row = {"concurrency": concurrency}
+            for name, embed in (("per_call_client", per_call_client), ("shared_client", shared_client),
+                                ("shared_batched", embeddings.get_openai_embedding)):
+                before = server.stats()
+                result = run(embed, texts, concurrency)
+                after = server.stats()
+                result["http_requests"] = after["requests"] - before["requests"]
+                result["rejected"] = sum(after[k] - before[k] for k in ("errors", "timeouts", "rate_limited"))
+                row[name] = result
+            row["batcher"] = embeddings.get_remote_batcher("OpenAI").stats()
+            row["limiter"] = embeddings.PROVIDER_LIMITS["OpenAI"].stats()
+            curve.append(row)
+            print(json.dumps(row))
+    finally:
+        server.stop()
+
+    print(json.dumps({"requests": args.requests, "latency_ms": args.latency_ms, "error_rate": args.error_rate,
+                      "timeout_rate": args.timeout_rate, "rate_limit": args.rate_limit, "curve": curve}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Startup benchmark: time-to-first-request and resident memory per provider configuration.
+
+Each run starts a fresh Python process that imports main (as the app does) and then
+serves one request with the given provider: an embedding call, or with --db a full
+semantic_search against the DB_* database. With --warmup the provider is warmed up
+(see embeddings.WARMUP_PROVIDERS) before the request. Reports the import time, the
+time from process spawn to the first answered request, resident memory after import
+and after the request, and which heavy libraries ended up imported.
+
+    python bench_startup.py --provider OpenAI Ollama HuggingFace --runs 3
+    python bench_startup.py --provider HuggingFace --warmup --db
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "openai", "ollama", "gradio")
+
+
+def resident_memory_mb():
+    """Current resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(args):
+    """Runs inside the measured process and prints one JSON line."""
+    spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+    started = time.perf_counter()
+    import main
+    from embeddings import EMBEDDING_FUNCTIONS
+
+    import_s = time.perf_counter() - started
+    rss_after_import = resident_memory_mb()
+    imported_after_startup = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    warmup_s = None
+    if args.warmup:
+        started = time.perf_counter()
+        main.start_background_warmup([args.child]).join()
+        warmup_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if args.db:
+        result = main.semantic_search("startup benchmark query", args.child, profile=None)
+        ok = result.startswith(("### Search Results", "No similar articles"))
+    else:
+        ok = EMBEDDING_FUNCTIONS[args.child]("startup benchmark query") is not None
+    first_request_s = time.perf_counter() - started
+
+    print(json.dumps({
+        "import_s": import_s,
+        "warmup_s": warmup_s,
+        "first_request_s": first_request_s,
+        "time_to_first_request_s": time.time() - spawned_at,
+        "rss_mb_after_import": rss_after_import,
+        "rss_mb_after_first_request": resident_memory_mb(),
+        "imported_after_startup": imported_after_startup,
+        "ok": ok,
+    }))
+
+
+def measure(provider, args):
+    command = [sys.executable, os.path.abspath(__file__), "--child", provider]
+    if args.warmup:
+        command.append("--warmup")
+    if args.db:
+        command.append("--db")
+    env = dict(os.environ, BENCH_SPAWNED_AT=repr(time.time()), METRICS_PORT="0")
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode != 0 or not lines:
+        print(f"{provider} run failed:\n{completed.stderr[-2000:]}")
+        return None
+    return json.loads(lines[-1])
+
+
+def summarize(provider, runs, args):
+    def median(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return statistics.median(values) if values else None
+
+    return {
+        "provider": provider,
+        "warmup": args.warmup,
+        "db": args.db,
+        "runs": len(runs),
+        "failed_requests": sum(1 for run in runs if not run["ok"]),
+        "import_s": median("import_s"),
+        "warmup_s": median("warmup_s"),
+        "first_request_s": median("first_request_s"),
+        "time_to_first_request_s": median("time_to_first_request_s"),
+        "rss_mb_after_import": median("rss_mb_after_import"),
+        "rss_mb_after_first_request": median("rss_mb_after_first_request"),
+        "imported_after_startup": runs[-1]["imported_after_startup"] if runs else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", nargs="+", choices=["Ollama", "OpenAI", "HuggingFace"],
+                        default=["OpenAI", "Ollama", "HuggingFace"])
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per provider")
+    parser.add_argument("--warmup", action="store_true", help="warm the provider up before the first request")
+    parser.add_argument("--db", action="store_true", help="first request is a full semantic_search")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = []
+    for provider in args.provider:
+        runs = [run for run in (measure(provider, args) for _ in range(args.runs)) if run is not None]
+        results.append(summarize(provider, runs, args))
+    print(json.dumps({"python": sys.version.split()[0], "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
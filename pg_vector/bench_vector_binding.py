@@ -0,0 +1,118 @@
+"""
+Benchmarks how the query vector is sent to Postgres.
+
+  before: str(embedding) pasted into the SQL text twice (the original semantic_search)
+  after:  compact float32 literal bound once to a server-side prepared statement
+
+Reports client CPU per query and bytes of SQL sent per query. With --db the queries are
+also executed against the database configured through the DB_* environment variables.
+
+    python bench_vector_binding.py --iterations 2000
+    python bench_vector_binding.py --iterations 200 --db
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from search import PREPARED_STATEMENTS, execute_prepared, search_statement, to_vector_literal
+
+STATEMENT = search_statement("content_vector", "vector")
+
+LEGACY_SQL = """
+        SELECT
+            id,
+            url,
+            title,
+            SUBSTRING(content FROM 1 FOR 300) || '...' AS truncated_content,
+            1 - (content_vector <=> '{embedding_str}') AS similarity_score
+        FROM
+            public.articles
+        ORDER BY
+            content_vector <=> '{embedding_str}'
+        LIMIT {top_k};
+        """
+
+
+def legacy_payload(embedding, top_k):
+    """Builds the SQL text the original implementation sent for one query."""
+    embedding_str = str(embedding)
+    return LEGACY_SQL.format(embedding_str=embedding_str, top_k=top_k)
+
+
+def prepared_payload(embedding, top_k):
+    """Builds the EXECUTE text the prepared-statement path sends for one query."""
+    return f"EXECUTE {STATEMENT}('{to_vector_literal(embedding)}', {top_k})"
+
+
+def measure(build, embeddings, top_k):
+    started_cpu = time.process_time()
+    total_bytes = 0
+    for embedding in embeddings:
+        total_bytes += len(build(embedding, top_k).encode("utf-8"))
+    cpu = time.process_time() - started_cpu
+    return {
+        "client_cpu_us_per_query": 1e6 * cpu / len(embeddings),
+        "bytes_per_query": total_bytes / len(embeddings),
+    }
+
+
+def measure_db(embeddings, top_k):
+    from db import create_db_connection
+
+    conn = create_db_connection()
+    results = {}
+    try:
+        with conn.cursor() as cur:
+            # Warm up both paths (prepare the statement, load the index pages)
+            cur.execute(legacy_payload(embeddings[0], top_k))
+            cur.fetchall()
+            execute_prepared(cur, STATEMENT, (to_vector_literal(embeddings[0]), top_k))
+            cur.fetchall()
+
+            for label, run in (
+                ("before", lambda e: cur.execute(legacy_payload(e, top_k))),
+                ("after", lambda e: execute_prepared(cur, STATEMENT, (to_vector_literal(e), top_k))),
+            ):
+                started_cpu = time.process_time()
+                started = time.perf_counter()
+                for embedding in embeddings:
+                    run(embedding)
+                    cur.fetchall()
+                results[label] = {
+                    "client_cpu_us_per_query": 1e6 * (time.process_time() - started_cpu) / len(embeddings),
+                    "latency_ms_per_query": 1e3 * (time.perf_counter() - started) / len(embeddings),
+                }
+        conn.rollback()
+    finally:
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="also execute the queries against the database")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    # Embedding providers hand back Python lists of floats, as the original code received them
+    embeddings = [rng.standard_normal(args.dimension).tolist() for _ in range(args.iterations)]
+
+    report = {
+        "iterations": args.iterations,
+        "dimension": args.dimension,
+        "prepare_bytes_once_per_connection": len(PREPARED_STATEMENTS[STATEMENT].encode("utf-8")),
+        "before": measure(legacy_payload, embeddings, args.top_k),
+        "after": measure(prepared_payload, embeddings, args.top_k),
+    }
+    if args.db:
+        report["database"] = measure_db(embeddings, args.top_k)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Recall and latency benchmark for the search core against a synthetic corpus.
+
+setup creates a separate database (default: vector_bench) on the DB_HOST/DB_PORT
+server, fills public.articles with clustered random vectors through binary COPY,
+optionally builds an ANN index, and writes a workload file with query vectors and
+their exact top-k ids (ground truth computed in NumPy).
+
+run replays the workload at each concurrency level through the same pooled
+connections and search_articles call that semantic_search uses, and prints QPS,
+p50/p95/p99 latency and recall@k as JSON so runs can be compared over time.
+
+    python benchmark.py setup --rows 100000 --dimension 1536 --index hnsw
+    python benchmark.py run --concurrency 1 8 32 --profile fast balanced --output results.json
+"""
+import argparse
+import json
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import psycopg2
+
+import db
+from index_admin import create_index, list_indexes
+from ingest import ingest_records
+from model_registry import ModelSpec, ensure_binary_quantization
+from search import recall_at_k, search_articles
+
+
+def connect(database):
+    return psycopg2.connect(host=db.DB_HOST, database=database, user=db.DB_USER,
+                            password=db.DB_PASSWORD, port=db.DB_PORT)
+
+
+# --- Corpus ---
+def make_corpus(rows, dimension, clusters, seed=42):
+    """Returns unit-normalized clustered random vectors and the cluster centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    assignment = rng.integers(0, clusters, rows)
+    vectors = centers[assignment] + 0.5 * rng.standard_normal((rows, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, centers
+
+
+def make_queries(centers, count, seed=7):
+    rng = np.random.default_rng(seed)
+    queries = centers[rng.integers(0, len(centers), count)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, queries, top_k, block=256):
+    """Exact cosine top-k ids (row index + 1, matching the article ids) for each query."""
+    truth = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ vectors.T
+        top = np.argpartition(-scores, top_k, axis=1)[:, :top_k]
+        for row, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            truth.append((ordered + 1).tolist())
+    return truth
+
+
+def create_database(database):
+    conn = connect(db.DB_NAME)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{database}"')
+    finally:
+        conn.close()
+
+
+def setup(args):
+    create_database(args.database)
+    vectors, centers = make_corpus(args.rows, args.dimension, args.clusters)
+    queries = make_queries(centers, args.queries)
+
+    conn = connect(args.database)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute("DROP TABLE IF EXISTS public.articles")
+            cur.execute(
+                f"""
+                CREATE TABLE public.articles (
+                    id INTEGER NOT NULL PRIMARY KEY,
+                    url TEXT,
+                    title TEXT,
+                    content TEXT,
+                    title_vector vector({args.dimension}),
+                    content_vector vector({args.dimension}),
+                    vector_id INTEGER
+                )
+                """
+            )
+        conn.commit()
+
+        records = (
+            (i + 1, f"https://example.org/{i + 1}", f"Synthetic article {i + 1}",
+             f"Synthetic content for article {i + 1}.", vector)
+            for i, vector in enumerate(vectors)
+        )
+        rows, elapsed = ingest_records(conn, records, columns=("id", "url", "title", "content", "content_vector"))
+        print(f"Loaded {rows} rows in {elapsed:.1f}s")
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE public.articles")
+        conn.commit()
+
+        if args.index != "none":
+            create_index(conn, "content_vector", args.index, lists=args.lists, m=args.m,
+                         ef_construction=args.ef_construction, concurrently=False)
+        if args.binary_quantize:
+            ensure_binary_quantization(conn, ModelSpec("synthetic", "synthetic", "content_vector",
+                                                       args.dimension, "vector"), concurrently=False)
+    finally:
+        conn.close()
+
+    truth = exact_top_k(vectors, queries, args.top_k)
+    np.savez(args.workload, queries=queries, truth=np.array(truth), top_k=args.top_k)
+    print(f"Wrote {len(queries)} queries with exact top-{args.top_k} to {args.workload}")
+
+
+# --- Replay ---
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def replay(pool, queries, truth, top_k, concurrency, mode, profile, oversample):
+    latencies = []
+    recalls = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(index):
+        nonlocal errors
+        started = time.perf_counter()
+        conn = pool.getconn()
+        try:
+            rows = search_articles(conn, queries[index], top_k, mode=mode, profile=profile, oversample=oversample)
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"Search failed: {e}")
+            return
+        finally:
+            pool.putconn(conn)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            recalls.append(recall_at_k(truth[index][:top_k], [row[0] for row in rows]))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(len(queries))))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "mode": mode,
+        "profile": profile,
+        "queries": len(queries),
+        "errors": errors,
+        "qps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 0.50) if latencies else None,
+        "p95_ms": 1000 * percentile(latencies, 0.95) if latencies else None,
+        "p99_ms": 1000 * percentile(latencies, 0.99) if latencies else None,
+        f"recall_at_{top_k}": float(np.mean(recalls)) if recalls else None,
+    }
+
+
+def run(args):
+    workload = np.load(args.workload)
+    queries = [q for q in workload["queries"]]
+    truth = workload["truth"].tolist()
+    top_k = args.top_k or int(workload["top_k"])
+    if args.limit:
+        queries, truth = queries[:args.limit], truth[:args.limit]
+
+    pool = db.ConnectionPool(lambda: connect(args.database), min_size=1,
+                             max_size=max(args.concurrency), session_setup=[])
+    pool.prewarm()
+    try:
+        conn = pool.getconn()
+        try:
+            indexes = list_indexes(conn, "content_vector")
+        finally:
+            pool.putconn(conn)
+
+        # Warm-up pass so every run sees a warm buffer cache and prepared statements
+        replay(pool, queries[:args.warmup], truth, top_k, max(args.concurrency), args.mode, args.profile[0],
+               args.oversample)
+        results = [
+            replay(pool, queries, truth, top_k, concurrency, args.mode, profile, args.oversample)
+            for profile in args.profile
+            for concurrency in args.concurrency
+        ]
+    finally:
+        pool.closeall()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "database": args.database,
+        "indexes": [{"name": i["name"], "method": i["method"], "size": i["size"]} for i in indexes],
+        "top_k": top_k,
+        "pool": pool.stats(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="vector_bench", help="benchmark database (created by setup)")
+    parser.add_argument("--workload", default="bench_workload.npz", help="query/ground-truth file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    setup_parser = subparsers.add_parser("setup", help="create the synthetic corpus and ground truth")
+    setup_parser.add_argument("--rows", type=int, default=100000)
+    setup_parser.add_argument("--dimension", type=int, default=1536)
+    setup_parser.add_argument("--clusters", type=int, default=100)
+    setup_parser.add_argument("--queries", type=int, default=1000)
+    setup_parser.add_argument("--top-k", type=int, default=10)
+    setup_parser.add_argument("--index", choices=["none", "ivfflat", "hnsw"], default="hnsw")
+    setup_parser.add_argument("--lists", type=int, default=100)
+    setup_parser.add_argument("--m", type=int, default=16)
+    setup_parser.add_argument("--ef-construction", type=int, default=64)
+    setup_parser.add_argument("--binary-quantize", action="store_true",
+                              help="also add the binary-quantized copy used by --mode binary")
+
+    run_parser = subparsers.add_parser("run", help="replay the workload and report QPS, latency and recall")
+    run_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    run_parser.add_argument("--mode", choices=["vector", "binary"], default="vector")
+    run_parser.add_argument("--profile", nargs="+", default=["balanced"])
+    run_parser.add_argument("--oversample", type=int, default=None)
+    run_parser.add_argument("--top-k", type=int, default=None, help="defaults to the workload's k")
+    run_parser.add_argument("--limit", type=int, default=None, help="replay only the first N queries")
+    run_parser.add_argument("--warmup", type=int, default=50)
+    run_parser.add_argument("--output", help="also write the JSON report to this file")
+
+    args = parser.parse_args()
+    if args.command == "setup":
+        setup(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
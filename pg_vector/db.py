@@ -0,0 +1,486 @@
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from metrics import record_pool_checkout, register_pool
+
+# --- Environment Variables ---
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_NAME = os.getenv("DB_NAME", "postgres")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+DB_PORT = os.getenv("DB_PORT", "5436")
+
+# Connection pool settings
+# export DB_POOL_MIN_SIZE=2 DB_POOL_MAX_SIZE=20
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Seconds a request waits for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Seconds after which a connection is closed and replaced by a fresh one
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+# Idle connections older than this (seconds) are checked with SELECT 1 before reuse
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+# Semicolon separated statements executed once on every new connection
+# export DB_SESSION_SETUP="SET ivfflat.probes = 10; SET hnsw.ef_search = 100"
+DB_SESSION_SETUP = os.getenv("DB_SESSION_SETUP", "SET ivfflat.probes = 10")
+
+# Read replicas that serve searches (same database, user and password as the primary)
+# export DB_REPLICA_HOSTS="replica-1:5432,replica-2:5432"
+DB_REPLICA_HOSTS = os.getenv("DB_REPLICA_HOSTS", "")
+# Replicas further behind the primary than this many seconds get no searches
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "10"))
+# Seconds between replica health and lag checks
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+# --- Database Connection ---
+def create_db_connection(host=None, port=None):
+    """Opens and returns a new (unpooled) PostgreSQL database connection (to DB_HOST by default)."""
+    return psycopg2.connect(
+        host=host or DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        port=port or DB_PORT
+    )
+
+
+def parse_hosts(spec):
+    """Parses "host[:port],host[:port]" into (host, port) pairs; the port defaults to DB_PORT."""
+    hosts = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item:
+            host, _, port = item.partition(":")
+            hosts.append((host, port or DB_PORT))
+    return hosts
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of PostgreSQL connections shared by all request handlers.
+
+    Connections are opened lazily up to max_size (min_size of them are pre-warmed),
+    validated with SELECT 1 when they have been idle for longer than health_check_after
+    seconds, and recycled once they are older than max_lifetime seconds.
+    Every new connection runs the session_setup statements (e.g. SET ivfflat.probes).
+    A named pool exports its stats as Prometheus metrics labelled with the name.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0,
+                 max_lifetime=1800.0, health_check_after=30.0, session_setup=(), name=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.session_setup = [stmt.strip() for stmt in session_setup if stmt.strip()]
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._idle = deque()   # (conn, created_at, returned_at)
+        self._in_use = {}      # id(conn) -> created_at
+        self._size = 0         # open connections plus slots reserved for connections being opened
+        self._closed = False
+
+        # Metrics
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._connections_opened = 0
+        self._connections_discarded = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+        self._checkout_seconds_total = 0.0
+        self._checkout_seconds_max = 0.0
+        if name:
+            register_pool(name, self)
+
+    def prewarm(self):
+        """Opens connections until min_size connections are idle in the pool."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                self._release_slot()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic(), time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self, timeout=None):
+        """
+        Checks out a connection, waiting up to timeout seconds (default: the pool timeout)
+        for one to be returned when the pool is at max_size. Raises PoolTimeout on expiry.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        entry = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    # LIFO keeps the most recently used (warmest) connections busy
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {timeout:.1f}s "
+                        f"(pool max_size={self.max_size})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+        waited = time.perf_counter() - started
+
+        conn = None
+        created_at = None
+        if entry is not None:
+            conn, created_at, returned_at = entry
+            if self._expired(created_at) or not self._healthy(conn, returned_at):
+                self._close_quietly(conn)
+                conn = None
+        if conn is None:
+            # The slot is already reserved, either freshly or from the discarded connection
+            try:
+                conn = self._open()
+            except Exception:
+                self._release_slot()
+                raise
+            created_at = time.monotonic()
+
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._in_use[id(conn)] = created_at
+            self._checkouts += 1
+            self._wait_seconds_total += waited
+            self._wait_seconds_max = max(self._wait_seconds_max, waited)
+            self._checkout_seconds_total += elapsed
+            self._checkout_seconds_max = max(self._checkout_seconds_max, elapsed)
+        if self.name:
+            record_pool_checkout(self.name, waited, elapsed)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Returns a connection to the pool. Any open transaction is rolled back; broken,
+        expired or explicitly closed connections are discarded and their slot freed.
+        """
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+        if created_at is None:
+            raise PoolError("trying to put unkeyed connection")
+
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+        if close or conn.closed or self._closed or self._expired(created_at):
+            self._close_quietly(conn)
+            self._release_slot()
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Closes all idle connections and refuses further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Returns a snapshot of pool size, wait time and checkout latency metrics."""
+        with self._cond:
+            checkouts = self._checkouts or 1
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "connections_opened": self._connections_opened,
+                "connections_discarded": self._connections_discarded,
+                "wait_ms_avg": 1000.0 * self._wait_seconds_total / checkouts,
+                "wait_ms_max": 1000.0 * self._wait_seconds_max,
+                "checkout_ms_avg": 1000.0 * self._checkout_seconds_total / checkouts,
+                "checkout_ms_max": 1000.0 * self._checkout_seconds_max,
+            }
+
+    def _open(self):
+        conn = self.connect()
+        try:
+            if self.session_setup:
+                with conn.cursor() as cur:
+                    for stmt in self.session_setup:
+                        cur.execute(stmt)
+                conn.commit()
+        except Exception:
+            self._close_quietly(conn)
+            raise
+        with self._cond:
+            self._connections_opened += 1
+        return conn
+
+    def _expired(self, created_at):
+        return self.max_lifetime > 0 and time.monotonic() - created_at > self.max_lifetime
+
+    def _healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _close_quietly(self, conn):
+        with self._cond:
+            self._connections_discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# --- Shared Pool ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def create_pool(connect=create_db_connection, name="primary"):
+    """Creates a pre-warmed pool with the DB_POOL_* settings around a connect function."""
+    pool = ConnectionPool(
+        connect,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+        session_setup=DB_SESSION_SETUP.split(";"),
+        name=name,
+    )
+    try:
+        pool.prewarm()
+    except Exception as e:
+        print(f"Could not pre-warm database connection pool: {e}")
+    return pool
+
+
+def create_node_pool(host, port):
+    """Creates a pool of connections to one Postgres node (a replica or a shard)."""
+    return create_pool(functools.partial(create_db_connection, host, port), name=f"{host}:{port}")
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating and pre-warming it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = create_pool()
+    return _pool
+
+
+def get_db_connection():
+    """Checks out a PostgreSQL connection from the shared pool, or returns None on failure."""
+    try:
+        return get_pool().getconn()
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        return None
+
+
+def release_db_connection(conn, close=False):
+    """Returns a connection obtained from get_db_connection() or get_read_connection() to its pool."""
+    with _checked_out_lock:
+        node = _checked_out.pop(id(conn), None)
+    try:
+        (node.pool if node is not None else get_pool()).putconn(conn, close=close)
+    except Exception as e:
+        print(f"Error returning connection to the pool: {e}")
+
+
+# --- Read Replicas ---
+class ReplicaNode:
+    """One read replica: its pool and the outcome of the last health check."""
+
+    def __init__(self, host, port, pool):
+        self.name = f"{host}:{port}"
+        self.pool = pool
+        self.healthy = False
+        self.lag = None
+        self.error = None
+
+
+class ReplicaRouter:
+    """
+    Load-balances read-only searches round-robin over the healthy read replicas.
+
+    A background thread checks every replica each check_interval seconds; a replica is
+    healthy when it answers and its replay lag is at most max_lag seconds (a caught-up
+    replica has no lag, however long ago the last write was). A replica that fails a
+    checkout or a query is taken out of rotation until its next successful check.
+    """
+
+    LAG_QUERY = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+
+    def __init__(self, hosts, pool_factory=create_node_pool, max_lag=10.0, check_interval=5.0):
+        self.nodes = [ReplicaNode(host, port, pool_factory(host, port)) for host, port in hosts]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._turn = itertools.count()
+        self._thread = None
+
+    def check(self):
+        """Measures the health and replay lag of every replica."""
+        for node in self.nodes:
+            try:
+                conn = node.pool.getconn(timeout=self.check_interval)
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(self.LAG_QUERY)
+                        node.lag = float(cur.fetchone()[0])
+                finally:
+                    node.pool.putconn(conn)
+                node.healthy = node.lag <= self.max_lag
+                node.error = None if node.healthy else f"replay lag {node.lag:.1f}s > {self.max_lag:.1f}s"
+            except Exception as e:
+                node.healthy = False
+                node.error = str(e)
+
+    def start(self):
+        """Runs a first check, then keeps checking in a daemon thread."""
+        self.check()
+
+        def check_loop():
+            while True:
+                time.sleep(self.check_interval)
+                self.check()
+
+        self._thread = threading.Thread(target=check_loop, name="replica-health-check", daemon=True)
+        self._thread.start()
+        return self
+
+    def getconn(self):
+        """Checks out a connection from the next healthy replica; returns (conn, node) or (None, None)."""
+        start = next(self._turn)
+        for offset in range(len(self.nodes)):
+            node = self.nodes[(start + offset) % len(self.nodes)]
+            if not node.healthy:
+                continue
+            try:
+                return node.pool.getconn(), node
+            except Exception as e:
+                node.healthy = False
+                node.error = str(e)
+        return None, None
+
+    def stats(self):
+        return [{"node": node.name, "healthy": node.healthy, "lag_s": node.lag, "error": node.error,
+                 "pool": node.pool.stats()} for node in self.nodes]
+
+
+_router = None
+_router_loaded = False
+_router_lock = threading.Lock()
+
+# Connections checked out from a replica, by id, with their node
+_checked_out = {}
+_checked_out_lock = threading.Lock()
+
+
+def get_replica_router():
+    """Returns the process-wide replica router for DB_REPLICA_HOSTS (started on first use), or None."""
+    global _router, _router_loaded
+    if not _router_loaded:
+        with _router_lock:
+            if not _router_loaded:
+                hosts = parse_hosts(DB_REPLICA_HOSTS)
+                if hosts:
+                    _router = ReplicaRouter(hosts, max_lag=DB_REPLICA_MAX_LAG,
+                                            check_interval=DB_REPLICA_CHECK_INTERVAL).start()
+                _router_loaded = True
+    return _router
+
+
+def get_read_connection():
+    """
+    Checks out a connection for a read-only search: from a healthy, caught-up replica when
+    DB_REPLICA_HOSTS is set, otherwise (or when no replica is available) from the primary.
+    Returns None on failure. Release it with release_db_connection().
+    """
+    router = get_replica_router()
+    if router is not None:
+        conn, node = router.getconn()
+        if conn is not None:
+            with _checked_out_lock:
+                _checked_out[id(conn)] = node
+            return conn
+    return get_db_connection()
+
+
+def is_replica_connection(conn):
+    with _checked_out_lock:
+        return id(conn) in _checked_out
+
+
+def mark_replica_down(conn, error):
+    """Takes the replica a connection came from out of rotation until its next successful check."""
+    with _checked_out_lock:
+        node = _checked_out.get(id(conn))
+    if node is not None:
+        node.healthy = False
+        node.error = str(error)
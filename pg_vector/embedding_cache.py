@@ -0,0 +1,296 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import record_embedding_cache
+
+# --- Environment Variables ---
+# Maximum number of query embeddings kept in memory
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Seconds an in-memory entry stays valid (0 disables expiry)
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+# Optional persistent tier that survives restarts:
+#   export EMBEDDING_CACHE_PERSIST="sqlite:///embedding_cache.db"
+#   export EMBEDDING_CACHE_PERSIST="postgres"   (table public.embedding_cache)
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "")
+
+
+def normalize_text(text):
+    """Normalizes query text for cache lookups (Unicode NFKC, trimmed, collapsed whitespace)."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def _text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# --- In-Memory Tier ---
+class LRUCache:
+    """A thread-safe LRU mapping with a maximum size and an optional per-entry TTL."""
+
+    def __init__(self, max_size=10000, ttl=0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- Persistent Tiers ---
+class SQLiteEmbeddingStore:
+    """Stores float32 embeddings in a local SQLite file."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                " provider TEXT NOT NULL, model TEXT NOT NULL, text_hash TEXT NOT NULL,"
+                " embedding BLOB NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (provider, model, text_hash))"
+            )
+            self._conn.commit()
+
+    def get(self, provider, model, text):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding FROM embedding_cache WHERE provider = ? AND model = ? AND text_hash = ?",
+                (provider, model, _text_key(text)),
+            ).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, provider, model, text, embedding):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?, ?)",
+                (provider, model, _text_key(text), embedding.tobytes(), time.time()),
+            )
+            self._conn.commit()
+
+
+class PostgresEmbeddingStore:
+    """Stores float32 embeddings in public.embedding_cache using the shared connection pool."""
+
+    CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS public.embedding_cache (
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding BYTEA NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (provider, model, text_hash)
+        )
+    """
+
+    def __init__(self):
+        self._table_ready = False
+
+    def _run(self, sql, params, fetch=False):
+        from db import get_pool
+
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                if not self._table_ready:
+                    cur.execute(self.CREATE_TABLE)
+                    self._table_ready = True
+                cur.execute(sql, params)
+                row = cur.fetchone() if fetch else None
+            conn.commit()
+            return row
+        finally:
+            pool.putconn(conn)
+
+    def get(self, provider, model, text):
+        row = self._run(
+            "SELECT embedding FROM public.embedding_cache WHERE provider = %s AND model = %s AND text_hash = %s",
+            (provider, model, _text_key(text)),
+            fetch=True,
+        )
+        return None if row is None else np.frombuffer(bytes(row[0]), dtype=np.float32)
+
+    def put(self, provider, model, text, embedding):
+        self._run(
+            "INSERT INTO public.embedding_cache (provider, model, text_hash, embedding) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (provider, model, text_hash) DO UPDATE SET embedding = EXCLUDED.embedding, created_at = now()",
+            (provider, model, _text_key(text), embedding.tobytes()),
+        )
+
+
+# --- Two-Tier Cache ---
+# Outcome label of each counter in the embedding_cache_lookups_total metric
+CACHE_OUTCOMES = {"memory_hits": "memory_hit", "persistent_hits": "persistent_hit", "misses": "miss",
+                  "errors": "error"}
+
+
+class EmbeddingCache:
+    """
+    Caches query embeddings keyed by (provider, model name, normalized text).
+    Lookups check the in-memory LRU first, then the optional persistent store;
+    persistent hits are promoted into memory.
+    """
+
+    def __init__(self, max_size=10000, ttl=0.0, store=None):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.store = store
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, provider, model, text):
+        """Returns the cached embedding as a list of floats, or None on a miss."""
+        text = normalize_text(text)
+        key = (provider, model, text)
+        embedding = self.memory.get(key)
+        if embedding is not None:
+            self._count("memory_hits", provider)
+            return embedding.tolist()
+        if self.store is not None:
+            try:
+                embedding = self.store.get(provider, model, text)
+            except Exception as e:
+                self._count("errors", provider)
+                print(f"Error reading persistent embedding cache: {e}")
+            if embedding is not None:
+                self.memory.put(key, embedding)
+                self._count("persistent_hits", provider)
+                return embedding.tolist()
+        self._count("misses", provider)
+        return None
+
+    def put(self, provider, model, text, embedding):
+        text = normalize_text(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.memory.put((provider, model, text), embedding)
+        if self.store is not None:
+            try:
+                self.store.put(provider, model, text, embedding)
+            except Exception as e:
+                self._count("errors", provider)
+                print(f"Error writing persistent embedding cache: {e}")
+
+    def get_or_compute(self, provider, model, text, compute):
+        """
+        Returns the cached embedding for text, or calls compute(text) and caches the result.
+        Failed computations (None) are not cached.
+        """
+        embedding = self.get(provider, model, text)
+        if embedding is not None:
+            return embedding
+        embedding = compute(text)
+        if embedding is not None:
+            self.put(provider, model, text, embedding)
+        return embedding
+
+    def get_or_compute_many(self, provider, model, texts, compute_many):
+        """
+        Returns one embedding per text. Cached texts are served from the cache and the
+        rest are computed with a single compute_many(missing_texts) call, then cached.
+        Returns None if that call fails.
+        """
+        embeddings = [self.get(provider, model, text) for text in texts]
+        missing = [index for index, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = compute_many([texts[index] for index in missing])
+            if computed is None or len(computed) != len(missing):
+                return None
+            for index, embedding in zip(missing, computed):
+                embeddings[index] = embedding
+                self.put(provider, model, texts[index], embedding)
+        return embeddings
+
+    def stats(self):
+        """Returns hit and miss counters for both tiers."""
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_evictions": self.memory.evictions,
+                "memory_expirations": self.memory.expirations,
+            }
+
+    def _count(self, counter, provider):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        record_embedding_cache(provider, CACHE_OUTCOMES[counter])
+
+
+def create_persistent_store(spec):
+    """Builds the persistent tier described by EMBEDDING_CACHE_PERSIST (or None if unset)."""
+    if not spec:
+        return None
+    if spec.startswith("sqlite:///"):
+        return SQLiteEmbeddingStore(spec[len("sqlite:///"):])
+    if spec == "postgres":
+        return PostgresEmbeddingStore()
+    raise ValueError(f"Unsupported EMBEDDING_CACHE_PERSIST value: {spec!r}")
+
+
+# --- Shared Cache ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Returns the process-wide embedding cache, creating it from the environment on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    store = create_persistent_store(EMBEDDING_CACHE_PERSIST)
+                except Exception as e:
+                    store = None
+                    print(f"Could not open persistent embedding cache {EMBEDDING_CACHE_PERSIST!r}: {e}")
+                _cache = EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL, store=store)
+    return _cache
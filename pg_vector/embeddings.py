@@ -0,0 +1,331 @@
+import os
+import threading
+import time
+
+from metrics import instrument_embedding
+from micro_batcher import MicroBatcher
+from provider_limits import EMBEDDING_MAX_CONCURRENCY, AdaptiveConcurrency, call_with_retries
+
+# --- Environment Variables ---
+# OpenAI API key (optional)
+# export OPENAI_API_KEY="your_openai_api_key"
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Ollama embedding model name (ensure this model is downloaded and running locally)
+# export OLLAMA_EMBEDDING_MODEL="nomic-embed-text"
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+
+# OpenAI embedding model ('text-embedding-ada-002' matches the 1536-dimension vectors in the database)
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Hugging Face Sentence Transformer model name. Its vectors (768 dimensions for
+# all-mpnet-base-v2) live in their own column, see model_registry.py and reembed.py.
+HF_EMBEDDING_MODEL = os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+
+# Concurrent Hugging Face requests are encoded together in one batch of up to
+# HF_BATCH_MAX_SIZE texts, waiting at most HF_BATCH_MAX_WAIT_MS for the batch to fill.
+HF_BATCH_MAX_SIZE = int(os.getenv("HF_BATCH_MAX_SIZE", "32"))
+HF_BATCH_MAX_WAIT_MS = float(os.getenv("HF_BATCH_MAX_WAIT_MS", "5"))
+
+# Maximum number of texts per OpenAI embeddings request (the API accepts up to 2048)
+OPENAI_BATCH_MAX_SIZE = int(os.getenv("OPENAI_BATCH_MAX_SIZE", "2048"))
+
+# Ollama server address (the ollama module reads OLLAMA_HOST the same way); the OpenAI
+# client reads OPENAI_BASE_URL, e.g. to point both at fake_embedding_server.py
+OLLAMA_HOST = os.getenv("OLLAMA_HOST")
+# Seconds before a single provider HTTP request times out (it is then retried)
+EMBEDDING_HTTP_TIMEOUT = float(os.getenv("EMBEDDING_HTTP_TIMEOUT", "10"))
+# Concurrent single-text OpenAI / Ollama requests are sent together as one multi-input
+# request of up to REMOTE_BATCH_MAX_SIZE texts, waiting at most REMOTE_BATCH_MAX_WAIT_MS.
+REMOTE_BATCH_MAX_SIZE = int(os.getenv("REMOTE_BATCH_MAX_SIZE", "64"))
+REMOTE_BATCH_MAX_WAIT_MS = float(os.getenv("REMOTE_BATCH_MAX_WAIT_MS", "2"))
+
+# Comma separated providers to load in the background at startup, e.g. "HuggingFace,Ollama"
+WARMUP_PROVIDERS = os.getenv("WARMUP_PROVIDERS", "")
+
+# --- Lazy Model Loading ---
+# Provider libraries are imported and the Sentence Transformer model is loaded on first
+# use, so a process serving only OpenAI or Ollama never imports torch or loads the model.
+# The model is downloaded the first time it's used if not cached locally.
+_hf_model = None
+_hf_batcher = None
+_hf_load_failed = False
+_hf_lock = threading.Lock()
+
+
+def get_hf_model():
+    """Returns the Sentence Transformer model, loading it on first use (None if it cannot be loaded)."""
+    global _hf_model, _hf_batcher, _hf_load_failed
+    if _hf_model is None and not _hf_load_failed:
+        with _hf_lock:
+            if _hf_model is None and not _hf_load_failed:
+                try:
+                    from onnx_backend import HF_BACKEND
+
+                    if HF_BACKEND == "onnx":
+                        # Same encode() interface, on ONNX Runtime instead of PyTorch
+                        from onnx_backend import load_encoder
+
+                        model = load_encoder(HF_EMBEDDING_MODEL)
+                    else:
+                        from sentence_transformers import SentenceTransformer
+
+                        model = SentenceTransformer(HF_EMBEDDING_MODEL)
+                    print(f"Loaded Hugging Face model: {HF_EMBEDDING_MODEL} ({HF_BACKEND} backend, "
+                          f"Dimension: {model.get_sentence_embedding_dimension()})")
+                except Exception as e:
+                    _hf_load_failed = True
+                    print(f"Could not load Hugging Face model {HF_EMBEDDING_MODEL}: {e}")
+                    print("Ensure 'sentence-transformers' (or, for HF_BACKEND=onnx, 'onnxruntime') "
+                          "is installed and the model name is correct.")
+                    return None
+                # One batched forward pass serves every request that arrives within the batching window.
+                _hf_batcher = MicroBatcher(
+                    lambda texts: model.encode(texts, batch_size=HF_BATCH_MAX_SIZE),
+                    max_batch_size=HF_BATCH_MAX_SIZE,
+                    max_wait_ms=HF_BATCH_MAX_WAIT_MS,
+                    name="hf-embedding-batcher",
+                )
+                _hf_model = model
+    return _hf_model
+
+
+def get_hf_batcher():
+    """Returns the micro-batcher in front of the Sentence Transformer model (None if it cannot be loaded)."""
+    if get_hf_model() is None:
+        return None
+    return _hf_batcher
+
+
+# --- Provider Clients ---
+# One long-lived client per provider, so requests reuse its pooled keep-alive HTTP
+# connections instead of opening a connection (and TLS session) per call. Retries are
+# done by provider_limits.call_with_retries, under each provider's adaptive
+# concurrency limit, so the client libraries' own retries are turned off.
+_clients = {}
+_clients_lock = threading.Lock()
+
+PROVIDER_LIMITS = {
+    "OpenAI": AdaptiveConcurrency(EMBEDDING_MAX_CONCURRENCY),
+    "Ollama": AdaptiveConcurrency(EMBEDDING_MAX_CONCURRENCY),
+}
+
+
+def _create_openai_client():
+    from openai import OpenAI
+
+    return OpenAI(api_key=OPENAI_API_KEY, timeout=EMBEDDING_HTTP_TIMEOUT, max_retries=0)
+
+
+def _create_ollama_client():
+    import ollama
+
+    return ollama.Client(host=OLLAMA_HOST, timeout=EMBEDDING_HTTP_TIMEOUT)
+
+
+def _create_remote_batcher(provider):
+    # Concurrent single-text requests become one multi-input request. Up to the provider's
+    # adaptive limit of them are in flight at once, each retried on its own pool thread.
+    return MicroBatcher(
+        {"OpenAI": _openai_embed, "Ollama": _ollama_embed}[provider],
+        max_batch_size=REMOTE_BATCH_MAX_SIZE,
+        max_wait_ms=REMOTE_BATCH_MAX_WAIT_MS,
+        name=f"{provider.lower()}-embedding-batcher",
+        max_in_flight=EMBEDDING_MAX_CONCURRENCY,
+        limit=lambda: PROVIDER_LIMITS[provider].limit,
+    )
+
+
+def _shared(name, create):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = create()
+    return client
+
+
+def get_openai_client():
+    """Returns the process-wide OpenAI client (created on first use)."""
+    return _shared("openai", _create_openai_client)
+
+
+def get_ollama_client():
+    """Returns the process-wide Ollama client (created on first use)."""
+    return _shared("ollama", _create_ollama_client)
+
+
+def get_remote_batcher(provider):
+    """Returns the micro-batcher that groups single-text requests to a remote provider."""
+    return _shared(f"{provider}-batcher", lambda: _create_remote_batcher(provider))
+
+
+# --- Embedding Functions ---
+@instrument_embedding("Ollama")
+def get_ollama_embedding(text):
+    """
+    Generates an embedding for the given text using a local Ollama model.
+    Requires Ollama server to be running and the specified model to be pulled.
+    Concurrent calls are sent together as one multi-input request.
+    """
+    try:
+        return get_remote_batcher("Ollama").process(text)
+    except Exception as e:
+        print(f"Error getting Ollama embedding: {e}")
+        return None
+
+
+@instrument_embedding("OpenAI")
+def get_openai_embedding(text):
+    """
+    Generates an embedding for the given text using OpenAI's API.
+    Requires OPENAI_API_KEY environment variable to be set.
+    Uses 'text-embedding-ada-002' to match the 1536-dimension vector in the database.
+    Concurrent calls are sent together as one multi-input request.
+    """
+    if not OPENAI_API_KEY:
+        print("OpenAI API key not set. Cannot use OpenAI embedding.")
+        return None
+    try:
+        return get_remote_batcher("OpenAI").process(text)
+    except Exception as e:
+        print(f"Error getting OpenAI embedding: {e}")
+        return None
+
+
+@instrument_embedding("HuggingFace")
+def get_huggingface_embedding(text):
+    """
+    Generates an embedding for the given text using a Hugging Face Sentence Transformer model.
+    """
+    hf_batcher = get_hf_batcher()
+    if hf_batcher is None:
+        print("Hugging Face model not loaded. Cannot generate embedding.")
+        return None
+    try:
+        # The batcher returns this caller's row of the batched numpy array,
+        # convert to list for PostgreSQL
+        embedding = hf_batcher.process(text).tolist()
+        return embedding
+    except Exception as e:
+        print(f"Error getting Hugging Face embedding: {e}")
+        return None
+
+
+def get_huggingface_embeddings(texts, batch_size=HF_BATCH_MAX_SIZE):
+    """
+    Generates embeddings for a list of texts with one batched Sentence Transformer call.
+    Returns a list of embeddings, or None if the model is unavailable or encoding fails.
+    """
+    hf_model = get_hf_model()
+    if hf_model is None:
+        print("Hugging Face model not loaded. Cannot generate embeddings.")
+        return None
+    try:
+        return hf_model.encode(texts, batch_size=batch_size).tolist()
+    except Exception as e:
+        print(f"Error getting Hugging Face embeddings: {e}")
+        return None
+
+
+def _ollama_embed(texts):
+    client = get_ollama_client()
+    response = call_with_retries(lambda: client.embed(model=OLLAMA_EMBEDDING_MODEL, input=list(texts)),
+                                 PROVIDER_LIMITS["Ollama"])
+    return response["embeddings"]
+
+
+def _openai_embed(texts):
+    client = get_openai_client()
+    texts = list(texts)
+    embeddings = []
+    for start in range(0, len(texts), OPENAI_BATCH_MAX_SIZE):
+        chunk = texts[start:start + OPENAI_BATCH_MAX_SIZE]
+        response = call_with_retries(lambda: client.embeddings.create(input=chunk, model=OPENAI_EMBEDDING_MODEL),
+                                     PROVIDER_LIMITS["OpenAI"])
+        embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return embeddings
+
+
+@instrument_embedding("Ollama")
+def get_ollama_embeddings(texts):
+    """
+    Generates embeddings for a list of texts with one Ollama embed request.
+    Returns a list of embeddings, or None if the request fails.
+    """
+    try:
+        return _ollama_embed(texts)
+    except Exception as e:
+        print(f"Error getting Ollama embeddings: {e}")
+        return None
+
+
+@instrument_embedding("OpenAI")
+def get_openai_embeddings(texts):
+    """
+    Generates embeddings for a list of texts with as few OpenAI requests as possible
+    (OPENAI_BATCH_MAX_SIZE texts each). Returns a list of embeddings, or None on failure.
+    """
+    if not OPENAI_API_KEY:
+        print("OpenAI API key not set. Cannot use OpenAI embedding.")
+        return None
+    try:
+        return _openai_embed(texts)
+    except Exception as e:
+        print(f"Error getting OpenAI embeddings: {e}")
+        return None
+
+
+# --- Provider Lookup ---
+# Single-text embedding function and model name for each provider choice
+EMBEDDING_FUNCTIONS = {
+    "Ollama": get_ollama_embedding,
+    "OpenAI": get_openai_embedding,
+    "HuggingFace": get_huggingface_embedding,
+}
+
+# Batched embedding function (list of texts -> list of embeddings) for each provider choice
+BATCH_EMBEDDING_FUNCTIONS = {
+    "Ollama": get_ollama_embeddings,
+    "OpenAI": get_openai_embeddings,
+    "HuggingFace": get_huggingface_embeddings,
+}
+
+EMBEDDING_MODELS = {
+    "Ollama": OLLAMA_EMBEDDING_MODEL,
+    "OpenAI": OPENAI_EMBEDDING_MODEL,
+    "HuggingFace": HF_EMBEDDING_MODEL,
+}
+
+
+# --- Warm-up ---
+def warm_up(providers):
+    """
+    Loads the given providers ahead of the first request: the Sentence Transformer model
+    (plus one forward pass), the Ollama model on the Ollama server, the OpenAI client library.
+    """
+    for provider in providers:
+        started = time.perf_counter()
+        if provider == "HuggingFace":
+            ok = get_huggingface_embedding("warm-up") is not None
+        elif provider == "Ollama":
+            ok = get_ollama_embedding("warm-up") is not None
+        elif provider == "OpenAI":
+            import openai  # noqa: F401 (import cost only, no billed request)
+            ok = True
+        else:
+            print(f"Unknown warm-up provider {provider!r}")
+            continue
+        print(f"Warm-up of {provider} {'finished' if ok else 'failed'} in {time.perf_counter() - started:.1f}s")
+
+
+def start_background_warmup(providers=None):
+    """Warms up WARMUP_PROVIDERS (or the given providers) in a daemon thread; returns the thread or None."""
+    if providers is None:
+        providers = [p.strip() for p in WARMUP_PROVIDERS.split(",") if p.strip()]
+    if not providers:
+        return None
+    thread = threading.Thread(target=warm_up, args=(providers,), name="provider-warmup", daemon=True)
+    thread.start()
+    return thread
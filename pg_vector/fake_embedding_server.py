@@ -0,0 +1,187 @@
+"""
+A local stand-in for the OpenAI and Ollama embedding APIs, for testing throughput and
+failure handling offline.
+
+Each text gets a deterministic unit vector seeded by its hash, so the same text always
+embeds the same way. Every request waits --latency-ms (plus a small per-text cost), and
+failures can be injected: --error-rate answers 500, --timeout-rate stalls the request
+past the client's timeout, and --rate-limit answers 429 with a Retry-After header once
+more than that many requests are in flight at once.
+
+    python fake_embedding_server.py --port 8900 --latency-ms 50 --rate-limit 8 --error-rate 0.02
+
+    export OPENAI_BASE_URL="http://localhost:8900/v1" OPENAI_API_KEY="fake"
+    export OLLAMA_HOST="http://localhost:8900"
+
+Endpoints: POST /v1/embeddings (OpenAI), POST /api/embed and /api/embeddings (Ollama),
+GET /stats (request, text and failure counters).
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text, dimension):
+    """A deterministic unit vector for text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddingServer:
+    """The fake embedding API on a ThreadingHTTPServer, started in a daemon thread by start()."""
+
+    def __init__(self, port=8900, dimension=1536, latency_ms=20.0, per_text_ms=0.1, error_rate=0.0,
+                 timeout_rate=0.0, timeout_s=30.0, rate_limit=0, retry_after=1):
+        self.port = port
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.counters = {"requests": 0, "texts": 0, "errors": 0, "timeouts": 0, "rate_limited": 0,
+                         "max_in_flight": 0}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def handle(self, path, body):
+        """Returns (status, headers, payload) for a POST to path."""
+        with self._lock:
+            self.counters["requests"] += 1
+            self._in_flight += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self._in_flight)
+            in_flight = self._in_flight
+        try:
+            if self.rate_limit and in_flight > self.rate_limit:
+                self._count("rate_limited")
+                return 429, {"Retry-After": str(self.retry_after)}, {"error": {"message": "Rate limit exceeded"}}
+            roll = random.random()
+            if roll < self.timeout_rate:
+                self._count("timeouts")
+                time.sleep(self.timeout_s)
+                return 504, {}, {"error": {"message": "Timed out"}}
+            if roll < self.timeout_rate + self.error_rate:
+                self._count("errors")
+                return 500, {}, {"error": {"message": "Injected failure"}}
+
+            if path == "/v1/embeddings":
+                texts = body.get("input")
+            elif path == "/api/embed":
+                texts = body.get("input")
+            elif path == "/api/embeddings":
+                texts = body.get("prompt")
+            else:
+                return 404, {}, {"error": {"message": f"Unknown endpoint {path}"}}
+            single = isinstance(texts, str)
+            texts = [texts] if single else list(texts or [])
+            self._count("texts", len(texts))
+            time.sleep((self.latency_ms + self.per_text_ms * len(texts)) / 1000.0)
+            embeddings = [fake_embedding(text, self.dimension) for text in texts]
+
+            model = body.get("model", "fake")
+            if path == "/v1/embeddings":
+                return 200, {}, {
+                    "object": "list",
+                    "model": model,
+                    "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(embeddings)],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                }
+            if path == "/api/embed":
+                return 200, {}, {"model": model, "embeddings": embeddings}
+            return 200, {}, {"embedding": embeddings[0] if embeddings else []}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def start(self):
+        """Starts serving on localhost:port in a daemon thread; returns the base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def _send(self, status, headers, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(400, {}, {"error": {"message": "Invalid JSON"}})
+                    return
+                self._send(*fake.handle(self.path.split("?")[0], body))
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self._send(200, {}, fake.stats())
+                else:
+                    self._send(404, {}, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-embedding-server", daemon=True).start()
+        return f"http://127.0.0.1:{self.port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fixed cost of every request")
+    parser.add_argument("--per-text-ms", type=float, default=0.1, help="Added cost of every text in a request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that stall")
+    parser.add_argument("--timeout-s", type=float, default=30.0, help="How long a stalled request stalls")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requests in flight before answering 429 (0: off)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer(args.port, args.dimension, args.latency_ms, args.per_text_ms, args.error_rate,
+                                 args.timeout_rate, args.timeout_s, args.rate_limit, args.retry_after)
+    url = server.start()
+    print(f"Fake embedding server listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
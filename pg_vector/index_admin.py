@@ -0,0 +1,278 @@
+"""
+Creates, rebuilds and switches the ivfflat/HNSW indexes on public.articles vector columns.
+
+Builds run CONCURRENTLY by default (searches keep running) with the given
+maintenance_work_mem and max_parallel_maintenance_workers. Switching builds the new
+index first and only then drops the column's other ANN indexes.
+
+    python index_admin.py list
+    python index_admin.py create --column content_vector --method hnsw --m 16 --ef-construction 64
+    python index_admin.py switch --column title_vector --method ivfflat --lists 1000 --parallel-workers 4
+    python index_admin.py rebuild --name articles_content_vector_hnsw_m16_ef64
+    python index_admin.py fulltext
+    python index_admin.py metadata
+    python index_admin.py create --column content_vector --method hnsw --filter category --value Science
+"""
+import argparse
+import re
+import time
+import zlib
+
+from model_registry import COSINE_OPS, get_column_type
+from search import FULLTEXT_CONFIG, SEARCH_FILTERS
+
+INDEX_METHODS = ("ivfflat", "hnsw")
+
+# Metadata columns used by the search filters (search.SEARCH_FILTERS), with a B-tree index each
+METADATA_COLUMNS = {"category": "text", "language": "text", "published_at": "timestamptz"}
+
+
+def operator_class(column_sql_type):
+    """Returns the cosine (or Hamming, for bit columns) operator class for a column type."""
+    if column_sql_type.startswith("bit"):
+        return "bit_hamming_ops"
+    if column_sql_type.startswith("halfvec"):
+        return COSINE_OPS["halfvec"]
+    return COSINE_OPS["vector"]
+
+
+def index_name(column, method, lists=None, m=None, ef_construction=None, where=None):
+    if method == "ivfflat":
+        name = f"articles_{column}_ivfflat_lists{lists}"
+    else:
+        name = f"articles_{column}_hnsw_m{m}_ef{ef_construction}"
+    if where is not None:
+        filter_name, value = where
+        name += f"_{filter_name}_" + re.sub(r"[^a-z0-9]+", "_", str(value).lower()).strip("_")
+    # Postgres truncates identifiers to 63 bytes; keep long names distinct
+    if len(name) > 63:
+        name = f"{name[:50]}_{zlib.crc32(name.encode()):08x}"
+    return name
+
+
+def filter_predicate(cur, filter_name, value):
+    """Returns the search filter's predicate with the value inlined, e.g. category = 'Science'."""
+    if filter_name not in SEARCH_FILTERS:
+        raise ValueError(f"Unknown search filter {filter_name!r}; choose from {', '.join(SEARCH_FILTERS)}")
+    return cur.mogrify(SEARCH_FILTERS[filter_name][0], {filter_name: value}).decode()
+
+
+def list_indexes(conn, column=None):
+    """
+    Returns the ANN indexes on public.articles as dicts
+    (name, column, method, size, valid, partial, definition).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT i.relname, a.attname, am.amname, pg_size_pretty(pg_relation_size(i.oid)),
+                   x.indisvalid, x.indpred IS NOT NULL, pg_get_indexdef(i.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_am am ON am.oid = i.relam
+            LEFT JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+            WHERE x.indrelid = 'public.articles'::regclass
+              AND am.amname IN ('ivfflat', 'hnsw')
+              AND (%(column)s::text IS NULL OR a.attname = %(column)s)
+            ORDER BY i.relname
+            """,
+            {"column": column},
+        )
+        rows = cur.fetchall()
+    conn.rollback()
+    return [
+        {"name": name, "column": col, "method": method, "size": size, "valid": valid, "partial": partial,
+         "definition": definition}
+        for name, col, method, size, valid, partial, definition in rows
+    ]
+
+
+def _run_maintenance(conn, statements, maintenance_work_mem=None, parallel_workers=None):
+    """Runs statements in autocommit mode (required by CONCURRENTLY) with build settings applied."""
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            if maintenance_work_mem:
+                cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", (maintenance_work_mem,))
+            if parallel_workers is not None:
+                cur.execute("SELECT set_config('max_parallel_maintenance_workers', %s, false)",
+                            (str(parallel_workers),))
+            for statement in statements:
+                started = time.perf_counter()
+                cur.execute(statement)
+                print(f"{time.perf_counter() - started:.1f}s: {statement}")
+            cur.execute("RESET maintenance_work_mem")
+            cur.execute("RESET max_parallel_maintenance_workers")
+    finally:
+        conn.autocommit = previous_autocommit
+
+
+def create_index(conn, column="content_vector", method="hnsw", lists=1000, m=16, ef_construction=64,
+                 concurrently=True, maintenance_work_mem="1GB", parallel_workers=None, where=None):
+    """
+    Builds an ivfflat (lists) or HNSW (m, ef_construction) index on a vector column; returns its name.
+    where=(filter name, value) builds a partial index over the rows matching that search
+    filter, which filtered searches for the value scan instead of the whole-table index.
+    """
+    if method not in INDEX_METHODS:
+        raise ValueError(f"Unsupported index method {method!r}; choose one of {', '.join(INDEX_METHODS)}")
+    with conn.cursor() as cur:
+        column_sql_type = get_column_type(cur, column)
+        predicate = filter_predicate(cur, *where) if where is not None else None
+    conn.rollback()
+    if column_sql_type is None:
+        raise ValueError(f"public.articles has no column {column!r}")
+
+    name = index_name(column, method, lists=lists, m=m, ef_construction=ef_construction, where=where)
+    if method == "ivfflat":
+        options = f"lists = {int(lists)}"
+    else:
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    statement = (
+        f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS "{name}" ON public.articles '
+        f'USING {method} ("{column}" {operator_class(column_sql_type)}) WITH ({options})'
+        + (f" WHERE {predicate}" if predicate else "")
+    )
+    # A failed CONCURRENTLY build leaves an INVALID index behind, which IF NOT EXISTS would
+    # keep; drop it so the index is built again
+    existing = next((index for index in list_indexes(conn, column) if index["name"] == name), None)
+    if existing is not None and not existing["valid"]:
+        print(f"Index {name} is INVALID (an interrupted build); rebuilding it")
+        drop_index(conn, name, concurrently=concurrently)
+    _run_maintenance(conn, [statement], maintenance_work_mem, parallel_workers)
+    return name
+
+
+def is_index_valid(conn, name):
+    """True when the index exists and can be used by queries (pg_index.indisvalid)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT x.indisvalid FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE i.relname = %s AND i.relnamespace = 'public'::regnamespace",
+            (name,),
+        )
+        row = cur.fetchone()
+    conn.rollback()
+    return bool(row and row[0])
+
+
+def rebuild_index(conn, name, concurrently=True, maintenance_work_mem="1GB", parallel_workers=None):
+    """Rebuilds an index in place (e.g. after a bulk load shifted the ivfflat list centers)."""
+    statement = f'REINDEX INDEX {"CONCURRENTLY " if concurrently else ""}public."{name}"'
+    _run_maintenance(conn, [statement], maintenance_work_mem, parallel_workers)
+
+
+def drop_index(conn, name, concurrently=True):
+    _run_maintenance(conn, [f'DROP INDEX {"CONCURRENTLY " if concurrently else ""}IF EXISTS public."{name}"'])
+
+
+def switch_index(conn, column="content_vector", method="hnsw", concurrently=True, **build_options):
+    """
+    Builds the requested index and then drops every other whole-table ANN index on the
+    column, so searches are never left without an index. Partial indexes are kept, and
+    nothing is dropped unless the new index is valid. Returns the new index name.
+    """
+    new_name = create_index(conn, column, method, concurrently=concurrently, **build_options)
+    if not is_index_valid(conn, new_name):
+        raise RuntimeError(f"Index {new_name} is not valid; the column's other indexes were kept")
+    for index in list_indexes(conn, column):
+        if index["name"] != new_name and not index["partial"]:
+            drop_index(conn, index["name"], concurrently=concurrently)
+    return new_name
+
+
+def ensure_fulltext_search(conn, config=FULLTEXT_CONFIG, concurrently=True, maintenance_work_mem="1GB"):
+    """
+    Adds the content_tsv tsvector column generated from title and content, and its GIN
+    index, used by the 'hybrid' search mode. Adding the stored column rewrites the table once.
+    """
+    with conn.cursor() as cur:
+        column_sql_type = get_column_type(cur, "content_tsv")
+    conn.rollback()
+    statements = []
+    if column_sql_type is None:
+        statements.append(
+            "ALTER TABLE public.articles ADD COLUMN content_tsv tsvector GENERATED ALWAYS AS "
+            f"(to_tsvector('{config}', coalesce(title, '') || ' ' || coalesce(content, ''))) STORED"
+        )
+    statements.append(
+        f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS articles_content_tsv_gin '
+        "ON public.articles USING gin (content_tsv)"
+    )
+    _run_maintenance(conn, statements, maintenance_work_mem)
+
+
+def ensure_metadata_columns(conn, concurrently=True, maintenance_work_mem="1GB"):
+    """
+    Adds the category, language and published_at columns used by the search filters
+    (empty until filled by the ingestion), with a B-tree index on each.
+    """
+    statements = [
+        f"ALTER TABLE public.articles ADD COLUMN IF NOT EXISTS {column} {sql_type}"
+        for column, sql_type in METADATA_COLUMNS.items()
+    ]
+    statements += [
+        f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS articles_{column}_idx '
+        f"ON public.articles ({column})"
+        for column in METADATA_COLUMNS
+    ]
+    _run_maintenance(conn, statements, maintenance_work_mem)
+
+
+def main():
+    from db import create_db_connection
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["list", "create", "switch", "rebuild", "drop", "fulltext", "metadata"])
+    parser.add_argument("--column", default="content_vector")
+    parser.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+    parser.add_argument("--name", help="index name for rebuild/drop")
+    parser.add_argument("--lists", type=int, default=1000, help="ivfflat lists")
+    parser.add_argument("--m", type=int, default=16, help="HNSW max connections per layer")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW build candidate list size")
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    parser.add_argument("--parallel-workers", type=int, default=None, help="max_parallel_maintenance_workers")
+    parser.add_argument("--filter", choices=list(SEARCH_FILTERS), help="build a partial index for one filter value")
+    parser.add_argument("--value", help="filter value of the partial index (with --filter)")
+    parser.add_argument("--blocking", action="store_true", help="build without CONCURRENTLY (faster, locks writes)")
+    args = parser.parse_args()
+
+    conn = create_db_connection()
+    try:
+        build_options = {
+            "lists": args.lists,
+            "m": args.m,
+            "ef_construction": args.ef_construction,
+            "maintenance_work_mem": args.maintenance_work_mem,
+            "parallel_workers": args.parallel_workers,
+        }
+        concurrently = not args.blocking
+        if args.action == "create":
+            if args.filter and args.value is None:
+                parser.error("--filter requires --value")
+            where = (args.filter, args.value) if args.filter else None
+            create_index(conn, args.column, args.method, concurrently=concurrently, where=where, **build_options)
+        elif args.action == "switch":
+            switch_index(conn, args.column, args.method, concurrently=concurrently, **build_options)
+        elif args.action == "fulltext":
+            ensure_fulltext_search(conn, concurrently=concurrently, maintenance_work_mem=args.maintenance_work_mem)
+        elif args.action == "metadata":
+            ensure_metadata_columns(conn, concurrently=concurrently, maintenance_work_mem=args.maintenance_work_mem)
+        elif args.action in ("rebuild", "drop"):
+            if not args.name:
+                parser.error(f"{args.action} requires --name")
+            if args.action == "rebuild":
+                rebuild_index(conn, args.name, concurrently=concurrently,
+                              maintenance_work_mem=args.maintenance_work_mem, parallel_workers=args.parallel_workers)
+            else:
+                drop_index(conn, args.name, concurrently=concurrently)
+        for index in list_indexes(conn):
+            print(f'{index["name"]}: {index["method"]} on {index["column"]}, {index["size"]}'
+                  f'{" (partial)" if index["partial"] else ""}{"" if index["valid"] else " (INVALID)"}')
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Bulk loads articles into public.articles through binary COPY.
+
+Streams the Wikipedia CSV (or any iterable of records) in chunks, so memory stays
+bounded by --chunk-rows regardless of the file size. Vectors are sent in pgvector's
+binary format instead of being text-parsed by Postgres. With --defer-indexes the
+ivfflat/HNSW indexes on the table are dropped before the load and rebuilt afterwards.
+
+    python ingest.py vector_database_wikipedia_articles_embedded.csv --create-table --defer-indexes
+"""
+import argparse
+import csv
+import io
+import struct
+import sys
+import time
+
+import numpy as np
+
+from db import create_db_connection
+
+ARTICLE_COLUMNS = ("id", "url", "title", "content", "title_vector", "content_vector", "vector_id")
+
+# Binary COPY encoders per column type
+COLUMN_TYPES = {
+    "id": "int4",
+    "url": "text",
+    "title": "text",
+    "content": "text",
+    "title_vector": "vector",
+    "content_vector": "vector",
+    "vector_id": "int4",
+}
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS public.articles (
+        id INTEGER NOT NULL PRIMARY KEY,
+        url TEXT,
+        title TEXT,
+        content TEXT,
+        title_vector vector(1536),
+        content_vector vector(1536),
+        vector_id INTEGER
+    )
+"""
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+
+
+# --- Binary COPY Encoding ---
+def parse_vector(value):
+    """Parses a vector given as text ('[0.1, 0.2, ...]') or a sequence into a float32 array."""
+    if isinstance(value, str):
+        return np.array(value.strip().strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def encode_field(kind, value):
+    """Encodes a single value in Postgres binary COPY format (length prefix included)."""
+    if value is None or (isinstance(value, str) and value == ""):
+        return NULL_FIELD
+    if kind == "int4":
+        return struct.pack(">ii", 4, int(value))
+    if kind == "text":
+        data = str(value).encode("utf-8")
+        return struct.pack(">i", len(data)) + data
+    if kind == "vector":
+        # pgvector binary format: int16 dimensions, int16 unused, float4[dimensions]
+        vector = parse_vector(value)
+        data = struct.pack(">hh", len(vector), 0) + vector.astype(">f4").tobytes()
+        return struct.pack(">i", len(data)) + data
+    raise ValueError(f"Unsupported column type: {kind}")
+
+
+def encode_rows(rows, columns):
+    """Encodes rows (tuples in column order) as binary COPY tuples."""
+    kinds = [COLUMN_TYPES[column] for column in columns]
+    field_count = struct.pack(">h", len(columns))
+    buffer = io.BytesIO()
+    for row in rows:
+        buffer.write(field_count)
+        for kind, value in zip(kinds, row):
+            buffer.write(encode_field(kind, value))
+    return buffer.getvalue()
+
+
+class BinaryCopyStream(io.RawIOBase):
+    """
+    A file-like object that psycopg2's copy_expert reads from. Records are pulled from the
+    iterable and encoded chunk_rows at a time, so only one chunk is held in memory.
+    """
+
+    def __init__(self, records, columns, chunk_rows=1000, on_chunk=None):
+        self._records = iter(records)
+        self._columns = columns
+        self._chunk_rows = chunk_rows
+        self._on_chunk = on_chunk
+        self._buffer = COPY_HEADER
+        self._offset = 0
+        self._finished = False
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        chunk = []
+        for record in self._records:
+            chunk.append(record)
+            if len(chunk) >= self._chunk_rows:
+                break
+        if chunk:
+            self._buffer = encode_rows(chunk, self._columns)
+            self.rows += len(chunk)
+            if self._on_chunk:
+                self._on_chunk(self.rows)
+        else:
+            self._buffer = COPY_TRAILER
+            self._finished = True
+        self._offset = 0
+
+    def read(self, size=-1):
+        if self._offset >= len(self._buffer):
+            if self._finished:
+                return b""
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer) - self._offset
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+# --- Sources ---
+def read_articles_csv(path):
+    """Streams rows from the Wikipedia articles CSV as tuples in ARTICLE_COLUMNS order."""
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            yield tuple(row[:len(ARTICLE_COLUMNS)])
+
+
+# --- Index Handling ---
+def drop_vector_indexes(conn, table="articles"):
+    """Drops the ivfflat/HNSW indexes on public.<table> and returns their definitions."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT indexname, indexdef
+            FROM pg_indexes
+            WHERE schemaname = 'public' AND tablename = %s AND indexdef ~* 'USING (ivfflat|hnsw)'
+            """,
+            (table,),
+        )
+        indexes = cur.fetchall()
+        for name, _ in indexes:
+            cur.execute(f'DROP INDEX IF EXISTS public."{name}"')
+    conn.commit()
+    return [definition for _, definition in indexes]
+
+
+def create_indexes(conn, definitions, maintenance_work_mem=None):
+    """Recreates indexes from their CREATE INDEX definitions."""
+    with conn.cursor() as cur:
+        if maintenance_work_mem:
+            cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", (maintenance_work_mem,))
+        for definition in definitions:
+            started = time.perf_counter()
+            cur.execute(definition)
+            conn.commit()
+            print(f"Built index in {time.perf_counter() - started:.1f}s: {definition}")
+
+
+# --- Ingest ---
+def ingest_records(conn, records, columns=ARTICLE_COLUMNS, table="public.articles", chunk_rows=1000,
+                   report_every=10000):
+    """
+    Loads records (tuples in column order) into table with a single binary COPY.
+    Returns (rows_loaded, elapsed_seconds).
+    """
+    started = time.perf_counter()
+    last_report = [0]
+
+    def report(rows):
+        if rows - last_report[0] >= report_every:
+            last_report[0] = rows
+            elapsed = time.perf_counter() - started
+            print(f"{rows} rows loaded ({rows / elapsed:.0f} rows/s)")
+
+    stream = BinaryCopyStream(records, columns, chunk_rows=chunk_rows, on_chunk=report)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT BINARY)", stream)
+    conn.commit()
+    return stream.rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path", help="path to vector_database_wikipedia_articles_embedded.csv")
+    parser.add_argument("--chunk-rows", type=int, default=1000, help="rows encoded and held in memory at a time")
+    parser.add_argument("--create-table", action="store_true", help="create public.articles if it does not exist")
+    parser.add_argument("--truncate", action="store_true", help="empty public.articles before loading")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="drop the ivfflat/HNSW indexes before the load and rebuild them afterwards")
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="maintenance_work_mem for index builds")
+    args = parser.parse_args()
+
+    conn = create_db_connection()
+    try:
+        with conn.cursor() as cur:
+            if args.create_table:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                cur.execute(CREATE_TABLE)
+            if args.truncate:
+                cur.execute("TRUNCATE public.articles")
+        conn.commit()
+
+        deferred = drop_vector_indexes(conn) if args.defer_indexes else []
+        if deferred:
+            print(f"Dropped {len(deferred)} vector indexes; they will be rebuilt after the load.")
+
+        try:
+            rows, elapsed = ingest_records(conn, read_articles_csv(args.csv_path), chunk_rows=args.chunk_rows)
+            print(f"Loaded {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+        finally:
+            # Rebuild the dropped indexes even if the load failed
+            if deferred:
+                conn.rollback()
+                create_indexes(conn, deferred, maintenance_work_mem=args.maintenance_work_mem)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Latency instrumentation for the search path.
+
+Every stage of a search (connection checkout, embedding, vector query, formatting)
+is timed into a Prometheus histogram labelled by stage and provider, and every search
+and embedding call is counted by provider and outcome. When OTEL_TRACING is enabled
+each stage is also an OpenTelemetry span. Queries slower than SLOW_QUERY_MS are
+logged with their EXPLAIN (ANALYZE, BUFFERS) plan. The database connection pools
+(db.ConnectionPool) export their size, checkouts, wait and checkout latency.
+
+prometheus_client and opentelemetry are optional: without them the timings are
+simply not exported.
+"""
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# --- Environment Variables ---
+# Port of the Prometheus /metrics endpoint started by main.py (0 disables it)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8000"))
+# Export each stage as an OpenTelemetry span (configure the exporter with the
+# standard OTEL_EXPORTER_OTLP_* variables)
+OTEL_TRACING = os.getenv("OTEL_TRACING", "0") == "1"
+# Vector queries slower than this many milliseconds get their plan logged (0 disables)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+# File the slow-query plans are appended to (printed when unset)
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+
+try:
+    from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    Counter = Histogram = start_http_server = None
+
+# Latency buckets in seconds, from a cached embedding to a cold provider call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+if Histogram is not None:
+    SEARCH_STAGE_SECONDS = Histogram(
+        "search_stage_seconds", "Time spent in each stage of a semantic search",
+        ["stage", "provider"], buckets=LATENCY_BUCKETS)
+    SEARCH_REQUESTS = Counter(
+        "search_requests_total", "Semantic searches by provider and outcome", ["provider", "outcome"])
+    EMBEDDING_SECONDS = Histogram(
+        "embedding_request_seconds", "Embedding provider call latency",
+        ["provider", "outcome"], buckets=LATENCY_BUCKETS)
+    EMBEDDING_REQUESTS = Counter(
+        "embedding_requests_total", "Embedding provider calls by provider and outcome", ["provider", "outcome"])
+    SLOW_QUERIES = Counter("search_slow_queries_total", "Vector queries slower than SLOW_QUERY_MS", ["mode"])
+    RESULT_CACHE_LOOKUPS = Counter(
+        "search_result_cache_lookups_total", "Semantic result cache lookups by provider and outcome",
+        ["provider", "outcome"])
+    EMBEDDING_CACHE_LOOKUPS = Counter(
+        "embedding_cache_lookups_total",
+        "Query embedding cache lookups by provider and outcome (memory_hit, persistent_hit, miss, error)",
+        ["provider", "outcome"])
+    DB_POOL_WAIT_SECONDS = Histogram(
+        "db_pool_wait_seconds", "Time a checkout waited for a free pooled connection",
+        ["pool"], buckets=LATENCY_BUCKETS)
+    DB_POOL_CHECKOUT_SECONDS = Histogram(
+        "db_pool_checkout_seconds", "Time to check out a pooled connection (wait, health check, connect)",
+        ["pool"], buckets=LATENCY_BUCKETS)
+else:
+    SEARCH_STAGE_SECONDS = SEARCH_REQUESTS = EMBEDDING_SECONDS = EMBEDDING_REQUESTS = SLOW_QUERIES = None
+    RESULT_CACHE_LOOKUPS = EMBEDDING_CACHE_LOOKUPS = DB_POOL_WAIT_SECONDS = DB_POOL_CHECKOUT_SECONDS = None
+
+# Connection pool stats exported at scrape time, labelled by pool
+# ('primary' or the host:port of a replica or shard)
+POOL_GAUGES = {
+    "size": "Open connections, including those being opened",
+    "idle": "Idle connections",
+    "in_use": "Checked out connections",
+    "waiting": "Checkouts waiting for a free connection",
+    "max_size": "Upper bound on open connections",
+}
+POOL_COUNTERS = {
+    "checkouts": "Connections checked out",
+    "timeouts": "Checkouts that gave up waiting for a connection",
+    "connections_opened": "Connections opened",
+    "connections_discarded": "Connections closed as broken, expired or unhealthy",
+}
+
+
+def _setup_tracer():
+    from opentelemetry import trace
+
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": "pg-vector-search"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    except ImportError:
+        # API only: spans go to whatever provider the process was started with
+        # (e.g. by opentelemetry-instrument)
+        pass
+    return trace.get_tracer("pg_vector.search")
+
+
+tracer = None
+if OTEL_TRACING:
+    try:
+        tracer = _setup_tracer()
+    except Exception as e:
+        print(f"Could not enable OpenTelemetry tracing: {e}")
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serves the Prometheus metrics on http://0.0.0.0:<port>/metrics (no-op if disabled or unavailable)."""
+    if not port:
+        return
+    if start_http_server is None:
+        print("prometheus_client is not installed; metrics endpoint disabled.")
+        return
+    try:
+        start_http_server(port)
+        print(f"Serving Prometheus metrics on port {port}")
+    except Exception as e:
+        print(f"Could not start metrics endpoint on port {port}: {e}")
+
+
+# --- Connection Pools ---
+_pools = {}
+
+
+class _PoolCollector:
+    """Reads the stats() of every registered connection pool when Prometheus scrapes."""
+
+    def collect(self):
+        gauges = {key: GaugeMetricFamily(f"db_pool_{key}", description, labels=["pool"])
+                  for key, description in POOL_GAUGES.items()}
+        counters = {key: CounterMetricFamily(f"db_pool_{key}", description, labels=["pool"])
+                    for key, description in POOL_COUNTERS.items()}
+        for name, pool in list(_pools.items()):
+            stats = pool.stats()
+            for key, family in list(gauges.items()) + list(counters.items()):
+                family.add_metric([name], stats[key])
+        yield from gauges.values()
+        yield from counters.values()
+
+
+if Histogram is not None:
+    REGISTRY.register(_PoolCollector())
+
+
+def register_pool(name, pool):
+    """Exports a connection pool's stats() as db_pool_* metrics labelled pool=name."""
+    _pools[name] = pool
+
+
+def record_pool_checkout(name, waited, elapsed):
+    """Observes one checkout's wait for a free connection and its total checkout time."""
+    if DB_POOL_WAIT_SECONDS is not None:
+        DB_POOL_WAIT_SECONDS.labels(name).observe(waited)
+        DB_POOL_CHECKOUT_SECONDS.labels(name).observe(elapsed)
+
+
+# --- Spans ---
+@contextmanager
+def span(name, provider=""):
+    """An OpenTelemetry span around a block when tracing is enabled, otherwise nothing."""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name) as current:
+        if provider:
+            current.set_attribute("search.provider", provider)
+        yield current
+
+
+@contextmanager
+def stage(name, provider=""):
+    """Times a block as one search stage (histogram observation and, if enabled, a span)."""
+    started = time.perf_counter()
+    try:
+        with span(f"search.{name}", provider) as current:
+            yield current
+    finally:
+        if SEARCH_STAGE_SECONDS is not None:
+            SEARCH_STAGE_SECONDS.labels(name, provider).observe(time.perf_counter() - started)
+
+
+def record_search(provider, outcome):
+    """Counts a finished search, e.g. outcome 'ok', 'no_results', 'embedding_error' or 'error'."""
+    if SEARCH_REQUESTS is not None:
+        SEARCH_REQUESTS.labels(provider, outcome).inc()
+
+
+def record_result_cache(provider, hit):
+    """Counts a semantic result cache lookup as outcome 'hit' or 'miss'."""
+    if RESULT_CACHE_LOOKUPS is not None:
+        RESULT_CACHE_LOOKUPS.labels(provider, "hit" if hit else "miss").inc()
+
+
+def record_embedding_cache(provider, outcome):
+    """Counts an embedding cache lookup or store error: 'memory_hit', 'persistent_hit', 'miss' or 'error'."""
+    if EMBEDDING_CACHE_LOOKUPS is not None:
+        EMBEDDING_CACHE_LOOKUPS.labels(provider, outcome).inc()
+
+
+def _record_embedding(provider, outcome, elapsed):
+    if EMBEDDING_SECONDS is not None:
+        EMBEDDING_SECONDS.labels(provider, outcome).observe(elapsed)
+        EMBEDDING_REQUESTS.labels(provider, outcome).inc()
+
+
+def instrument_embedding(provider):
+    """
+    Decorates a (sync or async) embedding function so each call is timed and counted.
+    A None result counts as outcome 'error', like an exception.
+    """
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(f"embedding.{provider}", provider):
+                    started = time.perf_counter()
+                    outcome = "error"
+                    try:
+                        result = await fn(*args, **kwargs)
+                        outcome = "ok" if result is not None else "error"
+                        return result
+                    finally:
+                        _record_embedding(provider, outcome, time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(f"embedding.{provider}", provider):
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = fn(*args, **kwargs)
+                    outcome = "ok" if result is not None else "error"
+                    return result
+                finally:
+                    _record_embedding(provider, outcome, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+# --- Slow-Query Log ---
+def is_slow(elapsed):
+    return SLOW_QUERY_MS > 0 and elapsed * 1000 > SLOW_QUERY_MS
+
+
+def log_slow_query(mode, elapsed, description, plan_rows):
+    """Writes one slow-query entry with its EXPLAIN (ANALYZE, BUFFERS) plan."""
+    if SLOW_QUERIES is not None:
+        SLOW_QUERIES.labels(mode).inc()
+    plan = "\n".join(f"    {row[0]}" for row in plan_rows)
+    entry = (
+        f"{datetime.now(timezone.utc).isoformat()} slow {mode} query ({1000 * elapsed:.1f} ms > "
+        f"{SLOW_QUERY_MS:.0f} ms): {description}\n{plan}\n"
+    )
+    if not SLOW_QUERY_LOG:
+        print(entry, end="")
+        return
+    try:
+        with open(SLOW_QUERY_LOG, "a") as f:
+            f.write(entry)
+    except OSError as e:
+        print(f"Could not write slow-query log {SLOW_QUERY_LOG!r}: {e}")
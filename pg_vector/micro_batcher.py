@@ -0,0 +1,239 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently from many threads and processes them together.
+
+    A background worker waits for the first item, then keeps collecting until it has
+    max_batch_size items or max_wait_ms milliseconds have passed, calls
+    batch_fn(list_of_items) once and hands each caller its own result.
+    batch_fn must return one result per item, in order.
+
+    With max_in_flight > 1, batches run on a pool of that many threads instead of the
+    worker itself, up to limit() batches at once (e.g. a provider's adaptive concurrency limit).
+    While they are all busy, new items wait in the queue and go out together in the next
+    batch, and a batch that is slow or backing off never holds up the others.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0, name="micro-batcher", max_in_flight=1,
+                 limit=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = limit
+        self._queue = queue.Queue()
+        self._worker = None
+        self._executor = None
+        self._in_flight = 0
+        self._capacity = threading.Condition()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Queues an item and returns a Future that resolves to its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def process(self, item, timeout=None):
+        """Queues an item and blocks until its result is available."""
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self):
+        """Returns the number of batches run and the average batch size."""
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "queued": self._queue.qsize(),
+                "in_flight": self._in_flight,
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                if self.max_in_flight > 1:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                        thread_name_prefix=self.name)
+                worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                worker.start()
+                self._worker = worker
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Still take whatever is already queued, without waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _max_in_flight(self):
+        limit = self.limit() if self.limit is not None else self.max_in_flight
+        return max(1, min(self.max_in_flight, int(limit)))
+
+    def _run(self):
+        while True:
+            if self._executor is not None:
+                # Wait for a free slot first, so items queue up into the next batch meanwhile
+                with self._capacity:
+                    while self._in_flight >= self._max_in_flight():
+                        self._capacity.wait()
+            batch = self._collect()
+            # Callers that gave up (cancelled futures) are dropped from the batch
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self._executor is None:
+                self._dispatch(batch)
+                continue
+            with self._capacity:
+                self._in_flight += 1
+            self._executor.submit(self._dispatch_released, batch)
+
+    def _dispatch_released(self, batch):
+        try:
+            self._dispatch(batch)
+        finally:
+            with self._capacity:
+                self._in_flight -= 1
+                self._capacity.notify()
+
+    def _dispatch(self, batch):
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+
+
+class AsyncMicroBatcher:
+    """
+    The same batching for coroutines on one event loop: `await batcher.process(item)`.
+    batch_fn is a coroutine function; batches run as tasks, up to limit() of them at once
+    (at most max_in_flight), and the next batch is collected while they wait.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0, name="async-micro-batcher",
+                 max_in_flight=1, limit=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = limit
+        self._loop = None
+        self._queue = None
+        self._capacity = None
+        self._worker = None
+        self._tasks = set()
+        self._in_flight = 0
+        self.batches = 0
+        self.items = 0
+
+    async def process(self, item):
+        """Queues an item and waits for its result."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._in_flight,
+        }
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues and tasks belong to one event loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._capacity = asyncio.Condition()
+            self._in_flight = 0
+            self._worker = loop.create_task(self._run())
+
+    def _max_in_flight(self):
+        limit = self.limit() if self.limit is not None else self.max_in_flight
+        return max(1, min(self.max_in_flight, int(limit)))
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            async with self._capacity:
+                await self._capacity.wait_for(lambda: self._in_flight < self._max_in_flight())
+            batch = [(item, future) for item, future in await self._collect() if not future.done()]
+            if not batch:
+                continue
+            self._in_flight += 1
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+        finally:
+            async with self._capacity:
+                self._in_flight -= 1
+                self._capacity.notify()
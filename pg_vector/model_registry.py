@@ -0,0 +1,167 @@
+import os
+import re
+from collections import namedtuple
+
+from embeddings import HF_EMBEDDING_MODEL, OLLAMA_EMBEDDING_MODEL, OPENAI_EMBEDDING_MODEL
+
+# Where the vectors of one embedding model live in public.articles.
+#   column:    vector column searched for this model
+#   dimension: number of dimensions the model produces
+#   storage:   'vector' (float32) or 'halfvec' (float16, half the heap and index size)
+ModelSpec = namedtuple("ModelSpec", ["provider", "model", "column", "dimension", "storage"])
+
+VECTOR_STORAGE_TYPES = ("vector", "halfvec")
+
+# Index operator class per storage type (cosine distance, matching the <=> operator)
+COSINE_OPS = {"vector": "vector_cosine_ops", "halfvec": "halfvec_cosine_ops"}
+
+
+def default_column(model):
+    """Derives a column name for a model, e.g. 'nomic-embed-text' -> 'content_vector_nomic_embed_text'."""
+    slug = re.sub(r"[^a-z0-9]+", "_", model.split("/")[-1].lower()).strip("_")
+    return f"content_vector_{slug}"
+
+
+def _spec_from_env(prefix, provider, model, column, dimension, storage="vector"):
+    # Every field can be overridden, e.g. HF_VECTOR_COLUMN, HF_EMBEDDING_DIMENSION, HF_VECTOR_STORAGE
+    storage = os.getenv(f"{prefix}_VECTOR_STORAGE", storage)
+    if storage not in VECTOR_STORAGE_TYPES:
+        raise ValueError(f"{prefix}_VECTOR_STORAGE must be one of {VECTOR_STORAGE_TYPES}, got {storage!r}")
+    return ModelSpec(
+        provider=provider,
+        model=model,
+        column=os.getenv(f"{prefix}_VECTOR_COLUMN", column),
+        dimension=int(os.getenv(f"{prefix}_EMBEDDING_DIMENSION", str(dimension))),
+        storage=storage,
+    )
+
+
+# --- Registry ---
+# The OpenAI vectors shipped with the Wikipedia dataset live in content_vector (1536 dims).
+# Ollama and Hugging Face models get their own columns, filled by reembed.py.
+MODEL_REGISTRY = {
+    "OpenAI": _spec_from_env("OPENAI", "OpenAI", OPENAI_EMBEDDING_MODEL, "content_vector", 1536),
+    "Ollama": _spec_from_env("OLLAMA", "Ollama", OLLAMA_EMBEDDING_MODEL,
+                             default_column(OLLAMA_EMBEDDING_MODEL), 768),
+    "HuggingFace": _spec_from_env("HF", "HuggingFace", HF_EMBEDDING_MODEL,
+                                  default_column(HF_EMBEDDING_MODEL), 768),
+}
+
+
+def get_model_spec(provider):
+    """Returns the ModelSpec registered for a provider choice, or None if unknown."""
+    return MODEL_REGISTRY.get(provider)
+
+
+def column_type(spec):
+    """Returns the SQL type of a model's vector column, e.g. 'halfvec(768)'."""
+    return f"{spec.storage}({spec.dimension})"
+
+
+# --- Schema ---
+def ensure_model_column(conn, spec):
+    """
+    Creates the model's vector column if it does not exist, or converts an existing
+    column to the registered storage type. Converting drops the column's ANN indexes
+    (their operator class depends on the type); rebuild them with create_model_index.
+    """
+    with conn.cursor() as cur:
+        current_type = get_column_type(cur, spec.column)
+        if current_type is None:
+            cur.execute(f'ALTER TABLE public.articles ADD COLUMN "{spec.column}" {column_type(spec)}')
+        elif current_type != column_type(spec):
+            for index_name in _ann_indexes(cur, spec.column):
+                cur.execute(f'DROP INDEX IF EXISTS public."{index_name}"')
+            cur.execute(
+                f'ALTER TABLE public.articles ALTER COLUMN "{spec.column}" TYPE {column_type(spec)} '
+                f'USING "{spec.column}"::{column_type(spec)}'
+            )
+            print(f"Converted public.articles.{spec.column} from {current_type} to {column_type(spec)}")
+    conn.commit()
+
+
+def create_model_index(conn, spec, method="hnsw", lists=1000, concurrently=True):
+    """
+    Creates an ivfflat or HNSW cosine index on the model's vector column with
+    index_admin.create_index, so it is named and found like every other ANN index.
+    """
+    from index_admin import create_index
+
+    return create_index(conn, spec.column, method, lists=lists, concurrently=concurrently)
+
+
+def ensure_binary_quantization(conn, spec, index_method="hnsw", concurrently=True):
+    """
+    Adds a <column>_bq bit(dimension) column generated from binary_quantize(<column>),
+    with its own Hamming-distance index (index_admin.create_index), used by the 'binary'
+    search mode. Adding the stored column rewrites the table once.
+    """
+    from index_admin import create_index
+
+    bq_column = f"{spec.column}_bq"
+    with conn.cursor() as cur:
+        cur.execute(
+            f'ALTER TABLE public.articles ADD COLUMN IF NOT EXISTS "{bq_column}" bit({spec.dimension}) '
+            f'GENERATED ALWAYS AS (binary_quantize("{spec.column}")::bit({spec.dimension})) STORED'
+        )
+    conn.commit()
+    return create_index(conn, bq_column, index_method, concurrently=concurrently)
+
+
+def get_column_type(cur, column):
+    """Returns the SQL type of public.articles.<column> (e.g. 'vector(1536)'), or None if missing."""
+    cur.execute(
+        """
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = 'public.articles'::regclass AND attname = %s AND NOT attisdropped
+        """,
+        (column,),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _ann_indexes(cur, column):
+    cur.execute(
+        """
+        SELECT i.relname
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = ANY (x.indkey)
+        WHERE x.indrelid = 'public.articles'::regclass AND a.attname = %s AND am.amname IN ('ivfflat', 'hnsw')
+        """,
+        (column,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def main():
+    import argparse
+
+    from db import create_db_connection
+
+    parser = argparse.ArgumentParser(description="Create or convert a model's vector column and its ANN index.")
+    parser.add_argument("--provider", required=True, choices=sorted(MODEL_REGISTRY))
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], help="also create an ANN index on the column")
+    parser.add_argument("--lists", type=int, default=1000, help="ivfflat lists")
+    parser.add_argument("--binary-quantize", action="store_true",
+                        help="also add the binary-quantized <column>_bq copy and its index")
+    args = parser.parse_args()
+
+    spec = get_model_spec(args.provider)
+    conn = create_db_connection()
+    try:
+        ensure_model_column(conn, spec)
+        print(f"{spec.provider} ({spec.model}) -> public.articles.{spec.column} {column_type(spec)}")
+        if args.index:
+            create_model_index(conn, spec, method=args.index, lists=args.lists)
+        if args.binary_quantize:
+            ensure_binary_quantization(conn, spec)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
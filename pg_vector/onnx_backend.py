@@ -0,0 +1,273 @@
+"""
+ONNX Runtime CPU backend for the Hugging Face Sentence Transformer model.
+
+`export` traces the model's transformer once with PyTorch and writes it to ONNX,
+optionally with int8 dynamic quantization of its weights. The tokenizer and the pooling
+settings (mean / CLS pooling, normalization) are saved alongside, so serving needs only
+onnxruntime, numpy and the tokenizer, not torch. With HF_BACKEND=onnx,
+embeddings.get_hf_model() loads an OnnxEncoder instead of the SentenceTransformer; it
+has the same encode(texts, batch_size) interface, so the micro-batcher and re-embedding
+use it unchanged.
+
+The session runs one intra-op thread per core this process may use, each pinned to its
+own core. Every batch is sorted by length before tokenizing, so texts of similar length
+are padded together.
+
+    python onnx_backend.py export                  # onnx_models/<model>/model.onnx
+    python onnx_backend.py export --quantize       # onnx_models/<model>/model.int8.onnx
+    python onnx_backend.py check --quantize --texts 500
+
+check embeds sample texts with PyTorch and ONNX Runtime and reports the cosine drift.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+# --- Environment Variables ---
+# Hugging Face inference backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime on CPU)
+HF_BACKEND = os.getenv("HF_BACKEND", "torch")
+# Directory holding the exported models, one subdirectory per model name
+HF_ONNX_DIR = os.getenv("HF_ONNX_DIR", "onnx_models")
+# Serve the int8 dynamically quantized export instead of the float32 one
+HF_ONNX_QUANTIZE = os.getenv("HF_ONNX_QUANTIZE", "0") == "1"
+# Intra-op threads of the ONNX Runtime session (0: one per core available to this process)
+HF_ONNX_THREADS = int(os.getenv("HF_ONNX_THREADS", "0"))
+
+ONNX_OPSET = 14
+
+
+def export_dir(model_name, base_dir=None):
+    """Directory of the ONNX export of model_name."""
+    return os.path.join(base_dir or HF_ONNX_DIR, model_name.replace("/", "__"))
+
+
+def model_file(directory, quantize=False):
+    return os.path.join(directory, "model.int8.onnx" if quantize else "model.onnx")
+
+
+def available_cores():
+    """The CPU cores this process may run on (its affinity mask, where the OS has one)."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+# --- Export ---
+def export(model_name, directory=None, quantize=False):
+    """
+    Exports the SentenceTransformer model_name to ONNX in directory (export_dir by
+    default) and, with quantize, also writes the int8 dynamically quantized model.
+    Returns the path of the model file to serve.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    directory = directory or export_dir(model_name)
+    os.makedirs(directory, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                   if name in tokenizer.model_input_names]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    sample = tokenizer(["An example sentence for tracing"], return_tensors="pt")
+    path = model_file(directory)
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            tuple(sample[name] for name in input_names),
+            path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names},
+                          "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=ONNX_OPSET,
+        )
+    tokenizer.save_pretrained(directory)
+
+    pooling = next((module for module in st_model if isinstance(module, Pooling)), None)
+    config = {
+        "model": model_name,
+        "pooling": "cls" if pooling is not None and pooling.pooling_mode_cls_token else "mean",
+        "normalize": any(isinstance(module, Normalize) for module in st_model),
+        "max_seq_length": st_model.max_seq_length,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "input_names": input_names,
+    }
+    with open(os.path.join(directory, "encoder.json"), "w") as f:
+        json.dump(config, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, model_file(directory, quantize=True), weight_type=QuantType.QInt8)
+        path = model_file(directory, quantize=True)
+    return path
+
+
+# --- Inference ---
+def session_options(threads=0):
+    """ONNX Runtime session options: threads intra-op threads (0: one per available core), each pinned to a core."""
+    import onnxruntime as ort
+
+    cores = available_cores()
+    threads = threads or len(cores)
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    if 1 < threads <= len(cores):
+        # The calling thread is the first intra-op thread; pin the other threads-1 to one
+        # core each (ONNX Runtime numbers logical processors from 1)
+        affinities = ";".join(str(core + 1) for core in cores[1:threads])
+        try:
+            options.add_session_config_entry("session.intra_op_thread_affinities", affinities)
+        except Exception as e:
+            print(f"ONNX Runtime thread pinning unavailable: {e}")
+    return options
+
+
+class OnnxEncoder:
+    """
+    Encodes texts with an exported model on ONNX Runtime's CPU provider. encode() takes
+    and returns the same as SentenceTransformer.encode for a list of texts.
+    """
+
+    def __init__(self, directory, quantize=False, threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, "encoder.json")) as f:
+            self.config = json.load(f)
+        self.path = model_file(directory, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.session = ort.InferenceSession(self.path, sess_options=session_options(threads),
+                                            providers=["CPUExecutionProvider"])
+        self.max_seq_length = self.config["max_seq_length"]
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def _encode_batch(self, texts):
+        tokens = self.tokenizer(texts, padding="longest", truncation=True, max_length=self.max_seq_length,
+                                return_tensors="np")
+        feed = {name: tokens[name].astype(np.int64) for name in self.config["input_names"]}
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = feed["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, texts, batch_size=32):
+        """Returns a (len(texts), dimension) float32 array; a single string gives one vector."""
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Longest first, so each batch holds texts of similar length and little padding
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            embeddings[chunk] = self._encode_batch([texts[i] for i in chunk])
+        return embeddings
+
+
+def load_encoder(model_name, directory=None, quantize=None, threads=None):
+    """OnnxEncoder for model_name's export (HF_ONNX_QUANTIZE / HF_ONNX_THREADS by default), exporting it first if missing."""
+    directory = directory or export_dir(model_name)
+    quantize = HF_ONNX_QUANTIZE if quantize is None else quantize
+    if not os.path.exists(model_file(directory, quantize)):
+        print(f"Exporting {model_name} to ONNX in {directory} (int8: {quantize})")
+        export(model_name, directory, quantize)
+    return OnnxEncoder(directory, quantize, HF_ONNX_THREADS if threads is None else threads)
+
+
+# --- Accuracy ---
+def sample_texts(count):
+    """Titles and content of public.articles to embed, or generated sentences without a database."""
+    try:
+        from db import create_db_connection
+
+        conn = create_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT title, substring(content FROM 1 FOR 1000) FROM public.articles "
+                            "ORDER BY id LIMIT %s", (max(1, count // 2),))
+                texts = [text for row in cur.fetchall() for text in row if text]
+        finally:
+            conn.close()
+        if texts:
+            return texts[:count]
+    except Exception as e:
+        print(f"Using generated texts ({e})")
+    return [f"Query number {i} about the history of Postgres and vector search" for i in range(count)]
+
+
+def drift(reference, candidate):
+    """Cosine drift (1 - cosine similarity) between matching rows of two embedding arrays."""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+    distance = 1.0 - cosine
+    return {
+        "texts": len(distance),
+        "mean_drift": float(distance.mean()),
+        "p99_drift": float(np.quantile(distance, 0.99)),
+        "max_drift": float(distance.max()),
+        "min_cosine": float(cosine.min()),
+    }
+
+
+def check(model_name, texts, quantize=False, batch_size=32, directory=None):
+    """Embeds texts with PyTorch and with the ONNX export and returns their cosine drift."""
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device="cpu").encode(texts, batch_size=batch_size)
+    candidate = load_encoder(model_name, directory, quantize).encode(texts, batch_size=batch_size)
+    result = drift(reference, candidate)
+    result.update({"model": model_name, "int8": quantize})
+    return result
+
+
+def main():
+    from embeddings import HF_EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["export", "check"])
+    parser.add_argument("--model", default=HF_EMBEDDING_MODEL)
+    parser.add_argument("--dir", default=None, help="export directory (default: HF_ONNX_DIR/<model>)")
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic quantization")
+    parser.add_argument("--texts", type=int, default=200, help="texts embedded by check")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.action == "export":
+        path = export(args.model, args.dir, args.quantize)
+        print(f"Exported {args.model} to {path}")
+    else:
+        print(json.dumps(check(args.model, sample_texts(args.texts), args.quantize, args.batch_size,
+                               args.dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
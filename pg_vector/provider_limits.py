@@ -0,0 +1,172 @@
+"""
+Retries and adaptive concurrency for the remote embedding providers (OpenAI, Ollama).
+
+Each provider gets an AIMD concurrency limit: every successful call raises the limit of
+in-flight requests a little (by 1 / limit, up to EMBEDDING_MAX_CONCURRENCY), and every
+429 or timeout halves it, so a rate-limited provider is sent fewer requests at once
+instead of more retries. Failed calls that can succeed later (429, 5xx, timeouts,
+connection errors) are retried up to EMBEDDING_RETRIES times with exponential backoff
+and jitter, honouring the provider's Retry-After header.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# --- Environment Variables ---
+# Most requests in flight to one provider (the adaptive limit starts here)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "16"))
+# Retries of a failed provider call (429, 5xx, timeouts, connection errors)
+EMBEDDING_RETRIES = int(os.getenv("EMBEDDING_RETRIES", "4"))
+# Backoff before retry n is about EMBEDDING_BACKOFF_BASE_MS * 2^n, capped at EMBEDDING_BACKOFF_MAX_MS
+EMBEDDING_BACKOFF_BASE_MS = float(os.getenv("EMBEDDING_BACKOFF_BASE_MS", "200"))
+EMBEDDING_BACKOFF_MAX_MS = float(os.getenv("EMBEDDING_BACKOFF_MAX_MS", "10000"))
+
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+# --- Error Classification ---
+def status_code(error):
+    """HTTP status of a provider error (openai, ollama and httpx errors), or None."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_timeout(error):
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(error).__name__
+
+
+def is_overload(error):
+    """True for errors that mean the provider wants fewer requests: 429 and timeouts."""
+    return status_code(error) == 429 or is_timeout(error)
+
+
+def is_retryable(error):
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return is_timeout(error) or "Connect" in type(error).__name__
+
+
+def retry_delay(attempt, error=None):
+    """Seconds to wait before retry attempt (0-based): the Retry-After header, else jittered backoff."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), EMBEDDING_BACKOFF_MAX_MS / 1000.0)
+        except ValueError:
+            pass
+    cap = min(EMBEDDING_BACKOFF_MAX_MS, EMBEDDING_BACKOFF_BASE_MS * 2 ** attempt) / 1000.0
+    return cap / 2 + random.uniform(0, cap / 2)
+
+
+# --- Adaptive Concurrency ---
+class AdaptiveConcurrency:
+    """
+    An AIMD limit on the requests in flight to one provider, shared by threads.
+    Use `with limiter.slot():` around each request and report its outcome.
+    """
+
+    def __init__(self, max_limit=16, min_limit=1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.successes = 0
+        self.overloads = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.successes += 1
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_overload(self):
+        with self._cond:
+            self.overloads += 1
+            self.limit = max(self.min_limit, self.limit / 2)
+
+    def stats(self):
+        with self._cond:
+            return {"limit": int(self.limit), "in_flight": self.in_flight, "successes": self.successes,
+                    "overloads": self.overloads}
+
+
+class AsyncAdaptiveConcurrency(AdaptiveConcurrency):
+    """The same AIMD limit for coroutines on one event loop (`async with limiter.slot():`)."""
+
+    def __init__(self, max_limit=16, min_limit=1):
+        super().__init__(max_limit, min_limit)
+        self._async_cond = None
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        async with self._async_cond:
+            await self._async_cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._async_cond:
+                self.in_flight -= 1
+                self._async_cond.notify_all()
+
+
+# --- Retries ---
+def call_with_retries(fn, limiter, retries=None):
+    """Calls fn() inside a limiter slot, retrying retryable failures with backoff; raises the last error."""
+    retries = EMBEDDING_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        with limiter.slot():
+            try:
+                result = fn()
+            except Exception as e:
+                error = e
+            else:
+                limiter.on_success()
+                return result
+        if is_overload(error):
+            limiter.on_overload()
+        if attempt == retries or not is_retryable(error):
+            raise error
+        time.sleep(retry_delay(attempt, error))
+
+
+async def async_call_with_retries(fn, limiter, retries=None):
+    """Async counterpart of call_with_retries: awaits fn() inside an AsyncAdaptiveConcurrency slot."""
+    retries = EMBEDDING_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        async with limiter.slot():
+            try:
+                result = await fn()
+            except Exception as e:
+                error = e
+            else:
+                limiter.on_success()
+                return result
+        if is_overload(error):
+            limiter.on_overload()
+        if attempt == retries or not is_retryable(error):
+            raise error
+        await asyncio.sleep(retry_delay(attempt, error))
@@ -0,0 +1,225 @@
+"""
+Re-embeds public.articles with a chosen provider so queries and stored vectors use the same model.
+
+Rows whose target vector column is missing, or was produced by a different model
+(tracked in a <target>_model column), are selected in id order, embedded in batches
+and written back with one bulk UPDATE per batch. Progress is checkpointed in
+public.reembed_checkpoints in the same transaction as each batch, so a crashed or
+interrupted job resumes after the last committed batch instead of from row 0.
+
+    python reembed.py --provider HuggingFace --processes 4
+    python reembed.py --provider Ollama --source title --target title_vector_nomic_embed_text --batch-size 128
+"""
+import argparse
+import time
+
+from psycopg2.extras import execute_values
+
+from db import create_db_connection
+from embeddings import (BATCH_EMBEDDING_FUNCTIONS, EMBEDDING_FUNCTIONS, EMBEDDING_MODELS, get_hf_model,
+                        get_huggingface_embeddings)
+from model_registry import ensure_model_column, get_column_type, get_model_spec
+from search import title_column, to_vector_literal
+
+CREATE_CHECKPOINTS = """
+    CREATE TABLE IF NOT EXISTS public.reembed_checkpoints (
+        job_name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        rows_done BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+def _identifier(name):
+    """Quotes a column name after checking it is a plain identifier."""
+    if not name.replace("_", "").isalnum():
+        raise ValueError(f"Invalid column name: {name!r}")
+    return f'"{name}"'
+
+
+# --- Batch Embedding ---
+class BatchEmbedder:
+    """
+    Embeds lists of texts with one provider. Sentence Transformer batches run across
+    several processes when processes > 1; Ollama and OpenAI embed each list with their
+    batch endpoints (see embeddings.BATCH_EMBEDDING_FUNCTIONS).
+    """
+
+    def __init__(self, provider, processes=1, batch_size=64):
+        if provider not in EMBEDDING_FUNCTIONS:
+            raise ValueError(f"Unknown provider {provider!r}; choose one of {', '.join(EMBEDDING_FUNCTIONS)}")
+        self.provider = provider
+        self.model = EMBEDDING_MODELS[provider]
+        self.batch_size = batch_size
+        self._process_pool = None
+        self._hf_model = None
+        if provider == "HuggingFace":
+            self._hf_model = get_hf_model()
+            if self._hf_model is None:
+                raise RuntimeError("Hugging Face model not loaded. Cannot re-embed with HuggingFace.")
+            if processes > 1 and not hasattr(self._hf_model, "start_multi_process_pool"):
+                # The ONNX Runtime backend already runs one thread per core in this process
+                print("HF_BACKEND=onnx encodes on every core in one process; ignoring --processes")
+            elif processes > 1:
+                self._process_pool = self._hf_model.start_multi_process_pool(["cpu"] * processes)
+
+    def embed(self, texts):
+        """Returns one embedding per text; raises if any text could not be embedded."""
+        if self.provider == "HuggingFace":
+            if self._process_pool is not None:
+                return self._hf_model.encode_multi_process(
+                    texts, self._process_pool, batch_size=self.batch_size).tolist()
+            embeddings = get_huggingface_embeddings(texts, batch_size=self.batch_size)
+        else:
+            embeddings = BATCH_EMBEDDING_FUNCTIONS[self.provider](texts)
+        if embeddings is None or len(embeddings) != len(texts):
+            raise RuntimeError(f"{self.provider} batch embedding of {len(texts)} texts failed")
+        return embeddings
+
+    def close(self):
+        if self._process_pool is not None:
+            self._hf_model.stop_multi_process_pool(self._process_pool)
+
+
+# --- Job ---
+def ensure_schema(conn, provider, target):
+    """
+    Creates the provider's registered vector column or its title_vector_<model> pair (when
+    either is the target), the <target>_model tracking column and the checkpoint table if
+    needed. Returns the target column's SQL type, e.g. 'halfvec(768)'.
+    """
+    spec = get_model_spec(provider)
+    if target in (spec.column, title_column(spec.column)):
+        ensure_model_column(conn, spec._replace(column=target))
+    with conn.cursor() as cur:
+        target_type = get_column_type(cur, target)
+        if target_type is None:
+            raise ValueError(f"public.articles has no column {target!r}")
+        if not target_type.endswith(f"({spec.dimension})"):
+            raise ValueError(f"public.articles.{target} is {target_type}, but {provider} vectors have "
+                             f"{spec.dimension} dimensions")
+        cur.execute(f"ALTER TABLE public.articles ADD COLUMN IF NOT EXISTS {_identifier(target + '_model')} TEXT")
+        cur.execute(CREATE_CHECKPOINTS)
+    conn.commit()
+    return target_type
+
+
+def load_checkpoint(conn, job_name):
+    with conn.cursor() as cur:
+        cur.execute("SELECT last_id, rows_done FROM public.reembed_checkpoints WHERE job_name = %s", (job_name,))
+        row = cur.fetchone()
+    return row if row else (None, 0)
+
+
+def reset_checkpoint(conn, job_name):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM public.reembed_checkpoints WHERE job_name = %s", (job_name,))
+    conn.commit()
+
+
+def fetch_pending(conn, source, target, model, after_id, limit):
+    """Returns (id, text) rows after after_id whose target vector is missing or stale for model."""
+    after_clause = "" if after_id is None else "AND id > %(after_id)s"
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT id, {_identifier(source)}
+            FROM public.articles
+            WHERE ({_identifier(target)} IS NULL OR {_identifier(target + '_model')} IS DISTINCT FROM %(model)s)
+              {after_clause}
+            ORDER BY id
+            LIMIT %(limit)s
+            """,
+            {"after_id": after_id, "model": model, "limit": limit},
+        )
+        return cur.fetchall()
+
+
+def write_batch(conn, target, target_type, model, job_name, ids, embeddings, rows_done):
+    """Writes a batch of embeddings and advances the checkpoint in one transaction."""
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            f"""
+            UPDATE public.articles AS a
+            SET {_identifier(target)} = v.embedding::{target_type},
+                {_identifier(target + '_model')} = v.model
+            FROM (VALUES %s) AS v(id, embedding, model)
+            WHERE a.id = v.id
+            """,
+            [(article_id, to_vector_literal(embedding), model) for article_id, embedding in zip(ids, embeddings)],
+            page_size=len(ids),
+        )
+        cur.execute(
+            """
+            INSERT INTO public.reembed_checkpoints (job_name, last_id, rows_done)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (job_name) DO UPDATE
+            SET last_id = EXCLUDED.last_id, rows_done = EXCLUDED.rows_done, updated_at = now()
+            """,
+            (job_name, ids[-1], rows_done),
+        )
+    conn.commit()
+
+
+def run_job(provider, source="content", target=None, batch_size=64, processes=1, restart=False, max_rows=None):
+    """
+    Re-embeds every missing or stale row of public.articles.<target> from <source> text.
+    target defaults to the vector column registered for the provider in model_registry.py.
+    """
+    target = target or get_model_spec(provider).column
+    embedder = BatchEmbedder(provider, processes=processes, batch_size=batch_size)
+    model = embedder.model
+    job_name = f"{target}:{provider}:{model}"
+    conn = create_db_connection()
+    try:
+        target_type = ensure_schema(conn, provider, target)
+        if restart:
+            reset_checkpoint(conn, job_name)
+        last_id, rows_done = load_checkpoint(conn, job_name)
+        if last_id is not None:
+            print(f"Resuming {job_name} after id {last_id} ({rows_done} rows already done)")
+
+        started = time.perf_counter()
+        session_rows = 0
+        while max_rows is None or session_rows < max_rows:
+            rows = fetch_pending(conn, source, target, model, last_id, batch_size)
+            conn.commit()
+            if not rows:
+                # Completed: the next run scans from the first row again for newly stale rows
+                reset_checkpoint(conn, job_name)
+                break
+            ids = [row[0] for row in rows]
+            texts = [row[1] or "" for row in rows]
+            embeddings = embedder.embed(texts)
+            rows_done += len(rows)
+            session_rows += len(rows)
+            write_batch(conn, target, target_type, model, job_name, ids, embeddings, rows_done)
+            last_id = ids[-1]
+            elapsed = time.perf_counter() - started
+            print(f"{rows_done} rows embedded (last id {last_id}, {session_rows / elapsed:.1f} rows/s)")
+        print(f"Finished {job_name}: {session_rows} rows in {time.perf_counter() - started:.1f}s")
+        return session_rows
+    finally:
+        conn.close()
+        embedder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", required=True, choices=sorted(EMBEDDING_FUNCTIONS))
+    parser.add_argument("--source", default="content", help="text column to embed (content or title)")
+    parser.add_argument("--target", default=None,
+                        help="vector column to fill (default: the provider's column in model_registry.py)")
+    parser.add_argument("--batch-size", type=int, default=64, help="rows embedded and written per batch")
+    parser.add_argument("--processes", type=int, default=1, help="encoding processes for HuggingFace")
+    parser.add_argument("--max-rows", type=int, default=None, help="stop after this many rows")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    args = parser.parse_args()
+    run_job(args.provider, source=args.source, target=args.target, batch_size=args.batch_size,
+            processes=args.processes, restart=args.restart, max_rows=args.max_rows)
+
+
+if __name__ == "__main__":
+    main()
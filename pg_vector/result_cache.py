@@ -0,0 +1,309 @@
+"""
+Semantic result cache in front of the SQL stage of a search.
+
+Paraphrased queries embed to nearly the same vector and get nearly the same top-k back
+from the index, so an exact-text cache misses them. This cache keeps the result rows of
+recent searches next to their normalized query vectors and answers a new search from
+the most similar cached query when the cosine similarity is at least
+RESULT_CACHE_THRESHOLD. Entries are only compared within the same search (provider,
+column, mode, profile, weights, filters and, for hybrid search, the query text).
+
+Entries are bounded by RESULT_CACHE_SIZE (least recently used go first) and
+RESULT_CACHE_TTL. Changes to public.articles clear the cache: a statement trigger
+(ensure_invalidation_trigger) sends NOTIFY articles_changed, and a listener thread
+(start_invalidation_listener) clears the cache when it arrives.
+
+    python result_cache.py install-trigger
+    python result_cache.py notify          # clear the caches of every running search process
+"""
+import argparse
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# --- Environment Variables ---
+# Maximum number of cached result lists (0 disables the cache)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1000"))
+# Seconds a cached result list stays valid (0 disables expiry)
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+# Minimum cosine similarity between two query vectors for one to reuse the other's results
+RESULT_CACHE_THRESHOLD = float(os.getenv("RESULT_CACHE_THRESHOLD", "0.97"))
+# Listen for articles_changed notifications and clear the cache on each one
+RESULT_CACHE_LISTEN = os.getenv("RESULT_CACHE_LISTEN", "1") == "1"
+
+INVALIDATION_CHANNEL = "articles_changed"
+
+
+def normalize(embedding):
+    """Returns the embedding as a unit-length float32 vector (dot products are cosine similarities)."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class _Space:
+    """The cached query vectors of one search key, stacked in a matrix for one matrix-vector product."""
+
+    def __init__(self, dimension):
+        self.vectors = np.zeros((16, dimension), dtype=np.float32)
+        self.entries = [None] * 16  # slot -> entry id, None for a free slot
+        self.free = list(range(15, -1, -1))
+
+    def add(self, entry_id, vector):
+        if not self.free:
+            capacity = len(self.entries)
+            self.vectors = np.vstack([self.vectors, np.zeros_like(self.vectors)])
+            self.entries.extend([None] * capacity)
+            self.free = list(range(2 * capacity - 1, capacity - 1, -1))
+        slot = self.free.pop()
+        self.vectors[slot] = vector
+        self.entries[slot] = entry_id
+        return slot
+
+    def remove(self, slot):
+        self.vectors[slot] = 0.0
+        self.entries[slot] = None
+        self.free.append(slot)
+
+    def nearest(self, vector):
+        """Returns (entry id, similarity) of the most similar cached vector, or (None, -1.0)."""
+        if len(self.free) == len(self.entries) or len(vector) != self.vectors.shape[1]:
+            return None, -1.0
+        # Free slots are zero vectors and score 0, below any useful threshold
+        similarities = self.vectors @ vector
+        slot = int(np.argmax(similarities))
+        if self.entries[slot] is None:
+            return None, -1.0
+        return self.entries[slot], float(similarities[slot])
+
+
+class SemanticResultCache:
+    """
+    A thread-safe cache of search result rows keyed by (search key, query vector).
+    lookup() returns the rows cached for the most similar query vector under the same
+    search key when its similarity is at least threshold.
+    """
+
+    def __init__(self, max_size=1000, ttl=300.0, threshold=0.97):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._spaces = {}
+        self._entries = OrderedDict()  # entry id -> (key, slot, rows, limit, stored_at)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        # Bumped by clear(); results fetched before an invalidation are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def lookup(self, key, embedding, limit):
+        """
+        Returns the first limit cached rows for a query vector within threshold of a cached
+        one, or None on a miss. A cached list answers any limit up to the one it was
+        fetched with, and any limit at all once it came back short (no more results).
+        """
+        if self.max_size <= 0:
+            return None
+        vector = normalize(embedding)
+        with self._lock:
+            space = self._spaces.get(key)
+            entry_id, similarity = space.nearest(vector) if space is not None else (None, -1.0)
+            if entry_id is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            _, _, rows, cached_limit, stored_at = self._entries[entry_id]
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                self._remove(entry_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if limit > cached_limit and len(rows) >= cached_limit:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return rows[:limit]
+
+    def store(self, key, embedding, limit, rows, generation=None):
+        """
+        Caches the rows a search returned for limit. generation is the cache's generation
+        read before the search ran; the rows are dropped if the cache was cleared since.
+        """
+        if self.max_size <= 0:
+            return
+        vector = normalize(embedding)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            space = self._spaces.get(key)
+            if space is None:
+                space = self._spaces[key] = _Space(len(vector))
+            elif len(vector) != space.vectors.shape[1]:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            slot = space.add(entry_id, vector)
+            self._entries[entry_id] = (key, slot, list(rows), limit, time.monotonic())
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every cached result list (e.g. after public.articles changed)."""
+        with self._lock:
+            self._spaces.clear()
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def _remove(self, entry_id):
+        key, slot, _, _, _ = self._entries.pop(entry_id)
+        space = self._spaces[key]
+        space.remove(slot)
+        if len(space.free) == len(space.entries):
+            del self._spaces[key]
+
+    def stats(self):
+        """Returns hit, miss and eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def result_cache_key(provider, column, mode, profile, oversample=None, weights=None, filters=None,
+                     query_text=None):
+    """The search key under which results are comparable: everything but the query vector and the limit."""
+    return (
+        provider,
+        column,
+        mode,
+        profile,
+        oversample if mode == "binary" else None,
+        tuple(weights) if weights else None,
+        tuple(sorted((name, str(value)) for name, value in (filters or {}).items())),
+        # Hybrid results also depend on the full-text match of the query text
+        " ".join(query_text.lower().split()) if mode == "hybrid" and query_text else None,
+    )
+
+
+# --- Invalidation ---
+INVALIDATION_TRIGGER = f"""
+    CREATE OR REPLACE FUNCTION public.notify_articles_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{INVALIDATION_CHANNEL}', TG_OP);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS articles_changed ON public.articles;
+    CREATE TRIGGER articles_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.articles
+        FOR EACH STATEMENT EXECUTE FUNCTION public.notify_articles_changed();
+"""
+
+
+def ensure_invalidation_trigger(conn):
+    """Installs the statement trigger that sends NOTIFY articles_changed on every write to public.articles."""
+    with conn.cursor() as cur:
+        cur.execute(INVALIDATION_TRIGGER)
+    conn.commit()
+
+
+def start_invalidation_listener(cache, connect=None, reconnect_delay=5.0, name="result-cache-invalidation"):
+    """
+    Starts a daemon thread that LISTENs on articles_changed and clears the cache on each
+    notification. The cache is also cleared after a reconnect, since notifications sent
+    while disconnected are lost. Any object with a clear() method works, e.g.
+    article_cache.ArticleCache; name labels the thread. Returns the thread.
+    """
+    if connect is None:
+        from db import create_db_connection as connect
+
+    def listen():
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                cache.clear()
+                while True:
+                    if select.select([conn], [], [], 60)[0]:
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            cache.clear()
+            except Exception as e:
+                print(f"{name} listener error: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(reconnect_delay)
+
+    thread = threading.Thread(target=listen, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+# --- Shared Cache ---
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Returns the process-wide result cache, creating it (and its listener) from the environment on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = SemanticResultCache(max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL,
+                                            threshold=RESULT_CACHE_THRESHOLD)
+                if RESULT_CACHE_SIZE > 0 and RESULT_CACHE_LISTEN:
+                    start_invalidation_listener(cache)
+                _cache = cache
+    return _cache
+
+
+def main():
+    from db import create_db_connection
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["install-trigger", "notify"])
+    args = parser.parse_args()
+
+    conn = create_db_connection()
+    try:
+        if args.action == "install-trigger":
+            ensure_invalidation_trigger(conn)
+            print("Installed trigger articles_changed on public.articles")
+        else:
+            with conn.cursor() as cur:
+                cur.execute(f"NOTIFY {INVALIDATION_CHANNEL}")
+            conn.commit()
+            print(f"Sent NOTIFY {INVALIDATION_CHANNEL}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Scatter-gather search across Postgres nodes that each hold one hash partition of public.articles.
+
+Article i lives on shard mod(abs(hashint4(i)), N) of the N hosts in DB_SHARD_HOSTS. A
+search sends the same statement (search.search_article_ids, prepared per connection) to
+every shard in parallel, each returns the ids and scores of its own top-k, and the
+per-shard lists are merged into the global top-k by score; only then are the fields of
+those k articles looked up. Cosine similarities are comparable across shards, so
+the merged list equals the top-k of a single node holding every article; the 'hybrid'
+mode's rank-fusion scores are not, and it is not available here.
+
+    python scatter_gather.py distribute --shards localhost:5441,localhost:5442,localhost:5443
+    python scatter_gather.py verify --shards localhost:5441,localhost:5442,localhost:5443 --queries 50
+
+distribute copies public.articles from the DB_* database into the shards (binary COPY)
+with all of its columns and indexes: per-model vector columns, the metadata filter
+columns, the generated *_bq and content_tsv columns, and the ANN, partial, B-tree and GIN
+indexes. Build them on the DB_* database first (model_registry.py, index_admin.py).
+verify compares the merged top-k with the exact search on the DB_* database.
+"""
+import argparse
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from article_cache import ARTICLE_FIELDS_QUERY, get_article_cache, merge_articles
+from db import DB_POOL_MAX_SIZE, create_db_connection, create_node_pool, parse_hosts
+from model_registry import get_column_type
+from search import search_article_ids, search_articles
+
+# --- Environment Variables ---
+# Hosts of the shards searched by scatter-gather ("host[:port],..."); unset: single-node search
+# export DB_SHARD_HOSTS="localhost:5441,localhost:5442,localhost:5443"
+DB_SHARD_HOSTS = os.getenv("DB_SHARD_HOSTS", "")
+# Answer from the shards that responded when others fail (results may miss articles)
+SHARD_ALLOW_PARTIAL = os.getenv("SHARD_ALLOW_PARTIAL", "0") == "1"
+
+SCATTER_MODES = ("vector", "binary", "multi")
+
+
+class ShardSearchError(Exception):
+    """Raised when a shard could not be searched and partial results are not allowed."""
+
+
+class ShardSet:
+    """The shards of a hash-partitioned public.articles, each with its own connection pool."""
+
+    def __init__(self, hosts, pool_factory=create_node_pool):
+        self.hosts = [f"{host}:{port}" for host, port in hosts]
+        self.pools = [pool_factory(host, port) for host, port in hosts]
+        # One worker per pooled shard connection, so concurrent searches fan out side by side
+        # instead of queueing behind each other for N workers
+        self._executor = ThreadPoolExecutor(max_workers=len(self.pools) * DB_POOL_MAX_SIZE,
+                                            thread_name_prefix="shard")
+
+    def _search_shard(self, pool, embedding, top_k, options):
+        conn = pool.getconn()
+        try:
+            return search_article_ids(conn, embedding, top_k, **options)
+        finally:
+            pool.putconn(conn)
+
+    def _fetch_shard(self, pool, ids):
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(ARTICLE_FIELDS_QUERY, (ids,))
+                return [tuple(row) for row in cur.fetchall()]
+        finally:
+            pool.putconn(conn)
+
+    def _gather(self, futures):
+        rows = []
+        for host, future in zip(self.hosts, futures):
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                if not SHARD_ALLOW_PARTIAL:
+                    raise ShardSearchError(f"Shard {host} failed: {e}") from e
+                print(f"Shard {host} failed, answering from the other shards: {e}")
+        return rows
+
+    def search_article_ids(self, embedding, top_k=5, column="content_vector", storage="vector", mode="vector",
+                           oversample=None, profile=None, filters=None):
+        """
+        search.search_article_ids over every shard at once: each shard returns its top_k
+        (id, similarity_score) rows and they are merged into the global top_k by score.
+        """
+        if mode not in SCATTER_MODES:
+            raise ValueError(f"Scatter-gather search supports the {', '.join(SCATTER_MODES)} modes")
+        options = {"column": column, "storage": storage, "mode": mode, "oversample": oversample,
+                   "profile": profile, "filters": filters}
+        futures = [self._executor.submit(self._search_shard, pool, embedding, top_k, options) for pool in self.pools]
+        return heapq.nlargest(top_k, self._gather(futures), key=lambda row: row[1])
+
+    def fetch_articles(self, results):
+        """
+        article_cache.fetch_articles for ids spread over the shards: the articles missing
+        from the cache are looked up by id on every shard at once.
+        """
+        if not results:
+            return []
+        cache = get_article_cache()
+        ids = [article_id for article_id, _ in results]
+        articles = cache.get_many(ids)
+        missing = [article_id for article_id in ids if article_id not in articles]
+        if missing:
+            futures = [self._executor.submit(self._fetch_shard, pool, missing) for pool in self.pools]
+            rows = self._gather(futures)
+            cache.put_many(rows)
+            articles.update((row[0], row) for row in rows)
+        return merge_articles(results, articles)
+
+    def search_articles(self, embedding, top_k=5, column="content_vector", storage="vector", mode="vector",
+                        oversample=None, profile=None, filters=None):
+        """search_article_ids followed by fetch_articles: the same rows as search.search_articles."""
+        return self.fetch_articles(self.search_article_ids(embedding, top_k, column, storage, mode, oversample,
+                                                           profile, filters))
+
+
+_shards = None
+_shards_loaded = False
+_shards_lock = threading.Lock()
+
+
+def get_shard_set():
+    """Returns the process-wide ShardSet for DB_SHARD_HOSTS, or None for single-node search."""
+    global _shards, _shards_loaded
+    if not _shards_loaded:
+        with _shards_lock:
+            if not _shards_loaded:
+                hosts = parse_hosts(DB_SHARD_HOSTS)
+                if hosts:
+                    _shards = ShardSet(hosts)
+                _shards_loaded = True
+    return _shards
+
+
+# --- Distribution ---
+def source_schema(conn):
+    """
+    Returns the columns of public.articles as (name, sql_type, generation_expression) in
+    column order, and the definitions of its secondary indexes (valid ones only).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT a.attname, format_type(a.atttypid, a.atttypmod),
+                   CASE WHEN a.attgenerated = 's' THEN pg_get_expr(d.adbin, d.adrelid) END
+            FROM pg_attribute a
+            LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+            WHERE a.attrelid = 'public.articles'::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY a.attnum
+            """
+        )
+        columns = cur.fetchall()
+        cur.execute(
+            """
+            SELECT pg_get_indexdef(x.indexrelid)
+            FROM pg_index x
+            WHERE x.indrelid = 'public.articles'::regclass AND NOT x.indisprimary AND x.indisvalid
+            ORDER BY x.indexrelid
+            """
+        )
+        indexes = [re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX IF NOT EXISTS ", row[0])
+                   for row in cur.fetchall()]
+    conn.rollback()
+    return columns, indexes
+
+
+def ensure_shard_schema(conn, columns):
+    """
+    Adds the source's columns (per-model vectors, metadata, generated *_bq and content_tsv
+    columns) missing on a shard; columns of another type are dropped and re-added.
+    """
+    from ingest import CREATE_TABLE
+
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(CREATE_TABLE)
+        for name, sql_type, generated in columns:
+            current_type = get_column_type(cur, name)
+            if current_type == sql_type:
+                continue
+            if current_type is not None:
+                cur.execute(f'ALTER TABLE public.articles DROP COLUMN "{name}" CASCADE')
+            cur.execute(f'ALTER TABLE public.articles ADD COLUMN "{name}" {sql_type}'
+                        + (f" GENERATED ALWAYS AS ({generated}) STORED" if generated else ""))
+    conn.commit()
+
+
+def distribute(source_conn, shard_conns, maintenance_work_mem="1GB"):
+    """
+    Copies the rows of public.articles from source_conn into the shard connections, row i
+    to shard mod(abs(hashint4(i)), len(shard_conns)), and gives every shard the source's
+    columns and indexes, so each search mode and filter runs there as on the source.
+    Returns the row count per shard.
+    """
+    from ingest import create_indexes, drop_vector_indexes
+
+    columns, indexes = source_schema(source_conn)
+    # Generated columns are computed by each shard from the copied ones
+    copied = ", ".join(f'"{name}"' for name, _, generated in columns if not generated)
+    counts = []
+    for index, shard_conn in enumerate(shard_conns):
+        ensure_shard_schema(shard_conn, columns)
+        # Load without the ANN indexes, then build them once over the shard's rows
+        drop_vector_indexes(shard_conn)
+        with tempfile.TemporaryFile() as buffer:
+            with source_conn.cursor() as cur:
+                cur.copy_expert(
+                    f"COPY (SELECT {copied} FROM public.articles "
+                    f"WHERE mod(abs(hashint4(id)), {len(shard_conns)}) = {index}) TO STDOUT (FORMAT binary)",
+                    buffer,
+                )
+            source_conn.rollback()
+            buffer.seek(0)
+            with shard_conn.cursor() as cur:
+                cur.execute("TRUNCATE public.articles")
+                cur.copy_expert(f"COPY public.articles ({copied}) FROM STDIN (FORMAT binary)", buffer)
+                cur.execute("SELECT count(*) FROM public.articles")
+                counts.append(cur.fetchone()[0])
+            shard_conn.commit()
+        create_indexes(shard_conn, indexes, maintenance_work_mem)
+    return counts
+
+
+def verify(source_conn, shards, queries=50, top_k=10, column="content_vector", storage="vector"):
+    """
+    Uses stored vectors as queries and compares the scatter-gather top_k (exact profile on
+    every shard) with the exact top_k on the source database. Returns the mean recall.
+    """
+    with source_conn.cursor() as cur:
+        cur.execute(f'SELECT "{column}"::real[] FROM public.articles WHERE "{column}" IS NOT NULL '
+                    f"ORDER BY random() LIMIT %s", (queries,))
+        embeddings = [row[0] for row in cur.fetchall()]
+    source_conn.rollback()
+    recalls, identical = [], 0
+    for embedding in embeddings:
+        expected = [row[0] for row in search_articles(source_conn, embedding, top_k, column=column,
+                                                      storage=storage, profile="exact")]
+        source_conn.rollback()
+        merged = [row[0] for row in shards.search_articles(embedding, top_k, column=column, storage=storage,
+                                                           profile="exact")]
+        recalls.append(len(set(expected) & set(merged)) / max(1, len(expected)))
+        identical += expected == merged
+    return {
+        "shards": shards.hosts,
+        "queries": len(embeddings),
+        "top_k": top_k,
+        "recall": sum(recalls) / len(recalls) if recalls else None,
+        "identical_top_k": identical / len(embeddings) if embeddings else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["distribute", "verify"])
+    parser.add_argument("--shards", default=DB_SHARD_HOSTS, help="host[:port],... of the shards")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--column", default="content_vector")
+    parser.add_argument("--storage", choices=["vector", "halfvec"], default="vector")
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="for the index builds on the shards")
+    args = parser.parse_args()
+    hosts = parse_hosts(args.shards)
+    if not hosts:
+        parser.error("--shards (or DB_SHARD_HOSTS) is required")
+
+    source_conn = create_db_connection()
+    try:
+        if args.action == "distribute":
+            shard_conns = [create_db_connection(host, port) for host, port in hosts]
+            try:
+                counts = distribute(source_conn, shard_conns, args.maintenance_work_mem)
+            finally:
+                for conn in shard_conns:
+                    conn.close()
+            for (host, port), count in zip(hosts, counts):
+                print(f"{host}:{port}: {count} articles")
+        else:
+            result = verify(source_conn, ShardSet(hosts), args.queries, args.top_k, args.column, args.storage)
+            print(json.dumps(result, indent=2))
+    finally:
+        source_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,695 @@
+import os
+import time
+import weakref
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from article_cache import fetch_articles, merge_articles
+from metrics import is_slow, log_slow_query
+
+# --- Query Vector Binding ---
+def to_vector_literal(embedding):
+    """
+    Serializes an embedding into pgvector's text input format ('[x1,x2,...]').
+    Values are rounded to float32 (the precision pgvector stores) and written with
+    9 significant digits, which round-trips float32 exactly and is far shorter than
+    str() of a list of Python floats.
+    """
+    values = np.asarray(embedding, dtype=np.float32)
+    if values.ndim != 1:
+        raise ValueError(f"Expected a 1-dimensional embedding, got shape {values.shape}")
+    return "[" + ",".join([format(value, ".9g") for value in values.tolist()]) + "]"
+
+
+def to_vector_array_literal(embeddings):
+    """Serializes a list of embeddings into a Postgres array literal of vectors ('{"[..]","[..]"}')."""
+    return "{" + ",".join(f'"{to_vector_literal(embedding)}"' for embedding in embeddings) + "}"
+
+
+# --- Search Queries ---
+# One SQL template per search mode, with named placeholders. The synchronous path turns
+# them into server-side prepared statements ($n parameters); the asyncio path
+# (async_search.py) sends them as-is with psycopg 3 server-side parameter binding.
+# The scans return only (id, similarity_score), each distance computed once per row and
+# ordered by its alias; url, title and snippet of the final rows are read afterwards by
+# article_cache.fetch_articles, so content is never touched for rows that are dropped.
+SEARCH_QUERIES = {
+    "vector": """
+        SELECT id, 1 - distance AS similarity_score
+        FROM (
+            SELECT id, "{column}" <=> %(embedding)s::{storage} AS distance
+            FROM public.articles
+            {where}
+            ORDER BY distance
+            LIMIT %(top_k)s
+        ) nearest
+        ORDER BY distance, id
+    """,
+    # Two-stage search: the top %(candidates)s rows by Hamming distance on the
+    # binary-quantized copy (<column>_bq, one bit per dimension, with its own index)
+    # are reranked exactly with <=> against the full-precision vectors.
+    "binary": """
+        WITH candidates AS (
+            SELECT id
+            FROM public.articles
+            {where}
+            ORDER BY "{column}_bq" <~> binary_quantize(%(embedding)s::{storage})::bit({dimension})
+            LIMIT %(candidates)s
+        )
+        SELECT id, 1 - distance AS similarity_score
+        FROM (
+            SELECT a.id, a."{column}" <=> %(embedding)s::{storage} AS distance
+            FROM candidates c
+            JOIN public.articles a ON a.id = c.id
+            ORDER BY distance
+            LIMIT %(top_k)s
+        ) reranked
+        ORDER BY distance
+    """,
+    # Hybrid search: the top %(candidates)s rows by vector distance and by full-text rank
+    # (content_tsv, see index_admin.ensure_fulltext_search) are fused with weighted
+    # reciprocal rank fusion, score = sum(weight / (rrf_k + rank)), in the same statement.
+    # The score returned is the fused RRF score, not a cosine similarity.
+    "hybrid": """
+        WITH semantic AS (
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM (
+                SELECT id, "{column}" <=> %(embedding)s::{storage} AS distance
+                FROM public.articles
+                {where}
+                ORDER BY "{column}" <=> %(embedding)s::{storage}
+                LIMIT %(candidates)s
+            ) nearest
+        ),
+        keyword AS (
+            SELECT id, row_number() OVER (ORDER BY text_rank DESC) AS rank
+            FROM (
+                SELECT id, ts_rank_cd(content_tsv, query) AS text_rank
+                FROM public.articles, websearch_to_tsquery('{text_config}', %(query_text)s) query
+                WHERE content_tsv @@ query {and_where}
+                ORDER BY text_rank DESC
+                LIMIT %(candidates)s
+            ) matches
+        ),
+        fused AS (
+            SELECT id, sum(score) AS score
+            FROM (
+                SELECT id, %(semantic_weight)s / (%(rrf_k)s + rank) AS score FROM semantic
+                UNION ALL
+                SELECT id, %(keyword_weight)s / (%(rrf_k)s + rank) AS score FROM keyword
+            ) ranks
+            GROUP BY id
+            ORDER BY score DESC
+            LIMIT %(top_k)s
+        )
+        SELECT id, score AS similarity_score
+        FROM fused
+        ORDER BY score DESC
+    """,
+    # Multi-vector search: candidates from the title and content vector indexes are merged
+    # (UNION dedups them) and scored with a weighted sum of both cosine similarities.
+    # Articles without a title vector score on their content only.
+    "multi": """
+        WITH candidates AS (
+            (
+                SELECT id
+                FROM public.articles
+                {where}
+                ORDER BY "{title_column}" <=> %(embedding)s::{storage}
+                LIMIT %(candidates)s
+            )
+            UNION
+            (
+                SELECT id
+                FROM public.articles
+                {where}
+                ORDER BY "{column}" <=> %(embedding)s::{storage}
+                LIMIT %(candidates)s
+            )
+        )
+        SELECT
+            a.id,
+            %(title_weight)s * coalesce(1 - (a."{title_column}" <=> %(embedding)s::{storage}), 0)
+                + %(content_weight)s * (1 - (a."{column}" <=> %(embedding)s::{storage})) AS similarity_score
+        FROM
+            candidates c
+            JOIN public.articles a ON a.id = c.id
+        ORDER BY
+            similarity_score DESC
+        LIMIT %(top_k)s
+    """,
+}
+
+# Keyset condition of the page after a cursor: rows ranked after the cursor's last row by
+# (similarity_score DESC, id), so a deep page is read from the cursor on instead of
+# ranking every row before it. Only the vector mode ranks by a single distance.
+KEYSET_CLAUSE = (
+    '(1 - ("{column}" <=> %(embedding)s::{storage}) < %(last_score)s'
+    ' OR (1 - ("{column}" <=> %(embedding)s::{storage}) = %(last_score)s AND id > %(last_id)s))'
+)
+KEYSET_MODES = ("vector",)
+KEYSET_PARAMETERS = ("last_score", "last_id")
+
+# Parameters of each query, in prepared statement order
+QUERY_PARAMETERS = {
+    "vector": ("embedding", "top_k"),
+    "binary": ("embedding", "top_k", "candidates"),
+    "hybrid": ("embedding", "top_k", "candidates", "query_text", "semantic_weight", "keyword_weight", "rrf_k"),
+    "multi": ("embedding", "top_k", "candidates", "title_weight", "content_weight"),
+}
+
+# SQL type of each parameter in the prepared statements ({storage} is the vector type)
+PARAMETER_TYPES = {
+    "embedding": "{storage}",
+    "top_k": "integer",
+    "candidates": "integer",
+    "query_text": "text",
+    "semantic_weight": "float8",
+    "keyword_weight": "float8",
+    "rrf_k": "integer",
+    "title_weight": "float8",
+    "content_weight": "float8",
+    "last_score": "float8",
+    "last_id": "integer",
+}
+
+# --- Hybrid Search Settings ---
+# Text search configuration of the content_tsv column
+FULLTEXT_CONFIG = os.getenv("FULLTEXT_CONFIG", "english")
+# Candidates taken from each of the vector and full-text retrievals
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+# Weight of each retrieval in the fused score
+HYBRID_SEMANTIC_WEIGHT = float(os.getenv("HYBRID_SEMANTIC_WEIGHT", "1.0"))
+HYBRID_KEYWORD_WEIGHT = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "1.0"))
+# RRF rank constant; larger values flatten the difference between top and lower ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# --- Multi-Vector Search Settings ---
+# Candidates taken from each of the title and content vector indexes
+MULTI_CANDIDATES = int(os.getenv("MULTI_CANDIDATES", "40"))
+# Weight of each field's cosine similarity in the combined score
+MULTI_TITLE_WEIGHT = float(os.getenv("MULTI_TITLE_WEIGHT", "0.3"))
+MULTI_CONTENT_WEIGHT = float(os.getenv("MULTI_CONTENT_WEIGHT", "0.7"))
+
+
+def title_column(column):
+    """
+    Returns the title vector column paired with a content vector column:
+    content_vector -> title_vector, content_vector_<model> -> title_vector_<model>
+    (filled with: python reembed.py --source title --target title_vector_<model>).
+    """
+    return "title_vector" + column[len("content_vector"):] if column.startswith("content_vector") else None
+
+
+# --- Metadata Filters ---
+# Filters a search can apply: name -> (predicate on public.articles, parameter type).
+# category, language and published_at are metadata columns added by
+# index_admin.ensure_metadata_columns; the id range works on any table.
+SEARCH_FILTERS = {
+    "category": ("category = %(category)s", "text"),
+    "language": ("language = %(language)s", "text"),
+    "published_after": ("published_at >= %(published_after)s", "timestamptz"),
+    "published_before": ("published_at < %(published_before)s", "timestamptz"),
+    "id_min": ("id >= %(id_min)s", "integer"),
+    "id_max": ("id <= %(id_max)s", "integer"),
+}
+
+# Filtered searches let pgvector (0.8.0+) keep scanning the index until enough rows pass
+# the filter: 'relaxed_order', 'strict_order' (HNSW only; ivfflat falls back to relaxed)
+# or 'off'. Without iterative scans an index scan stops after ef_search / probes rows.
+FILTER_ITERATIVE_SCAN = os.getenv("FILTER_ITERATIVE_SCAN", "relaxed_order")
+# Re-runs of a filtered search that came back short of top_k, each with
+# FILTER_RETRY_FACTOR times more ivfflat probes / HNSW ef_search than the last
+FILTER_RETRIES = int(os.getenv("FILTER_RETRIES", "2"))
+FILTER_RETRY_FACTOR = int(os.getenv("FILTER_RETRY_FACTOR", "4"))
+
+# hnsw.ef_search can't go above this
+HNSW_MAX_EF_SEARCH = 1000
+
+# A setting raised on a retry: factor times the larger of base and the setting's value in
+# the session (e.g. DB_SESSION_SETUP), capped at ceiling (None: no cap)
+ScaledSetting = namedtuple("ScaledSetting", ["base", "factor", "ceiling"])
+
+
+def active_filters(filters):
+    """Returns the filters that are set, by name, or raises ValueError for an unknown filter."""
+    active = {name: value for name, value in (filters or {}).items() if value is not None}
+    unknown = sorted(set(active) - set(SEARCH_FILTERS))
+    if unknown:
+        raise ValueError(f"Unknown search filter {', '.join(unknown)}; choose from {', '.join(SEARCH_FILTERS)}")
+    return active
+
+
+def filter_clause(filter_names):
+    """Returns the AND-ed predicates of the named filters, with named placeholders."""
+    return " AND ".join(SEARCH_FILTERS[name][0] for name in sorted(filter_names))
+
+
+def search_query(mode="vector", column="content_vector", storage="vector", dimension=1536, filter_names=(),
+                 keyset=False):
+    """
+    Returns the SQL of a search mode for a vector column, with named placeholders.
+    filter_names (see SEARCH_FILTERS) restrict every candidate scan of the query;
+    keyset (KEYSET_MODES only) restricts it to the rows after a cursor (KEYSET_CLAUSE).
+    """
+    if mode == "multi" and title_column(column) is None:
+        raise ValueError(f"No title vector column is paired with {column!r}")
+    if keyset and mode not in KEYSET_MODES:
+        raise ValueError(f"Keyset pagination is not supported in {mode!r} mode")
+    clause = filter_clause(filter_names)
+    if keyset:
+        clause = " AND ".join(filter(None, [KEYSET_CLAUSE.format(column=column, storage=storage), clause]))
+    query = SEARCH_QUERIES[mode].format(column=column, storage=storage, dimension=dimension,
+                                        text_config=FULLTEXT_CONFIG, title_column=title_column(column),
+                                        where=f"WHERE {clause}" if clause else "",
+                                        and_where=f"AND {clause}" if clause else "")
+    if clause and mode == "vector":
+        # Iterative index scans in relaxed order may return rows slightly out of order
+        query = f"WITH nearest AS MATERIALIZED ({query}) SELECT * FROM nearest ORDER BY similarity_score DESC, id"
+    return query
+
+
+def search_parameters(mode, embedding, top_k, oversample=None, query_text=None, weights=None, filters=None,
+                      after=None):
+    """
+    Returns the named parameters of a search mode's query. query_text and weights
+    (semantic, keyword) are used by the hybrid mode; the multi mode takes weights
+    as (title, content). filters adds the value of each active filter, and after
+    (last_id, last_score) the keyset of the rows after a cursor.
+    """
+    if mode == "hybrid":
+        if query_text is None:
+            raise ValueError("Hybrid search needs the query text")
+        semantic_weight, keyword_weight = weights or (HYBRID_SEMANTIC_WEIGHT, HYBRID_KEYWORD_WEIGHT)
+        params = {
+            "embedding": embedding,
+            "top_k": top_k,
+            "candidates": max(HYBRID_CANDIDATES, top_k),
+            "query_text": query_text,
+            "semantic_weight": float(semantic_weight),
+            "keyword_weight": float(keyword_weight),
+            "rrf_k": RRF_K,
+        }
+    elif mode == "multi":
+        title_weight, content_weight = weights or (MULTI_TITLE_WEIGHT, MULTI_CONTENT_WEIGHT)
+        params = {
+            "embedding": embedding,
+            "top_k": top_k,
+            "candidates": max(MULTI_CANDIDATES, top_k),
+            "title_weight": float(title_weight),
+            "content_weight": float(content_weight),
+        }
+    else:
+        params = {
+            "embedding": embedding,
+            "top_k": top_k,
+            "candidates": top_k * (oversample or BQ_OVERSAMPLE),
+        }
+    params.update(active_filters(filters))
+    if after is not None:
+        params["last_id"], params["last_score"] = int(after[0]), float(after[1])
+    return params
+
+
+def statement_parameters(mode, filter_names=(), keyset=False):
+    """Returns the parameter names of a mode's query with filters, in prepared statement order."""
+    return QUERY_PARAMETERS[mode] + (KEYSET_PARAMETERS if keyset else ()) + tuple(sorted(filter_names))
+
+
+# --- Prepared Statements ---
+# Server-side prepared statements live as long as the (pooled) connection, so each
+# connection prepares a statement once and then only sends EXECUTE with the bound vector.
+# The query vector is a single typed parameter ($1) that Postgres parses once per query
+# and the plan is reused across executions.
+PREPARED_STATEMENTS = {}
+
+# Connections on which each statement has been prepared
+_prepared = {}
+
+
+def register_statement(name, sql):
+    """Registers a PREPARE statement under name (idempotent)."""
+    if name not in PREPARED_STATEMENTS:
+        PREPARED_STATEMENTS[name] = sql
+        _prepared[name] = weakref.WeakSet()
+    return name
+
+
+def statement_name(*parts):
+    """Joins parts into a statement name, hashing the tail of names longer than Postgres' 63-byte limit."""
+    name = "_".join(parts)
+    if len(name) > 63:
+        name = f"{name[:50]}_{zlib.crc32(name.encode()):08x}"
+    return name
+
+
+def prepared_search_statement(mode="vector", column="content_vector", storage="vector", dimension=1536,
+                              filter_names=(), keyset=False):
+    """
+    Registers (once) and returns the name of the prepared statement for a search mode,
+    column and filters, and for the rows after a cursor when keyset is set.
+    """
+    filter_names = tuple(sorted(filter_names))
+    name = statement_name("search_articles", mode, column, storage, *(("after",) if keyset else ()), *filter_names)
+    if name not in PREPARED_STATEMENTS:
+        parameters = statement_parameters(mode, filter_names, keyset)
+        types = ", ".join(
+            (PARAMETER_TYPES.get(parameter) or SEARCH_FILTERS[parameter][1]).format(storage=storage)
+            for parameter in parameters
+        )
+        placeholders = {parameter: f"${position}" for position, parameter in enumerate(parameters, start=1)}
+        query = search_query(mode, column, storage, dimension, filter_names, keyset) % placeholders
+        register_statement(name, f"PREPARE {name}({types}) AS {query}")
+    return name
+
+
+def search_statement(column="content_vector", storage="vector"):
+    """Registers (once) and returns the name of the k-NN statement for a vector column."""
+    return prepared_search_statement("vector", column, storage)
+
+
+def execute_prepared(cur, name, params):
+    """
+    Executes the named prepared statement on the cursor's connection,
+    preparing it first if this connection has not seen it yet.
+    """
+    prepared_on = _prepared[name]
+    if cur.connection not in prepared_on:
+        cur.execute(PREPARED_STATEMENTS[name])
+        prepared_on.add(cur.connection)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name}({placeholders})", params)
+
+
+# Candidates fetched per requested result in binary-quantized search
+BQ_OVERSAMPLE = int(os.getenv("BQ_OVERSAMPLE", "4"))
+
+SEARCH_MODES = ("vector", "binary", "hybrid", "multi")
+
+# --- Search Profiles ---
+# Latency/recall trade-off applied per query through transaction-local settings.
+# 'exact' disables index scans, so the query scans every row and returns the true top-k.
+# A prepared statement's cached generic plan is not re-planned when planner settings
+# change, so 'exact' also forces a custom plan, made with index scans off.
+SEARCH_PROFILES = {
+    "fast": {
+        "ivfflat.probes": os.getenv("FAST_IVFFLAT_PROBES", "1"),
+        "hnsw.ef_search": os.getenv("FAST_HNSW_EF_SEARCH", "20"),
+    },
+    "balanced": {
+        "ivfflat.probes": os.getenv("BALANCED_IVFFLAT_PROBES", "10"),
+        "hnsw.ef_search": os.getenv("BALANCED_HNSW_EF_SEARCH", "64"),
+    },
+    "exact": {
+        "enable_indexscan": "off",
+        "plan_cache_mode": "force_custom_plan",
+    },
+}
+
+DEFAULT_SEARCH_PROFILE = os.getenv("SEARCH_PROFILE", "balanced")
+
+
+def search_settings(profile, filtered=False, attempt=0, iterative_scan=False):
+    """
+    Returns the transaction-local settings of one search: the profile's and, for a
+    filtered search, custom plans for the filter values, iterative index scans (when
+    the pgvector version has them) and, on retry attempts, FILTER_RETRY_FACTOR ** attempt
+    times more ivfflat probes / HNSW ef_search than the profile or the session sets.
+    """
+    if profile is None:
+        settings = {}
+    elif profile in SEARCH_PROFILES:
+        settings = dict(SEARCH_PROFILES[profile])
+    else:
+        raise ValueError(f"Unknown search profile {profile!r}; choose one of {', '.join(SEARCH_PROFILES)}")
+    if filtered:
+        # Plans each execution for its bound filter values, so the partial indexes and
+        # partitions matching them are used instead of one generic plan
+        settings["plan_cache_mode"] = "force_custom_plan"
+        if iterative_scan and FILTER_ITERATIVE_SCAN != "off":
+            settings["hnsw.iterative_scan"] = FILTER_ITERATIVE_SCAN
+            settings["ivfflat.iterative_scan"] = "relaxed_order"
+        if attempt:
+            # Scaled from the session's values when those are higher, so a retry never
+            # searches fewer lists / candidates than the first attempt did
+            factor = FILTER_RETRY_FACTOR ** attempt
+            settings["ivfflat.probes"] = ScaledSetting(int(settings.get("ivfflat.probes", "1")), factor, None)
+            settings["hnsw.ef_search"] = ScaledSetting(int(settings.get("hnsw.ef_search", "40")), factor,
+                                                       HNSW_MAX_EF_SEARCH)
+    return settings
+
+
+def filter_attempts(profile, filters):
+    """Number of times a search may run: filtered index searches are retried when they come back short."""
+    if not filters or "enable_indexscan" in SEARCH_PROFILES.get(profile, {}):
+        return 1
+    return FILTER_RETRIES + 1
+
+
+def search_settings_query(settings):
+    """
+    Returns (sql, params) applying settings to the current transaction only
+    (set_config with is_local) in a single round trip, or None for no settings.
+    """
+    if not settings:
+        return None
+    calls, params = [], []
+    for name, value in settings.items():
+        if isinstance(value, ScaledSetting):
+            calls.append("set_config(%s, (least(greatest(%s::int, current_setting(%s, true)::int) * %s::int, "
+                         "%s::int))::text, true)")
+            params += [name, value.base, name, value.factor, value.ceiling]
+        else:
+            calls.append("set_config(%s, %s, true)")
+            params += [name, value]
+    return f"SELECT {', '.join(calls)}", params
+
+
+def search_profile_query(profile):
+    """Returns (sql, params) applying a search profile's settings to the current transaction, or None."""
+    return search_settings_query(search_settings(profile))
+
+
+def apply_search_profile(cur, profile):
+    """Applies a search profile to the cursor's current transaction (reset when it ends)."""
+    profile_query = search_profile_query(profile)
+    if profile_query is not None:
+        cur.execute(*profile_query)
+
+
+# --- pgvector Features ---
+PGVECTOR_VERSION_QUERY = "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+
+# Whether the database's pgvector has iterative index scans (checked once per process)
+_iterative_scan = None
+
+
+def has_iterative_scan(version):
+    """True if a pgvector version string (e.g. '0.8.0') supports iterative index scans."""
+    try:
+        return tuple(int(part) for part in version.split(".")[:2]) >= (0, 8)
+    except (AttributeError, ValueError):
+        return False
+
+
+def iterative_scan_available(cur):
+    """Checks (once) whether the connected database's pgvector supports iterative index scans."""
+    global _iterative_scan
+    if _iterative_scan is None:
+        cur.execute(PGVECTOR_VERSION_QUERY)
+        row = cur.fetchone()
+        _iterative_scan = has_iterative_scan(row[0] if row else None)
+    return _iterative_scan
+
+
+# --- Search Core ---
+def search_articles(conn, embedding, top_k=5, column="content_vector", storage="vector",
+                    mode="vector", oversample=None, profile=None, query_text=None, weights=None, filters=None):
+    """
+    search_article_ids followed by the narrow fetch of the results' url, title and
+    snippet (article_cache.fetch_articles). Returns a list of
+    (id, url, title, truncated_content, similarity_score) rows.
+    """
+    results = search_article_ids(conn, embedding, top_k, column, storage, mode, oversample, profile, query_text,
+                                 weights, filters)
+    with conn.cursor() as cur:
+        return fetch_articles(cur, results)
+
+
+def search_article_ids(conn, embedding, top_k=5, column="content_vector", storage="vector",
+                       mode="vector", oversample=None, profile=None, query_text=None, weights=None, filters=None,
+                       after=None):
+    """
+    Finds the top_k articles whose vector in column (content_vector by default, or a
+    per-model column from model_registry) is closest (cosine distance) to the embedding.
+    storage is the column's type, 'vector' or 'halfvec'.
+
+    mode 'vector' searches the full-precision vectors directly; mode 'binary' scans
+    top_k * oversample candidates on the binary-quantized copy and reranks them exactly
+    (see model_registry.ensure_binary_quantization). Mode 'hybrid' fuses the vector
+    candidates with full-text matches for query_text by reciprocal rank fusion, weighted
+    by weights=(semantic, keyword); its score is the fused RRF score. Mode 'multi' merges
+    candidates from the title and content vector columns and scores them with
+    weights=(title, content) applied to the two cosine similarities.
+
+    profile ('fast', 'balanced' or 'exact', see SEARCH_PROFILES) sets ivfflat.probes /
+    hnsw.ef_search for this query's transaction; None keeps the session settings.
+    filters ({name: value}, see SEARCH_FILTERS) restrict the articles searched; a filtered
+    search that returns fewer than top_k rows is re-run with more probes (FILTER_RETRIES).
+    after=(last_id, last_score) (KEYSET_MODES only) returns the rows ranked after that
+    row instead of the first ones, and is searched like a filter.
+    Returns a list of (id, similarity_score) rows, best first.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; choose one of {', '.join(SEARCH_MODES)}")
+    filters = active_filters(filters)
+    keyset = after is not None
+    restricted = bool(filters) or keyset
+    statement = prepared_search_statement(mode, column, storage, len(embedding), filters, keyset)
+    params = search_parameters(mode, to_vector_literal(embedding), top_k, oversample, query_text, weights, filters,
+                               after)
+    values = tuple(params[name] for name in statement_parameters(mode, filters, keyset))
+    with conn.cursor() as cur:
+        iterative_scan = restricted and iterative_scan_available(cur)
+        for attempt in range(filter_attempts(profile, restricted)):
+            settings_query = search_settings_query(search_settings(profile, restricted, attempt, iterative_scan))
+            if settings_query is not None:
+                cur.execute(*settings_query)
+            started = time.perf_counter()
+            execute_prepared(cur, statement, values)
+            results = cur.fetchall()
+            elapsed = time.perf_counter() - started
+            if is_slow(elapsed):
+                # Re-runs the statement under the same settings to capture its plan
+                try:
+                    placeholders = ", ".join(["%s"] * len(values))
+                    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) EXECUTE {statement}({placeholders})", values)
+                    log_slow_query(mode, elapsed, f"{statement} top_k={top_k} profile={profile} attempt={attempt}",
+                                   cur.fetchall())
+                except Exception as e:
+                    print(f"Could not explain slow query {statement}: {e}")
+            if len(results) >= top_k:
+                break
+        return results
+
+
+# --- Batch Search ---
+# All query vectors travel in one array parameter; each one drives its own k-NN
+# index scan through a LATERAL subquery, so N queries cost one statement. Like the
+# single-query scans, they return (ordinality, id, similarity_score) with each distance
+# computed once; the results' fields are read afterwards by article_cache.fetch_articles.
+BATCH_SEARCH_QUERIES = {
+    "vector": """
+        SELECT q.ordinality, r.id, 1 - r.distance AS similarity_score
+        FROM unnest(%(embeddings)s::{storage}[]) WITH ORDINALITY AS q(embedding, ordinality)
+        CROSS JOIN LATERAL (
+            SELECT id, "{column}" <=> q.embedding AS distance
+            FROM public.articles
+            ORDER BY distance
+            LIMIT %(top_k)s
+        ) r
+        ORDER BY q.ordinality, r.distance
+    """,
+    "binary": """
+        SELECT q.ordinality, r.id, 1 - r.distance AS similarity_score
+        FROM unnest(%(embeddings)s::{storage}[]) WITH ORDINALITY AS q(embedding, ordinality)
+        CROSS JOIN LATERAL (
+            SELECT a.id, a."{column}" <=> q.embedding AS distance
+            FROM (
+                SELECT id
+                FROM public.articles
+                ORDER BY "{column}_bq" <~> binary_quantize(q.embedding)::bit({dimension})
+                LIMIT %(candidates)s
+            ) c
+            JOIN public.articles a ON a.id = c.id
+            ORDER BY distance
+            LIMIT %(top_k)s
+        ) r
+        ORDER BY q.ordinality, r.distance
+    """,
+}
+
+# Query vectors sent per batch statement (bounds the statement size)
+BATCH_SEARCH_CHUNK = int(os.getenv("BATCH_SEARCH_CHUNK", "256"))
+
+
+def batch_search_articles(conn, embeddings, top_k=5, column="content_vector", storage="vector",
+                          mode="vector", oversample=None, profile=None):
+    """
+    Runs the search_articles lookup for many query vectors in one statement per
+    BATCH_SEARCH_CHUNK vectors. Returns one list of
+    (id, url, title, truncated_content, similarity_score) rows per embedding, in order.
+    """
+    if mode not in BATCH_SEARCH_QUERIES:
+        raise ValueError(f"Unsupported batch search mode {mode!r}; choose one of {', '.join(BATCH_SEARCH_QUERIES)}")
+    if not embeddings:
+        return []
+    query = BATCH_SEARCH_QUERIES[mode].format(column=column, storage=storage, dimension=len(embeddings[0]))
+    ranked = [[] for _ in embeddings]
+    with conn.cursor() as cur:
+        apply_search_profile(cur, profile)
+        for start in range(0, len(embeddings), BATCH_SEARCH_CHUNK):
+            chunk = embeddings[start:start + BATCH_SEARCH_CHUNK]
+            params = search_parameters(mode, None, top_k, oversample)
+            params["embeddings"] = to_vector_array_literal(chunk)
+            cur.execute(query, params)
+            for ordinality, article_id, score in cur.fetchall():
+                ranked[start + ordinality - 1].append((article_id, score))
+        # One narrow read of the fields of every distinct article found
+        found = list(dict.fromkeys(article_id for rows in ranked for article_id, _ in rows))
+        articles = {row[0]: row[:4] for row in fetch_articles(cur, [(article_id, None) for article_id in found])}
+    return [merge_articles(rows, articles) for rows in ranked]
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=RRF_K):
+    """
+    Fuses ranked id lists client-side: score(id) = sum(weight / (k + rank)).
+    Returns (id, score) pairs, best first. Used to compare with the server-side fusion.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, article_id in enumerate(ranking, start=1):
+            scores[article_id] = scores.get(article_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def recall_at_k(exact_ids, approximate_ids):
+    """Fraction of the exact top-k ids that an approximate search also returned."""
+    exact_ids = list(exact_ids)
+    if not exact_ids:
+        return 1.0
+    return len(set(exact_ids) & set(approximate_ids)) / len(exact_ids)
+
+
+def exact_search_ids(conn, embedding, top_k=5, column="content_vector", storage="vector"):
+    """Returns the true top_k ids by scanning every row (ANN index scans disabled for the query)."""
+    with conn.cursor() as cur:
+        cur.execute("SET enable_indexscan = off")
+        try:
+            cur.execute(
+                f'SELECT id FROM public.articles ORDER BY "{column}" <=> %s::{storage} LIMIT %s',
+                (to_vector_literal(embedding), top_k),
+            )
+            return [row[0] for row in cur.fetchall()]
+        finally:
+            cur.execute("RESET enable_indexscan")
+
+
+# --- Presentation ---
+def format_results_markdown(results):
+    """Renders result dicts (see search_service.to_results) as the Markdown shown in the Gradio UI."""
+    if not results:
+        return "No similar articles found for your query."
+    sections = ["### Search Results:\n\n"]
+    for result in results:
+        sections.append(
+            f"**Title:** [{result['title']}]({result['url']})\n"
+            f"**ID:** {result['id']}\n"
+            f"**Similarity Score:** {result['score']:.4f}\n"
+            f"**Content Snippet:** {result['snippet']}\n\n"
+            f"---\n\n"
+        )
+    return "".join(sections)
@@ -0,0 +1,360 @@
+"""
+The search core shared by the Gradio UI, the JSON API and the batch entry point.
+
+search() embeds a query, runs the vector search for the model's column and returns a
+structured response (id, url, title, snippet and score per result, with pagination).
+The scan returns ranked ids and scores only, a few pages ahead (SEARCH_PREFETCH_PAGES);
+each page then reads the url, title and snippet of its own results (article_cache.py),
+and next_cursor continues from the last result without scanning the index again. Once
+that ranking has left the result cache, a vector search continues from the cursor's
+last result in SQL (keyset) instead of ranking every row before it again.
+Failures raise SearchError carrying the outcome label used by the metrics; the
+presentation layers (Gradio Markdown, JSON API) only render the response or the error.
+"""
+import base64
+import json
+import os
+
+from article_cache import cached_rows, fetch_articles
+from db import (DB_REPLICA_HOSTS, get_db_connection, get_read_connection, is_replica_connection,
+                mark_replica_down, parse_hosts, release_db_connection)
+from embedding_cache import get_embedding_cache
+from embeddings import EMBEDDING_FUNCTIONS
+from metrics import record_result_cache, record_search, stage
+from model_registry import column_type, get_model_spec
+from result_cache import get_result_cache, result_cache_key
+from scatter_gather import DB_SHARD_HOSTS, SCATTER_MODES, ShardSearchError, get_shard_set
+from search import (BQ_OVERSAMPLE, DEFAULT_SEARCH_PROFILE, KEYSET_MODES, SEARCH_MODES, SEARCH_PROFILES,
+                    active_filters, search_article_ids)
+from vector_tier import get_vector_tier
+
+# --- Environment Variables ---
+# Largest page size a caller can ask for
+SEARCH_MAX_TOP_K = int(os.getenv("SEARCH_MAX_TOP_K", "100"))
+# Deepest result a caller can page to (page * top_k); HNSW returns at most hnsw.ef_search rows
+SEARCH_MAX_DEPTH = int(os.getenv("SEARCH_MAX_DEPTH", "1000"))
+# Pages of ranked ids and scores fetched by a search that isn't cached; the following
+# pages are served from the result cache without scanning the index again
+SEARCH_PREFETCH_PAGES = int(os.getenv("SEARCH_PREFETCH_PAGES", "5"))
+
+
+class SearchError(Exception):
+    """A search that could not be answered; outcome is its metrics label, the message is user-facing."""
+
+    def __init__(self, outcome, message):
+        super().__init__(message)
+        self.outcome = outcome
+
+
+# --- Validation ---
+def get_search_spec(model_choice):
+    """Returns the ModelSpec for a provider choice, or raises SearchError('invalid_model')."""
+    spec = get_model_spec(model_choice)
+    if spec is None:
+        raise SearchError("invalid_model", "Invalid model choice. Please select 'Ollama', 'OpenAI', or 'HuggingFace'.")
+    return spec
+
+
+def check_embedding(model_choice, spec, embedding):
+    """Raises SearchError if the embedding is missing or doesn't fit the model's column."""
+    if embedding is None:
+        raise SearchError(
+            "embedding_error",
+            f"Failed to get embedding for the query using {model_choice}. Check model setup or API key.",
+        )
+    if len(embedding) != spec.dimension:
+        raise SearchError(
+            "dimension_mismatch",
+            f"Embedding dimension mismatch! Your chosen model ({model_choice}: {spec.model}) "
+            f"produced a {len(embedding)}-dimension vector, but its column "
+            f"'{spec.column}' is registered as {column_type(spec)}. "
+            f"Register the model's real dimension (see model_registry.py) "
+            f"and re-embed the articles with reembed.py.",
+        )
+
+
+def check_filters(filters):
+    """Returns the filters that are set, or raises SearchError('invalid_request') for an unknown filter."""
+    try:
+        return active_filters(filters)
+    except ValueError as e:
+        raise SearchError("invalid_request", str(e)) from e
+
+
+def check_search_options(search_mode, profile, modes=SEARCH_MODES):
+    """Raises SearchError('invalid_request') for an unknown search mode or profile (None keeps the session's)."""
+    if search_mode not in modes:
+        raise SearchError("invalid_request", f"mode must be one of {', '.join(modes)}.")
+    if profile is not None and profile not in SEARCH_PROFILES:
+        raise SearchError("invalid_request", f"profile must be one of {', '.join(SEARCH_PROFILES)}.")
+
+
+def encode_cursor(offset, last_id, last_score):
+    """Opaque cursor of the page after a result: its position, id and score."""
+    payload = json.dumps([offset, last_id, last_score], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (offset, last_id, last_score) of a cursor, or raises SearchError('invalid_request')."""
+    try:
+        offset, last_id, last_score = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(offset), last_id, float(last_score)
+    except (ValueError, TypeError) as e:
+        raise SearchError("invalid_request", "Invalid cursor.") from e
+
+
+def result_window(top_k, page=1, after=None):
+    """
+    Returns (offset, needed) for a page: the position of its first result (after a
+    decoded cursor, else from page) and the number of ranked rows needed to serve it.
+    Raises SearchError('invalid_request') for a page out of bounds.
+    """
+    if not 1 <= top_k <= SEARCH_MAX_TOP_K:
+        raise SearchError("invalid_request", f"top_k must be between 1 and {SEARCH_MAX_TOP_K}.")
+    offset = after[0] if after is not None else (page - 1) * top_k
+    if page < 1 or offset < 0 or offset + top_k > SEARCH_MAX_DEPTH:
+        raise SearchError("invalid_request", f"page must be at least 1 and page * top_k at most {SEARCH_MAX_DEPTH}.")
+    return offset, offset + top_k
+
+
+def fetch_limit(top_k, offset):
+    """Ranked rows to fetch when a page isn't cached: SEARCH_PREFETCH_PAGES pages from offset."""
+    return min(SEARCH_MAX_DEPTH, offset + top_k * max(1, SEARCH_PREFETCH_PAGES))
+
+
+def page_start(ranked, offset, after=None):
+    """
+    Index in the ranked (id, score) rows where a page starts. With a cursor this is the
+    row after the cursor's last id (keyset), so the page continues where the previous
+    one ended even if the ranking was refetched in between; if that id is gone, the
+    first row scoring below it.
+    """
+    if after is None:
+        return offset
+    _, last_id, last_score = after
+    if 0 < offset <= len(ranked) and ranked[offset - 1][0] == last_id:
+        return offset
+    for position, (article_id, _) in enumerate(ranked):
+        if article_id == last_id:
+            return position + 1
+    return next((position for position, (_, score) in enumerate(ranked) if score < last_score), len(ranked))
+
+
+# --- Responses ---
+def to_results(rows, offset=0):
+    """Converts (id, url, title, truncated_content, similarity_score) rows into result dicts."""
+    return [
+        {"rank": offset + position, "id": res_id, "url": url, "title": title, "snippet": snippet,
+         "score": float(score)}
+        for position, (res_id, url, title, snippet, score) in enumerate(rows, start=1)
+    ]
+
+
+def build_response(query_text, model_choice, spec, search_mode, profile, top_k, offset, rows, has_more,
+                   filters=None):
+    """
+    Builds the structured response for one page: rows are its result rows, starting at
+    rank offset + 1. next_cursor (set when has_more) asks for the following page.
+    """
+    has_more = bool(has_more and rows)
+    return {
+        "query": query_text,
+        "provider": model_choice,
+        "model": spec.model,
+        "mode": search_mode,
+        "profile": profile,
+        "filters": filters or {},
+        "top_k": top_k,
+        "page": offset // top_k + 1,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(offset + len(rows), rows[-1][0], float(rows[-1][4])) if has_more else None,
+        "results": to_results(rows, offset),
+    }
+
+
+def page_has_more(ranked, start, top_k, position=None):
+    """
+    A full page that stays within SEARCH_MAX_DEPTH may be followed by another one.
+    position is the rank offset of ranked[start] (start when ranked begins at the top).
+    """
+    position = start if position is None else position
+    return len(ranked) >= start + top_k and position + 2 * top_k <= SEARCH_MAX_DEPTH
+
+
+# --- Search ---
+def routes_searches():
+    """
+    True when DB_REPLICA_HOSTS or DB_SHARD_HOSTS is set. Only this core routes searches to
+    the replicas and shards; the async engine (async_search.py) searches the primary, so
+    the Gradio UI and the JSON API fall back to this core instead.
+    """
+    return bool(parse_hosts(DB_REPLICA_HOSTS) or parse_hosts(DB_SHARD_HOSTS))
+
+
+def search(query_text, model_choice, search_mode="vector", profile=DEFAULT_SEARCH_PROFILE,
+           top_k=5, page=1, oversample=BQ_OVERSAMPLE, weights=None, filters=None, cursor=None):
+    """
+    Runs one semantic search and returns its structured response (see build_response).
+    weights=(semantic, keyword) overrides the hybrid mode's fusion weights and
+    weights=(title, content) the multi mode's field weights. filters ({name: value},
+    see search.SEARCH_FILTERS) restrict the articles searched. cursor (a response's
+    next_cursor) asks for the page after that response's, instead of page.
+    Raises SearchError when the search can't be answered. Every call is timed and
+    counted per provider and outcome.
+    """
+    try:
+        with stage("total", model_choice):
+            response = _search(query_text, model_choice, search_mode, profile, top_k, page, oversample, weights,
+                               filters, cursor)
+    except SearchError as e:
+        record_search(model_choice, e.outcome)
+        raise
+    except Exception as e:
+        print(f"An unexpected error occurred during search: {e}")
+        record_search(model_choice, "error")
+        raise SearchError("error", f"An error occurred: {e}") from e
+    record_search(model_choice, "ok" if response["results"] else "no_results")
+    return response
+
+
+def _search(query_text, model_choice, search_mode, profile, top_k, page, oversample, weights, filters, cursor):
+    # Each model has its own vector column (and dimension) in public.articles
+    spec = get_search_spec(model_choice)
+    after = decode_cursor(cursor) if cursor else None
+    offset, needed = result_window(top_k, page, after)
+    check_search_options(search_mode, profile)
+    filters = check_filters(filters)
+
+    # Repeated queries are answered from the embedding cache instead of
+    # calling the embedding provider again.
+    with stage("embedding", model_choice):
+        embedding = get_embedding_cache().get_or_compute(
+            model_choice, spec.model, query_text, EMBEDDING_FUNCTIONS[model_choice])
+    check_embedding(model_choice, spec, embedding)
+
+    # Near-duplicate queries, and the next pages of a search, reuse the ranked
+    # (id, score) rows of a cached search (see result_cache.py)
+    cache = get_result_cache()
+    cache_key = result_cache_key(model_choice, spec.column, search_mode, profile, oversample, weights, filters,
+                                 query_text)
+    with stage("result_cache", model_choice):
+        ranked = cache.lookup(cache_key, embedding, needed)
+    record_result_cache(model_choice, ranked is not None)
+    if ranked is None and after is not None and reads_keyset(spec, search_mode, filters):
+        # The page after a cursor is read from the cursor's last row on; it starts
+        # mid-ranking, so it isn't cached
+        ranked = _query(model_choice, spec, embedding, top_k, search_mode, oversample, profile, query_text, weights,
+                        filters, after[1:])
+        start, position = 0, offset
+    else:
+        if ranked is None:
+            generation = cache.generation
+            limit = fetch_limit(top_k, offset)
+            ranked = _query(model_choice, spec, embedding, limit, search_mode, oversample, profile, query_text,
+                            weights, filters)
+            cache.store(cache_key, embedding, limit, ranked, generation)
+        start = position = page_start(ranked, offset, after)
+
+    rows = _fetch(model_choice, search_mode, ranked[start:start + top_k])
+    return build_response(query_text, model_choice, spec, search_mode, profile, top_k, position, rows,
+                          page_has_more(ranked, start, top_k, position), filters)
+
+
+def reads_keyset(spec, search_mode, filters):
+    """
+    True when the page after a cursor can be read by keyset (see search.KEYSET_CLAUSE):
+    a KEYSET_MODES search on Postgres, not on the shards or the in-process vector tier.
+    """
+    if search_mode not in KEYSET_MODES or (get_shard_set() is not None and search_mode in SCATTER_MODES):
+        return False
+    tier = get_vector_tier()
+    return tier is None or not tier.answers(spec.column, search_mode, filters)
+
+
+def _query(model_choice, spec, embedding, limit, search_mode, oversample, profile, query_text, weights, filters,
+           after=None):
+    """
+    Returns the top limit (id, similarity_score) rows of a search, or with
+    after=(last_id, last_score) (see reads_keyset) the limit rows ranked after that row.
+    """
+    # Articles hash-partitioned across several nodes are searched on all of them at once
+    shards = get_shard_set()
+    if shards is not None and search_mode in SCATTER_MODES:
+        with stage("query", model_choice):
+            try:
+                return shards.search_article_ids(embedding, limit, column=spec.column, storage=spec.storage,
+                                                  mode=search_mode, oversample=oversample, profile=profile,
+                                                  filters=filters)
+            except ShardSearchError as e:
+                raise SearchError("db_unavailable", str(e)) from e
+
+    # Searches covered by the in-process vector tier don't touch Postgres for the scan
+    tier = get_vector_tier()
+    if tier is not None and tier.answers(spec.column, search_mode, filters):
+        with stage("query", model_choice):
+            return tier.search(embedding, limit)
+
+    def run(conn):
+        # The query vector is bound once as a parameter of a server-side prepared
+        # statement (see search.py); the scan returns ids and scores only.
+        with stage("query", model_choice):
+            return search_article_ids(conn, embedding, limit, column=spec.column, storage=spec.storage,
+                                      mode=search_mode, oversample=oversample, profile=profile,
+                                      query_text=query_text, weights=weights, filters=filters, after=after)
+
+    return _on_read_connection(model_choice, run)
+
+
+def _fetch(model_choice, search_mode, results):
+    """Returns the search rows of one page of (id, score) results: cached article fields, or one narrow query."""
+    with stage("fetch", model_choice):
+        rows = cached_rows(results)
+        if rows is not None:
+            return rows
+
+        # Results of a scatter-gather search are read from the shards that hold them
+        shards = get_shard_set()
+        if shards is not None and search_mode in SCATTER_MODES:
+            try:
+                return shards.fetch_articles(results)
+            except ShardSearchError as e:
+                raise SearchError("db_unavailable", str(e)) from e
+
+        def run(conn):
+            with conn.cursor() as cur:
+                return fetch_articles(cur, results)
+
+        return _on_read_connection(model_choice, run)
+
+
+def _on_read_connection(model_choice, run):
+    """Calls run(conn) on a read replica when there is one, re-running it on the primary if the replica fails."""
+    with stage("connection", model_choice):
+        conn = get_read_connection()
+    if not conn:
+        raise SearchError("db_unavailable",
+                          "Failed to connect to the database. Please check your DB environment variables.")
+    replica_failed = False
+    try:
+        return run(conn)
+    except Exception as e:
+        if not is_replica_connection(conn):
+            raise
+        # Failover: the replica leaves the rotation and the search re-runs on the primary
+        print(f"Search failed on a read replica, retrying on the primary: {e}")
+        mark_replica_down(conn, e)
+        replica_failed = True
+    finally:
+        # Ensure the connection goes back to the pool even if an error occurs
+        release_db_connection(conn, close=replica_failed)
+
+    with stage("connection", model_choice):
+        conn = get_db_connection()
+    if not conn:
+        raise SearchError("db_unavailable",
+                          "Failed to connect to the database. Please check your DB environment variables.")
+    try:
+        return run(conn)
+    finally:
+        release_db_connection(conn)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of this package are imported top-level (python search.py, from search import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import time
+
+from article_cache import ArticleCache, fetch_articles
+
+
+def row(article_id):
+    return article_id, f"https://example.org/{article_id}", f"Title {article_id}", "Snippet..."
+
+
+def test_get_many_returns_cached_rows():
+    cache = ArticleCache(max_size=10)
+    cache.put_many([row(1), row(2)])
+    assert cache.get_many([1, 2, 3]) == {1: row(1), 2: row(2)}
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_article_is_evicted():
+    cache = ArticleCache(max_size=2)
+    cache.put_many([row(1), row(2)])
+    cache.get_many([1])
+    cache.put_many([row(3)])
+    assert set(cache.get_many([1, 2, 3])) == {1, 3}
+
+
+def test_articles_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ArticleCache(max_size=10, ttl=60)
+    cache.put_many([row(1)])
+    now[0] += 61
+    assert cache.get_many([1]) == {}
+    assert len(cache) == 0
+
+
+def test_clear():
+    cache = ArticleCache()
+    cache.put_many([row(1)])
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+class FakeCursor:
+    def __init__(self):
+        self.queried = []
+
+    def execute(self, query, params):
+        self.queried.append(list(params[0]))
+
+    def fetchall(self):
+        return [row(article_id) for article_id in self.queried[-1]]
+
+
+def test_fetch_articles_reads_only_missing_ids():
+    cache = ArticleCache()
+    cache.put_many([row(2)])
+    cur = FakeCursor()
+    rows = fetch_articles(cur, [(3, 0.9), (2, 0.8), (1, 0.7)], cache)
+    assert cur.queried == [[3, 1]]
+    assert rows == [row(3) + (0.9,), row(2) + (0.8,), row(1) + (0.7,)]
+    fetch_articles(cur, [(1, 0.5)], cache)
+    assert len(cur.queried) == 1
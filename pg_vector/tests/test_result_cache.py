@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+
+from result_cache import SemanticResultCache, result_cache_key
+
+KEY = result_cache_key("OpenAI", "content_vector", "vector", "balanced")
+QUERY = np.array([1.0, 0.0, 0.0])
+PARAPHRASE = np.array([0.99, 0.05, 0.0])
+OTHER = np.array([0.0, 1.0, 0.0])
+ROWS = [(1, 0.9), (2, 0.8), (3, 0.7), (4, 0.6)]
+
+
+def test_near_duplicate_query_hits():
+    cache = SemanticResultCache(threshold=0.97)
+    cache.store(KEY, QUERY, 4, ROWS)
+    assert cache.lookup(KEY, PARAPHRASE, 2) == ROWS[:2]
+    assert cache.lookup(KEY, OTHER, 2) is None
+    assert cache.lookup(result_cache_key("OpenAI", "content_vector", "vector", "exact"), QUERY, 2) is None
+
+
+def test_deeper_limit_misses_unless_the_list_was_short():
+    cache = SemanticResultCache()
+    cache.store(KEY, QUERY, 4, ROWS)
+    assert cache.lookup(KEY, QUERY, 8) is None
+    cache.store(KEY, OTHER, 10, ROWS)
+    assert cache.lookup(KEY, OTHER, 20) == ROWS
+
+
+def test_results_fetched_before_a_clear_are_not_stored():
+    cache = SemanticResultCache()
+    generation = cache.generation
+    cache.clear()
+    cache.store(KEY, QUERY, 4, ROWS, generation)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_list_is_evicted():
+    cache = SemanticResultCache(max_size=1)
+    cache.store(KEY, QUERY, 4, ROWS)
+    cache.store(KEY, OTHER, 4, ROWS)
+    assert cache.lookup(KEY, QUERY, 4) is None
+    assert cache.lookup(KEY, OTHER, 4) == ROWS
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lists_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = SemanticResultCache(ttl=60)
+    cache.store(KEY, QUERY, 4, ROWS)
+    now[0] += 61
+    assert cache.lookup(KEY, QUERY, 4) is None
+    assert cache.stats()["expirations"] == 1
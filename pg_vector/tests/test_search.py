@@ -0,0 +1,125 @@
+import os
+import random
+
+import pytest
+
+import search
+from search import (FILTER_RETRY_FACTOR, HNSW_MAX_EF_SEARCH, SEARCH_PROFILES, ScaledSetting, exact_search_ids,
+                    recall_at_k, reciprocal_rank_fusion, search_article_ids, search_query, search_settings,
+                    search_settings_query, statement_parameters)
+
+
+# --- Search Settings ---
+def test_profile_settings():
+    assert search_settings("fast") == SEARCH_PROFILES["fast"]
+    assert search_settings(None) == {}
+
+
+def test_exact_profile_forces_a_custom_plan():
+    assert search_settings("exact") == {"enable_indexscan": "off", "plan_cache_mode": "force_custom_plan"}
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        search_settings("turbo")
+
+
+def test_filtered_settings(monkeypatch):
+    monkeypatch.setattr(search, "FILTER_ITERATIVE_SCAN", "strict_order")
+    settings = search_settings("balanced", filtered=True, iterative_scan=True)
+    assert settings["plan_cache_mode"] == "force_custom_plan"
+    assert settings["hnsw.iterative_scan"] == "strict_order"
+    assert "hnsw.iterative_scan" not in search_settings("balanced", filtered=True, iterative_scan=False)
+
+
+def test_retries_scale_probes_and_ef_search():
+    settings = search_settings("balanced", filtered=True, attempt=2)
+    factor = FILTER_RETRY_FACTOR ** 2
+    assert settings["ivfflat.probes"] == ScaledSetting(int(SEARCH_PROFILES["balanced"]["ivfflat.probes"]), factor,
+                                                       None)
+    assert settings["hnsw.ef_search"] == ScaledSetting(int(SEARCH_PROFILES["balanced"]["hnsw.ef_search"]), factor,
+                                                       HNSW_MAX_EF_SEARCH)
+
+
+def test_settings_query():
+    assert search_settings_query({}) is None
+    sql, params = search_settings_query({"hnsw.ef_search": ScaledSetting(40, 4, 1000), "plan_cache_mode": "auto"})
+    assert sql.count("set_config") == 2
+    assert params == ["hnsw.ef_search", 40, "hnsw.ef_search", 4, 1000, "plan_cache_mode", "auto"]
+
+
+# --- Queries ---
+def test_keyset_query():
+    assert statement_parameters("vector", ["category"], keyset=True) == (
+        "embedding", "top_k", "last_score", "last_id", "category")
+    assert "%(last_id)s" in search_query("vector", keyset=True)
+    with pytest.raises(ValueError):
+        search_query("hybrid", keyset=True)
+
+
+# --- Evaluation ---
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [article_id for article_id, _ in fused] == [1, 3, 2]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_weighted_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 1]], weights=[1.0, 3.0], k=0)
+    assert fused == [(2, pytest.approx(0.5 + 3.0)), (1, pytest.approx(1.0 + 1.5))]
+
+
+def test_recall_at_k():
+    assert recall_at_k([1, 2, 3, 4], [2, 4, 9]) == 0.5
+    assert recall_at_k([], [1]) == 1.0
+    assert recall_at_k([1], []) == 0.0
+
+
+# --- Database ---
+@pytest.fixture
+def database():
+    """A connection to DB_HOST and the dimension of public.articles.content_vector; skipped without them."""
+    os.environ.setdefault("PGCONNECT_TIMEOUT", "3")
+    from db import create_db_connection
+    try:
+        conn = create_db_connection()
+    except Exception as e:
+        pytest.skip(f"No database available: {e}")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT vector_dims(content_vector) FROM public.articles WHERE content_vector IS NOT NULL "
+                        "LIMIT 1")
+            row = cur.fetchone()
+        conn.rollback()
+    except Exception as e:
+        row = None
+        print(f"Could not read public.articles: {e}")
+    if row is None:
+        conn.close()
+        pytest.skip("No articles to search")
+    yield conn, row[0]
+    conn.close()
+
+
+def test_exact_profile_matches_exact_search_after_prepared_executions(database):
+    conn, dimension = database
+    rng = random.Random(0)
+    queries = [[rng.gauss(0, 1) for _ in range(dimension)] for _ in range(8)]
+    truth = [exact_search_ids(conn, query, 10) for query in queries]
+    conn.rollback()
+
+    # A session that plans prepared statements generically (plan_cache_mode, or Postgres'
+    # own choice after five executions) keeps the plan made by the first execution, here
+    # an index scan under the 'fast' profile. Costlier sequential scans make the planner
+    # pick the index on a small test table too.
+    with conn.cursor() as cur:
+        cur.execute("SET plan_cache_mode = force_generic_plan")
+        cur.execute("SET seq_page_cost = 10")
+    conn.commit()
+    for query in queries:
+        search_article_ids(conn, query, 10, profile="fast")
+        conn.rollback()
+    for execution, query in enumerate(queries):
+        rows = search_article_ids(conn, query, 10, profile="exact")
+        conn.rollback()
+        assert [row[0] for row in rows] == truth[execution], f"execution {execution}"
@@ -0,0 +1,68 @@
+import pytest
+
+from search_service import (SEARCH_MAX_DEPTH, SearchError, check_search_options, decode_cursor, encode_cursor,
+                            page_has_more, page_start, result_window)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(10, 42, 0.875)) == (10, 42, 0.875)
+
+
+def test_cursor_keeps_the_exact_score():
+    score = 1 - 0.123456789012345678
+    assert decode_cursor(encode_cursor(5, 7, score))[2] == score
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor(1, 2, 3.0)[:-3], "WzEsMl0"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(SearchError) as error:
+        decode_cursor(cursor)
+    assert error.value.outcome == "invalid_request"
+
+
+RANKED = [(10, 0.9), (11, 0.8), (12, 0.7), (13, 0.6), (14, 0.5)]
+
+
+def test_page_start_without_cursor_is_the_offset():
+    assert page_start(RANKED, 3) == 3
+
+
+def test_page_start_after_the_cursor_row():
+    assert page_start(RANKED, 2, (2, 11, 0.8)) == 2
+
+
+def test_page_start_follows_a_moved_cursor_row():
+    # The ranking changed since the cursor was issued: its last row is now at position 3
+    assert page_start(RANKED, 2, (2, 13, 0.6)) == 4
+
+
+def test_page_start_when_the_cursor_row_is_gone():
+    assert page_start(RANKED, 2, (2, 99, 0.75)) == 2
+    assert page_start(RANKED, 2, (2, 99, 0.1)) == len(RANKED)
+
+
+def test_result_window():
+    assert result_window(10, 3) == (20, 30)
+    assert result_window(10, 1, (25, 7, 0.5)) == (25, 35)
+    with pytest.raises(SearchError):
+        result_window(0)
+    with pytest.raises(SearchError):
+        result_window(10, SEARCH_MAX_DEPTH)
+
+
+def test_page_has_more():
+    assert page_has_more(RANKED, 0, 5)
+    assert not page_has_more(RANKED, 1, 5)
+    assert not page_has_more(RANKED, 0, 5, SEARCH_MAX_DEPTH - 5)
+
+
+@pytest.mark.parametrize("mode, profile", [("nearest", "fast"), ("vector", "turbo")])
+def test_unknown_mode_or_profile_is_an_invalid_request(mode, profile):
+    with pytest.raises(SearchError) as error:
+        check_search_options(mode, profile)
+    assert error.value.outcome == "invalid_request"
+
+
+def test_known_options():
+    check_search_options("hybrid", "exact")
+    check_search_options("vector", None)
@@ -0,0 +1,24 @@
+from datetime import date, datetime
+
+import pytest
+
+from vector_tier import normalize_filters
+
+
+def test_dates_normalize_to_one_form():
+    forms = ["2024-01-01", date(2024, 1, 1), datetime(2024, 1, 1)]
+    assert len({normalize_filters({"published_after": value})["published_after"] for value in forms}) == 1
+
+
+def test_integer_filters():
+    assert normalize_filters({"id_min": "5"}) == normalize_filters({"id_min": 5}) == {"id_min": "5"}
+
+
+def test_unset_filters_are_dropped():
+    assert normalize_filters({"category": "science", "language": None}) == {"category": "science"}
+    assert normalize_filters(None) == {}
+
+
+def test_unknown_filter():
+    with pytest.raises(ValueError):
+        normalize_filters({"author": "x"})
@@ -0,0 +1,395 @@
+"""
+In-process vector tier for the hot working set of public.articles.
+
+Selected embeddings (one vector column, optionally restricted by search filters) are
+exported to a memory-mapped float32 matrix file with an id map next to it:
+
+    <path>.vectors    float32 rows, L2-normalized (a dot product is the cosine similarity)
+    <path>.ids.npy    article id per row (-1 for rows deleted since the export)
+    <path>.json       column, dimension, filters, row count and refresh watermark
+
+The tier answers a k-NN query with one NumPy matrix-vector product over the mapped rows,
+without a database round trip for the scan; only the title, url and snippet of the final
+top-k ids are fetched (article_cache.fetch_articles). refresh() applies inserts, updates
+and deletes since the last export or refresh (updates are tracked by the updated_at
+column added by ensure_change_tracking). parity() compares the tier's top-k with the
+exact SQL search.
+
+    python vector_tier.py track-changes
+    python vector_tier.py export --path /var/lib/pg_vector/science --column content_vector --filter category=Science
+    python vector_tier.py refresh --path /var/lib/pg_vector/science
+    python vector_tier.py parity --path /var/lib/pg_vector/science --queries 200 --top-k 10
+
+With VECTOR_TIER_PATH set, searches whose column, mode ('vector') and filters match the
+tier's are answered by it, and the tier refreshes itself every VECTOR_TIER_REFRESH seconds.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+from search import SEARCH_FILTERS, active_filters, filter_clause
+
+# --- Environment Variables ---
+# Base path of the exported tier to serve searches from (unset: no tier)
+VECTOR_TIER_PATH = os.getenv("VECTOR_TIER_PATH", "")
+# Seconds between incremental refreshes of the served tier (0 disables them)
+VECTOR_TIER_REFRESH = float(os.getenv("VECTOR_TIER_REFRESH", "60"))
+# Seconds a refresh reaches back before the last one started: updated_at is the writer's
+# transaction start, so a writer that commits later is still seen if it ran for less
+VECTOR_TIER_REFRESH_OVERLAP = float(os.getenv("VECTOR_TIER_REFRESH_OVERLAP", "600"))
+
+# Rows fetched per round trip while exporting or refreshing
+FETCH_SIZE = 2000
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def normalize_filters(filters):
+    """
+    Returns the set filters as strings in one canonical form per filter type, so that
+    '2024-01-01', date(2024, 1, 1) and datetime(2024, 1, 1) name the same tier.
+    """
+    normalized = {}
+    for name, value in active_filters(filters).items():
+        sql_type = SEARCH_FILTERS[name][1]
+        if sql_type == "timestamptz":
+            if isinstance(value, str):
+                try:
+                    value = datetime.fromisoformat(value)
+                except ValueError:
+                    pass
+            elif isinstance(value, date) and not isinstance(value, datetime):
+                value = datetime.combine(value, datetime.min.time())
+            if isinstance(value, datetime):
+                value = value.isoformat()
+        elif sql_type == "integer":
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                pass
+        normalized[name] = str(value)
+    return normalized
+
+
+def _selection(column, filters):
+    """Returns (WHERE clause, params) selecting the rows of the tier."""
+    clause = filter_clause(filters)
+    where = f'"{column}" IS NOT NULL' + (f" AND {clause}" if clause else "")
+    return where, dict(filters)
+
+
+# --- Change Tracking ---
+CHANGE_TRACKING = """
+    ALTER TABLE public.articles ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+    CREATE INDEX IF NOT EXISTS articles_updated_at_idx ON public.articles (updated_at);
+
+    CREATE OR REPLACE FUNCTION public.touch_articles_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = now();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS articles_updated_at ON public.articles;
+    CREATE TRIGGER articles_updated_at
+        BEFORE UPDATE ON public.articles
+        FOR EACH ROW EXECUTE FUNCTION public.touch_articles_updated_at();
+"""
+
+
+def ensure_change_tracking(conn):
+    """Adds the updated_at column (set on insert and by trigger on update) used by incremental refreshes."""
+    with conn.cursor() as cur:
+        cur.execute(CHANGE_TRACKING)
+    conn.commit()
+
+
+def _has_change_tracking(cur):
+    from model_registry import get_column_type
+
+    return get_column_type(cur, "updated_at") is not None
+
+
+# --- Tier ---
+class VectorTier:
+    """A memory-mapped matrix of normalized vectors and their article ids, searched with NumPy."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(f"{path}.json") as f:
+            self.meta = json.load(f)
+        self.column = self.meta["column"]
+        self.dimension = self.meta["dimension"]
+        self.filters = self.meta.get("filters", {})
+        self._filter_key = normalize_filters(self.filters)
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        count = self.meta["count"]
+        self.ids = np.load(f"{self.path}.ids.npy")
+        self.vectors = np.memmap(f"{self.path}.vectors", dtype=np.float32, mode="r+",
+                                 shape=(count, self.dimension)) if count else np.zeros((0, self.dimension), np.float32)
+        self.rows = {int(article_id): row for row, article_id in enumerate(self.ids) if article_id >= 0}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def answers(self, column, mode, filters):
+        """True if a search on column in mode with filters can be answered from this tier."""
+        return (column == self.column and mode == "vector"
+                and normalize_filters(filters) == self._filter_key)
+
+    def search(self, embedding, top_k):
+        """Returns [(article id, cosine similarity)] of the top_k rows, best first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        with self._lock:
+            if not len(self.ids):
+                return []
+            scores = self.vectors @ query
+            scores[self.ids < 0] = -np.inf
+            k = min(top_k, len(self.rows))
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            best = best[np.argsort(-scores[best])]
+            return [(int(self.ids[row]), float(scores[row])) for row in best]
+
+    def refresh(self, conn):
+        """
+        Applies the changes since the last export or refresh: new and updated vectors are
+        written in place or appended, and rows no longer selected are marked deleted.
+        Rows updated up to VECTOR_TIER_REFRESH_OVERLAP seconds before the last refresh are
+        read again (rewriting them is harmless). Without change tracking only new ids are
+        picked up. Returns the number of rows changed.
+        """
+        where, params = _selection(self.column, self.filters)
+        with conn.cursor() as cur:
+            cur.execute("SELECT now()")
+            started_at = cur.fetchone()[0]
+            if _has_change_tracking(cur) and self.meta.get("watermark"):
+                cur.execute(
+                    f'SELECT id, "{self.column}"::real[] FROM public.articles WHERE {where} '
+                    "AND updated_at >= %(watermark)s::timestamptz - make_interval(secs => %(overlap)s)",
+                    dict(params, watermark=self.meta["watermark"], overlap=VECTOR_TIER_REFRESH_OVERLAP),
+                )
+            else:
+                cur.execute(
+                    f'SELECT id, "{self.column}"::real[] FROM public.articles WHERE {where} AND id > %(max_id)s',
+                    dict(params, max_id=max(self.rows, default=-1)),
+                )
+            changed = cur.fetchall()
+            cur.execute(f"SELECT id FROM public.articles WHERE {where}", params)
+            current_ids = {row[0] for row in cur.fetchall()}
+        conn.rollback()
+
+        with self._lock:
+            removed = [article_id for article_id in self.rows if article_id not in current_ids]
+            for article_id in removed:
+                row = self.rows.pop(article_id)
+                self.ids[row] = -1
+                self.vectors[row] = 0.0
+            appended = []
+            for article_id, vector in changed:
+                vector = _normalize_rows(np.asarray([vector], dtype=np.float32))[0]
+                row = self.rows.get(article_id)
+                if row is None:
+                    appended.append((article_id, vector))
+                else:
+                    self.vectors[row] = vector
+            if appended:
+                self._append(appended)
+            if isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+            np.save(f"{self.path}.ids.npy", self.ids)
+            self.meta["watermark"] = started_at.isoformat()
+            with open(f"{self.path}.json", "w") as f:
+                json.dump(self.meta, f)
+        return len(changed) + len(removed)
+
+    def _append(self, appended):
+        count = self.meta["count"]
+        new_count = count + len(appended)
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        with open(f"{self.path}.vectors", "ab") as f:
+            f.write(np.asarray([vector for _, vector in appended], dtype=np.float32).tobytes())
+        self.meta["count"] = new_count
+        self.ids = np.concatenate([self.ids, np.asarray([article_id for article_id, _ in appended], dtype=np.int64)])
+        self.vectors = np.memmap(f"{self.path}.vectors", dtype=np.float32, mode="r+",
+                                 shape=(new_count, self.dimension))
+        for offset, (article_id, _) in enumerate(appended):
+            self.rows[article_id] = count + offset
+
+
+def export_tier(conn, path, column="content_vector", filters=None):
+    """
+    Exports the column's vectors of the articles matching filters to a tier at path
+    (streamed through a server-side cursor) and returns the opened VectorTier.
+    """
+    filters = normalize_filters(filters)
+    where, params = _selection(column, filters)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with conn.cursor() as cur:
+        cur.execute("SELECT now()")
+        started_at = cur.fetchone()[0]
+    ids = []
+    dimension = None
+    with open(f"{path}.vectors", "wb") as f:
+        with conn.cursor(name="vector_tier_export") as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute(f'SELECT id, "{column}"::real[] FROM public.articles WHERE {where} ORDER BY id', params)
+            while True:
+                rows = cur.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                matrix = _normalize_rows(np.asarray([vector for _, vector in rows], dtype=np.float32))
+                dimension = matrix.shape[1]
+                f.write(matrix.tobytes())
+                ids.extend(article_id for article_id, _ in rows)
+    conn.rollback()
+    if dimension is None:
+        from model_registry import get_column_type
+
+        with conn.cursor() as cur:
+            dimension = int(get_column_type(cur, column).split("(")[1].rstrip(")"))
+        conn.rollback()
+    np.save(f"{path}.ids.npy", np.asarray(ids, dtype=np.int64))
+    with open(f"{path}.json", "w") as f:
+        json.dump({"column": column, "dimension": dimension, "filters": filters, "count": len(ids),
+                   "watermark": started_at.isoformat()}, f)
+    return VectorTier(path)
+
+
+# --- Parity ---
+def parity(conn, tier, queries=100, top_k=10):
+    """
+    Samples stored vectors of the tier as queries and compares the tier's top_k ids with
+    the exact SQL search (index scans disabled) over the same rows. Returns the mean
+    recall and the fraction of queries with identical top_k ids.
+    """
+    from search import search_articles
+
+    storage = "halfvec" if _column_storage(conn, tier.column) == "halfvec" else "vector"
+    sample = [int(article_id) for article_id in np.random.permutation(list(tier.rows))[:queries]]
+    recalls, identical = [], 0
+    for article_id in sample:
+        embedding = tier.vectors[tier.rows[article_id]].tolist()
+        tier_ids = [result_id for result_id, _ in tier.search(embedding, top_k)]
+        sql_ids = [row[0] for row in search_articles(conn, embedding, top_k, column=tier.column, storage=storage,
+                                                      profile="exact", filters=tier.filters)]
+        conn.rollback()
+        recalls.append(len(set(tier_ids) & set(sql_ids)) / max(1, len(sql_ids)))
+        identical += tier_ids == sql_ids
+    return {
+        "queries": len(sample),
+        "top_k": top_k,
+        "recall": sum(recalls) / len(recalls) if recalls else None,
+        "identical_top_k": identical / len(sample) if sample else None,
+    }
+
+
+def _column_storage(conn, column):
+    from model_registry import get_column_type
+
+    with conn.cursor() as cur:
+        column_sql_type = get_column_type(cur, column)
+    conn.rollback()
+    return column_sql_type.split("(")[0] if column_sql_type else None
+
+
+# --- Shared Tier ---
+_tier = None
+_tier_loaded = False
+_tier_lock = threading.Lock()
+
+
+def start_refresh_thread(tier, interval=VECTOR_TIER_REFRESH):
+    """Refreshes the tier from Postgres every interval seconds in a daemon thread."""
+    from db import create_db_connection
+
+    def refresh_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                conn = create_db_connection()
+                try:
+                    tier.refresh(conn)
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Error refreshing vector tier {tier.path!r}: {e}")
+
+    thread = threading.Thread(target=refresh_loop, name="vector-tier-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_vector_tier():
+    """Returns the tier at VECTOR_TIER_PATH (opened once, refreshed in the background), or None."""
+    global _tier, _tier_loaded
+    if not _tier_loaded:
+        with _tier_lock:
+            if not _tier_loaded:
+                if VECTOR_TIER_PATH:
+                    try:
+                        _tier = VectorTier(VECTOR_TIER_PATH)
+                        if VECTOR_TIER_REFRESH > 0:
+                            start_refresh_thread(_tier)
+                    except Exception as e:
+                        print(f"Could not open vector tier {VECTOR_TIER_PATH!r}: {e}")
+                _tier_loaded = True
+    return _tier
+
+
+def main():
+    from db import create_db_connection
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["track-changes", "export", "refresh", "parity"])
+    parser.add_argument("--path", default=VECTOR_TIER_PATH, help="base path of the tier files")
+    parser.add_argument("--column", default="content_vector")
+    parser.add_argument("--filter", action="append", default=[], help="name=value search filter (repeatable)")
+    parser.add_argument("--queries", type=int, default=100, help="parity: stored vectors used as queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    if args.action != "track-changes" and not args.path:
+        parser.error(f"{args.action} requires --path (or VECTOR_TIER_PATH)")
+
+    conn = create_db_connection()
+    try:
+        if args.action == "track-changes":
+            ensure_change_tracking(conn)
+            print("Added public.articles.updated_at with its update trigger")
+        elif args.action == "export":
+            filters = dict(item.split("=", 1) for item in args.filter)
+            started = time.perf_counter()
+            tier = export_tier(conn, args.path, args.column, filters)
+            print(f"Exported {len(tier)} vectors of {args.column} ({tier.dimension} dims) "
+                  f"in {time.perf_counter() - started:.1f}s")
+        elif args.action == "refresh":
+            started = time.perf_counter()
+            changed = VectorTier(args.path).refresh(conn)
+            print(f"Refreshed {changed} rows in {time.perf_counter() - started:.1f}s")
+        else:
+            print(json.dumps(parity(conn, VectorTier(args.path), args.queries, args.top_k), indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()